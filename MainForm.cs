@@ -51,6 +51,9 @@ public class FingerprintGuiApp : Form
     /// <summary>Handle to the connected fingerprint device.</summary>
     private IntPtr handle = IntPtr.Zero;
 
+    // Station name reported to the Python API's health checks (PING).
+    private string stationId = Environment.MachineName;
+
     /// <summary>System tray icon for the application.</summary>
     private NotifyIcon trayIcon;
     /// <summary>Context menu for the system tray icon.</summary>
@@ -355,74 +358,184 @@ public FingerprintGuiApp()
         }
     }
 
+    /// <summary>
+    /// Starts the TCP bridge server on port 8123.
+    /// Each client connection is served on its own task so that long-lived
+    /// framed connections do not block other clients. Device-bound work is
+    /// still serialized through the UI thread by the Run* methods.
+    /// </summary>
     private void StartBridgeServer()
     {
+        // Optional config.sys keys for stations fronted by a shared API:
+        //   station_id=<name reported by PING>   (default: machine name)
+        //   bridge_bind=<address to listen on>   (default: 127.0.0.1)
+        IPAddress bindAddress = IPAddress.Loopback;
+        try
+        {
+            var cfg = LoadConfig(Path.Combine(AppDomain.CurrentDomain.BaseDirectory, "config.sys"));
+            if (cfg.TryGetValue("station_id", out var configuredStation) && configuredStation.Length > 0)
+                stationId = configuredStation;
+            if (cfg.TryGetValue("bridge_bind", out var bind) && !IPAddress.TryParse(bind, out bindAddress!))
+                bindAddress = IPAddress.Loopback;
+        }
+        catch (Exception ex)
+        {
+            Console.WriteLine("⚠️ Bridge uses default station settings: " + ex.Message);
+        }
+
         Task.Run(() =>
         {
-            TcpListener listener = new TcpListener(IPAddress.Loopback, 8123);
+            TcpListener listener = new TcpListener(bindAddress, 8123);
             listener.Start();
-            Console.WriteLine("🔌 Fingerprint bridge server started on port 8123");
+            Console.WriteLine($"🔌 Fingerprint bridge server for station {stationId} started on {bindAddress}:8123");
 
             while (true)
             {
-                try                {
-                    using TcpClient client = listener.AcceptTcpClient();
+                try
+                {
+                    TcpClient client = listener.AcceptTcpClient();
                     Console.WriteLine("📡 Received connection from: " + client.Client.RemoteEndPoint);
+                    Task.Run(() => HandleBridgeClient(client));
+                }
+                catch (Exception ex)
+                {
+                    Console.WriteLine("🔥 Bridge error: " + ex.Message);
+                }
+            }
+        });
+    }
 
-                    using NetworkStream stream = client.GetStream();
-                    using StreamReader reader = new StreamReader(stream, Encoding.UTF8);
-                    using StreamWriter writer = new StreamWriter(stream, Encoding.UTF8) { AutoFlush = true };
-
-                    string? line = reader.ReadLine();
+    /// <summary>
+    /// Serves one bridge client.
+    ///
+    /// Two wire formats are supported on the same port:
+    ///   Legacy: a single bare command line ("CAPTURE 12 1 prisoner"); the response
+    ///           lines are written and the connection is closed.
+    ///   Framed: "REQ &lt;id&gt; &lt;command&gt;" lines on a long-lived connection; every
+    ///           response is terminated by an "END &lt;id&gt;" line and the connection
+    ///           stays open for the next request. The id is echoed verbatim; the API
+    ///           sends "&lt;sequence&gt;-&lt;correlation id&gt;" so a request can be traced
+    ///           from the HTTP call through the bridge log.
+    /// </summary>
+    private void HandleBridgeClient(TcpClient client)
+    {
+        try
+        {
+            using (client)
+            using (NetworkStream stream = client.GetStream())
+            using (StreamReader reader = new StreamReader(stream, Encoding.UTF8))
+            using (StreamWriter writer = new StreamWriter(stream, new UTF8Encoding(false)) { AutoFlush = true })
+            {
+                string? line;
+                while ((line = reader.ReadLine()) != null)
+                {
                     Console.WriteLine("➡️ Command received: " + line);
 
-                    if (string.IsNullOrWhiteSpace(line))
+                    string trimmed = line.Trim();
+                    if (!trimmed.StartsWith("REQ ", StringComparison.OrdinalIgnoreCase))
                     {
-                        writer.WriteLine("ERROR Empty command");
-                        continue;
+                        // Legacy one-shot connection
+                        DispatchBridgeCommand(trimmed, writer);
+                        return;
                     }
 
-                    string[] parts = line.Trim().Split();
-                    string command = parts[0].ToUpperInvariant();
+                    string[] frame = trimmed.Split(' ', 3, StringSplitOptions.RemoveEmptyEntries);
+                    string requestId = frame.Length > 1 ? frame[1] : "0";
+                    string commandLine = frame.Length > 2 ? frame[2] : "";
+
+                    DispatchBridgeCommand(commandLine, writer);
+                    writer.WriteLine($"END {requestId}");
+                    writer.Flush();
+                }
+            }
+        }
+        catch (IOException)
+        {
+            // Client went away; nothing to report.
+        }
+        catch (Exception ex)
+        {
+            Console.WriteLine("🔥 Bridge error: " + ex.Message);
+        }
+    }
+
+    /// <summary>
+    /// Parses a single command line and writes its response lines to the writer.
+    /// </summary>
+    private void DispatchBridgeCommand(string line, StreamWriter writer)
+    {
+        if (string.IsNullOrWhiteSpace(line))
+        {
+            writer.WriteLine("ERROR Empty command");
+            return;
+        }
 
-                    string response;
+        string[] parts = line.Trim().Split();
+        string command = parts[0].ToUpperInvariant();
 
-                    switch (command)
-                    {
-                        case "CAPTURE":
-                            response = parts.Length == 4
-                                ? RunCapture(parts[1], int.Parse(parts[2]), parts[3], writer)
-                                : parts.Length == 3
-                                    ? RunCapture(parts[1], int.Parse(parts[2]), "prisoner", writer) // backward compatibility
-                                    : "ERROR Usage: CAPTURE <person_id> <finger_index> <member>";
-                            break;
-
-                        case "VERIFY":
-                            response = parts.Length == 4
-                                ? RunVerify(parts[1], int.Parse(parts[2]), parts[3], writer)
-                                : parts.Length == 3
-                                    ? RunVerify(parts[1], int.Parse(parts[2]), "prisoner", writer) // backward compatibility
-                                    : "ERROR Usage: VERIFY <person_id> <finger_index> <member>";
-                            break;
-
-                        case "MATCH":
-                            response = RunMatch(writer);
-                            break;
-
-                        default:
-                            response = "ERROR Unknown command";
-                            break;
-                    }
+        string response;
 
-                    Console.WriteLine("⬅️ Responding with: " + response);
-                    writer.WriteLine(response);
-                }
-                catch (Exception ex)
-                {
-                    Console.WriteLine("🔥 Bridge error: " + ex.Message);
-                }
+        try
+        {
+            switch (command)
+            {
+                case "CAPTURE":
+                    response = parts.Length == 4
+                        ? RunCapture(parts[1], int.Parse(parts[2]), parts[3], writer)
+                        : parts.Length == 3
+                            ? RunCapture(parts[1], int.Parse(parts[2]), "prisoner", writer) // backward compatibility
+                            : "ERROR Usage: CAPTURE <person_id> <finger_index> <member>";
+                    break;
+
+                case "VERIFY":
+                    response = parts.Length == 4
+                        ? RunVerify(parts[1], int.Parse(parts[2]), parts[3], writer)
+                        : parts.Length == 3
+                            ? RunVerify(parts[1], int.Parse(parts[2]), "prisoner", writer) // backward compatibility
+                            : "ERROR Usage: VERIFY <person_id> <finger_index> <member>";
+                    break;
+
+                case "MATCH":
+                    // MATCH [top_k] [member]: a bare MATCH reports the single best candidate.
+                    int topK = 1;
+                    response = parts.Length > 3 || (parts.Length > 1 && (!int.TryParse(parts[1], out topK) || topK < 1))
+                        ? "ERROR Usage: MATCH [top_k] [member]"
+                        : RunMatch(writer, topK, parts.Length == 3 ? parts[2] : null);
+                    break;
+
+                case "SCAN":
+                    response = RunScan(writer);
+                    break;
+
+                case "PING":
+                    // Health check; answered without touching the scanner.
+                    response = $"OK PONG {stationId}";
+                    break;
+
+                default:
+                    response = "ERROR Unknown command";
+                    break;
             }
-        });
+        }
+        catch (FormatException)
+        {
+            response = "ERROR finger_index must be an integer";
+        }
+
+        Console.WriteLine("⬅️ Responding with: " + response);
+        writer.WriteLine(response);
+    }
+
+    /// <summary>
+    /// Writes a "PROGRESS:&lt;stage&gt; &lt;message&gt;" line so the Python API can report
+    /// how far a long-running command has got before its result line arrives.
+    /// </summary>
+    private static void WriteProgress(StreamWriter? writer, string stage, string message)
+    {
+        if (writer == null)
+            return;
+        writer.WriteLine($"PROGRESS:{stage} {message}");
+        writer.Flush();
     }
 
     private string RunCapture(string personId, int fingerIndex, string member, StreamWriter writer)
@@ -495,7 +608,7 @@ public FingerprintGuiApp()
     }
 
 
-    private string RunMatch(StreamWriter writer)
+    private string RunMatch(StreamWriter writer, int topK = 1, string? memberFilter = null)
     {
         try
         {
@@ -504,7 +617,7 @@ public FingerprintGuiApp()
                 try
                 {
                     statusLabel.Text = "[RunMatch] Starting MatchAndIdentify";
-                    string result = MatchAndIdentify(writer);  // ✅ use the overload
+                    string result = MatchAndIdentify(writer, topK, memberFilter);  // ✅ use the overload
                     statusLabel.Text = $"[RunMatch] Done. Result: {result}";
                     // The result was already written to the writer (including BMP)
                 }
@@ -530,6 +643,64 @@ public FingerprintGuiApp()
 
 
 
+    /// <summary>
+    /// Captures a live fingerprint and returns it as a BMP without saving or matching it.
+    /// Used by the Python API's own identification engine as its probe source.
+    /// </summary>
+    private string RunScan(StreamWriter writer)
+    {
+        try
+        {
+            this.Invoke((MethodInvoker)(() =>
+            {
+                try
+                {
+                    if (handle == IntPtr.Zero)
+                    {
+                        writer.WriteLine("❌ Fingerprint device not connected.");
+                        writer.Flush();
+                        return;
+                    }
+
+                    statusLabel.Text = "[RunScan] Place your finger on the scanner...";
+                    WriteProgress(writer, "place_finger", "Place your finger on the scanner");
+                    Refresh();
+
+                    using Bitmap? liveBmp = CaptureBmpFromScanner();
+                    if (liveBmp == null)
+                    {
+                        writer.WriteLine("❌ Failed to capture fingerprint image.");
+                        writer.Flush();
+                        statusLabel.Text = "[RunScan] Capture failed";
+                        return;
+                    }
+
+                    using var ms = new MemoryStream();
+                    liveBmp.Save(ms, ImageFormat.Bmp);
+                    writer.WriteLine("✅ Scan captured.");
+                    writer.WriteLine("BMP:" + Convert.ToBase64String(ms.ToArray()));
+                    writer.Flush();
+                    statusLabel.Text = "[RunScan] Done";
+                }
+                catch (Exception ex)
+                {
+                    string err = "ERROR " + ex.Message;
+                    writer.WriteLine(err);
+                    writer.Flush();
+                    statusLabel.Text = "[RunScan] Exception: " + ex.Message;
+                }
+            }));
+        }
+        catch (Exception ex)
+        {
+            string err = "ERROR Invoke failed: " + ex.Message;
+            writer.WriteLine(err);
+            writer.Flush();
+        }
+
+        return ""; // response already sent via writer
+    }
+
     [System.Runtime.InteropServices.DllImport("kernel32.dll", SetLastError = true)]
     private static extern bool SetDllDirectory(string lpPathName);
 
@@ -1206,6 +1377,7 @@ public FingerprintGuiApp()
 
         captureButton.Enabled = false;
         statusLabel.Text = $"Place your {fingerName} on the scanner...";
+        WriteProgress(writer, "place_finger", $"Place your {fingerName} on the scanner");
         Refresh();
 
         var param = new MultiFingerParam
@@ -1258,6 +1430,7 @@ public FingerprintGuiApp()
         {
             try
             {
+                WriteProgress(writer, "processing", "Saving fingerprint");
                 InsertFingerprintToDatabase(personId, fingerIndex, bmpBytes, null, member);
 
                 string message = $"✅ Successfully captured and saved {fingerName}.";
@@ -1483,11 +1656,21 @@ public FingerprintGuiApp()
     }
 
 
-    private string MatchAndIdentify(StreamWriter? writer)
+    /// <summary>
+    /// Identifies a live fingerprint against every stored image.
+    ///
+    /// Besides the single best match, the <paramref name="topK"/> highest-scoring
+    /// fingers are kept in a bounded min-heap during the scan and written as
+    /// "CANDIDATE:&lt;rank&gt;|&lt;finger_index&gt;|&lt;member&gt;|&lt;score&gt;|&lt;person_id&gt;" lines,
+    /// including those below the match threshold, so a borderline hit can be
+    /// adjudicated without another capture.
+    /// </summary>
+    private string MatchAndIdentify(StreamWriter? writer, int topK = 1, string? memberFilter = null)
     {
         captureButton.Enabled = true;
         matchButton.Enabled = true;
         statusLabel.Text = "Place your finger on the scanner to identify...";
+        WriteProgress(writer, "place_finger", "Place your finger on the scanner");
         Refresh();
 
         Bitmap? liveBmp = CaptureBmpFromScanner();
@@ -1508,6 +1691,7 @@ public FingerprintGuiApp()
         }
 
         statusLabel.Text = "Processing fingerprint match...";
+        WriteProgress(writer, "processing", "Matching against stored fingerprints");
         Application.DoEvents();
 
         byte[] livePixels = ConvertBitmapToGrayscaleBytes(liveBmp);
@@ -1519,6 +1703,8 @@ public FingerprintGuiApp()
         int bestFingerIndex = -1;
         string? bestMember = null;
         var matcher = new FingerprintMatcher(liveTemplate);
+        // Min-heap on score: the root is the weakest of the candidates kept so far.
+        var topCandidates = new PriorityQueue<(string PersonId, int FingerIndex, string Member, double Score), double>();
 
         // ✅ Load config for DB connection
         string configPath = Path.Combine(AppDomain.CurrentDomain.BaseDirectory, "config.sys");
@@ -1528,7 +1714,12 @@ public FingerprintGuiApp()
         using (var conn = new MySqlConnection(connStr))
         {
             conn.Open();
-            using (var cmd = new MySqlCommand("SELECT `person_id`, `finger_index`, `image_bmp`, `member` FROM `fingerprint_templates` WHERE `image_bmp` IS NOT NULL", conn))
+            string sql = "SELECT `person_id`, `finger_index`, `image_bmp`, `member` FROM `fingerprint_templates` WHERE `image_bmp` IS NOT NULL";
+            if (memberFilter != null)
+                sql += " AND `member` = @member";
+            using var cmd = new MySqlCommand(sql, conn);
+            if (memberFilter != null)
+                cmd.Parameters.AddWithValue("@member", memberFilter);
             using (var reader = cmd.ExecuteReader())
             {
                 while (reader.Read())
@@ -1555,6 +1746,15 @@ public FingerprintGuiApp()
                                 bestFingerIndex = fingerIndex;
                                 bestMember = member;
                             }
+
+                            if (score > 0)
+                            {
+                                var candidate = (personId, fingerIndex, member, score);
+                                if (topCandidates.Count < topK)
+                                    topCandidates.Enqueue(candidate, score);
+                                else if (score > topCandidates.Peek().Score)
+                                    topCandidates.DequeueEnqueue(candidate, score);
+                            }
                         }
                     }
                     catch (Exception ex)
@@ -1567,6 +1767,11 @@ public FingerprintGuiApp()
             }
         }
 
+        var candidates = new List<(string PersonId, int FingerIndex, string Member, double Score)>(topCandidates.Count);
+        while (topCandidates.Count > 0)
+            candidates.Add(topCandidates.Dequeue());
+        candidates.Reverse(); // best first
+
         string resultMessage;
         if (bestScore > 40 && bestPersonId != null)
         {
@@ -1592,6 +1797,13 @@ public FingerprintGuiApp()
                 writer.WriteLine($"SCORE:{bestScore:F2}");
             }
 
+            for (int rank = 0; rank < candidates.Count; rank++)
+            {
+                var c = candidates[rank];
+                string candidateScore = c.Score.ToString("F2", System.Globalization.CultureInfo.InvariantCulture);
+                writer.WriteLine($"CANDIDATE:{rank + 1}|{c.FingerIndex}|{c.Member}|{candidateScore}|{c.PersonId}");
+            }
+
             try
             {
                 using (var ms = new MemoryStream())
@@ -1668,6 +1880,7 @@ public FingerprintGuiApp()
 
         // Live capture
         statusLabel.Text = $"Place your {FingerIndexToString(fingerIndex)} on the scanner...";
+        WriteProgress(writer, "place_finger", $"Place your {FingerIndexToString(fingerIndex)} on the scanner");
         Refresh();
         Bitmap? liveBmp = CaptureBmpFromScanner();
         if (liveBmp == null)
@@ -1678,6 +1891,7 @@ public FingerprintGuiApp()
             writer?.Flush();
             return msg;
         }
+        WriteProgress(writer, "processing", "Comparing with the stored fingerprint");
 
         // Extract and match
         try
@@ -1742,6 +1956,31 @@ public FingerprintGuiApp()
         return (result, bmpBase64 ?? "");
     }
 
+    /// <summary>
+    /// Optional columns the Python API fills from image_bmp (flask_api/schema.py):
+    /// a compressed copy of the image, read in preference to image_bmp, and the
+    /// minutiae template its gallery matches against. Clearing the template makes
+    /// the gallery's update poll re-extract it from the new image.
+    /// </summary>
+    private static readonly string[] DerivedImageColumns =
+        { "image_data", "image_format", "minutiae_template", "extractor_version" };
+
+    /// <summary>
+    /// Returns those of <paramref name="names"/> that exist in fingerprint_templates.
+    /// The API adds its columns on demand, so a database may have none of them.
+    /// </summary>
+    private static List<string> ExistingColumns(MySqlConnection conn, IEnumerable<string> names)
+    {
+        var columns = new HashSet<string>(StringComparer.OrdinalIgnoreCase);
+        using (var cmd = new MySqlCommand("SHOW COLUMNS FROM `fingerprint_templates`", conn))
+        using (var reader = cmd.ExecuteReader())
+        {
+            while (reader.Read())
+                columns.Add(reader.GetString(0));
+        }
+        return names.Where(columns.Contains).ToList();
+    }
+
     private void InsertFingerprintToDatabase(string personId, int fingerIndex, byte[] bmpData, byte[]? templateData, string member = "prisoner")
     {
         // const string connectionString = "server=localhost;user=root;password=sa;database=finger;";
@@ -1757,6 +1996,10 @@ public FingerprintGuiApp()
             ON DUPLICATE KEY UPDATE 
                 `image_bmp` = VALUES(`image_bmp`),
                 `template` = VALUES(`template`)";
+        // A re-capture replaces the image, so whatever the Python API derived from the
+        // previous one must go too, or it keeps serving the old finger.
+        foreach (string column in ExistingColumns(conn, DerivedImageColumns))
+            sql += $",\n                `{column}` = NULL";
 
         Console.WriteLine("Executing SQL: " + sql);
 
@@ -14,16 +14,36 @@ Author: AratekTrustFinger Team
 
 import logging
 import os
+import re
 import base64
-import pymysql
+import binascii
+import json
 import sys
+import threading
+import time
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, url_for
 from capture import capture_fingerprint_bmp
-from verify import verify_fingerprint
-from match import match_fingerprint
+from verify import verify_fingerprint, verify_fingers
+from match import identify_fingerprint, match_fingerprint
 from flask_cors import CORS
-from config import DB_HOST, DB_USER, DB_PASSWORD, DB_NAME
+from db_pool import get_pool
+from image_store import IMAGE_MODES, apply_image_mode, image_digest, live_images
+from image_cache import image_cache
+from image_codec import encode_image, stored_image_to_bmp
+from schema import has_columns
+from template_store import deserialize_template, extract_template, save_templates
+from identification import get_gallery
+from jobs import JOB_DONE, JOB_FAILED, job_manager
+from bridge_client import get_bridge_registry
+from bulk_import import (DEFAULT_PATTERN, MEMBERS, ImportSourceError, default_checkpoint,
+                         resolve_import_source, run_import)
+from scheduler import PRIORITY_NAMES
+import metrics
+import tracing
+from metrics import observe_request, stage_timer
+from config import (API_HOST, API_PORT, DEFAULT_IMAGE_MODE, IMAGE_STORAGE_FORMAT, IMPORT_ROOT, JOB_MAX_STREAMS,
+                    JOB_MAX_WAIT, MATCH_ENGINE, MATCH_MAX_TOP_K, VERIFY_BATCH_MAX_FINGERS)
 
 # Setup logging
 if getattr(sys, 'frozen', False):
@@ -31,17 +51,339 @@ if getattr(sys, 'frozen', False):
     log_file = os.path.join(bundle_dir, 'app.log')
 else:
     log_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.log')
+log_handlers = [
+    logging.FileHandler(log_file, encoding='utf-8'),
+    logging.StreamHandler()
+]
+for handler in log_handlers:
+    handler.addFilter(tracing.CorrelationIdFilter())
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s %(levelname)s %(message)s',
-    handlers=[
-        logging.FileHandler(log_file, encoding='utf-8'),
-        logging.StreamHandler()
-    ]
+    format='%(asctime)s %(levelname)s [%(correlation_id)s] %(message)s',
+    handlers=log_handlers
 )
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=[tracing.CORRELATION_HEADER])
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.before_request
+def start_request_trace():
+    """Root span and correlation ID for the request (see tracing.py)."""
+    route = request.url_rule.rule if request.url_rule else request.path
+    g.trace = tracing.begin_trace(f"{request.method} {route}", request.headers.get(tracing.CORRELATION_HEADER),
+                                  request.headers.get('traceparent'), http_method=request.method, route=route)
+
+@app.after_request
+def record_request_latency(response):
+    """Observe the request in the latency histogram, by route pattern rather than raw path."""
+    started = g.get('request_started')
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        observe_request(request.method, endpoint, response.status_code, time.perf_counter() - started)
+    return response
+
+@app.after_request
+def add_correlation_id(response):
+    trace = g.get('trace')
+    if trace is not None:
+        root = trace[0]
+        root.set(http_status=response.status_code)
+        if response.status_code >= 500:
+            root.fail(f"HTTP {response.status_code}")
+        response.headers[tracing.CORRELATION_HEADER] = root.trace.correlation_id
+    return response
+
+@app.teardown_request
+def end_request_trace(error=None):
+    trace = g.pop('trace', None)
+    if trace is not None:
+        tracing.end_trace(trace, error=error)
+
+def warm_up():
+    """Start the bridge health checks and load the identification gallery in the background.
+
+    Called by the entry points rather than at import time, because gallery
+    scoring workers re-import the main module when they are spawned.
+    """
+    get_bridge_registry().start_health_checks()
+    if MATCH_ENGINE == 'gallery':
+        get_gallery()
+
+BMP_MIMETYPE = 'image/bmp'
+
+def fetch_image_bmp(person_id, finger_index, member):
+    """Load the stored BMP for one finger, or None if there is none.
+
+    Rows migrated to compressed storage are read from image_data and decoded
+    back to BMP; other rows are served from image_bmp.
+    """
+    with get_pool().connection() as conn:
+        compressed = has_columns(conn, 'image_data', 'image_format')
+        with conn.cursor() as cursor:
+            if compressed:
+                cursor.execute("SELECT image_data, image_format, IF(image_data IS NULL, image_bmp, NULL) FROM fingerprint_templates "
+                               "WHERE person_id = %s AND finger_index = %s AND member = %s",
+                               (person_id, finger_index, member))
+            else:
+                cursor.execute("SELECT NULL, NULL, image_bmp FROM fingerprint_templates WHERE person_id = %s AND finger_index = %s AND member = %s",
+                               (person_id, finger_index, member))
+            result = cursor.fetchone()
+    if not result:
+        return None
+    return stored_image_to_bmp(*result)
+
+def save_compressed_image(person_id, finger_index, member, bmp_bytes):
+    """Write the compressed copy of a freshly captured image to image_data."""
+    with get_pool().connection() as conn:
+        if not has_columns(conn, 'image_data', 'image_format'):
+            return
+        encoded = encode_image(bmp_bytes, IMAGE_STORAGE_FORMAT)
+        with conn.cursor() as cursor:
+            cursor.execute("UPDATE fingerprint_templates SET image_data = %s, image_format = %s "
+                           "WHERE person_id = %s AND finger_index = %s AND member = %s",
+                           (encoded, IMAGE_STORAGE_FORMAT, person_id, finger_index, member))
+        conn.commit()
+
+def save_capture_template(person_id, finger_index, member, bmp_bytes):
+    """Extract the minutiae template of a freshly captured image, store it and
+    patch it into the identification gallery."""
+    with get_pool().connection() as conn:
+        store = has_columns(conn, 'minutiae_template', 'extractor_version')
+    if not store and MATCH_ENGINE != 'gallery':
+        return
+    template = extract_template(bmp_bytes)
+    if store:
+        with get_pool().connection() as conn:
+            save_templates(conn, [(person_id, finger_index, member, template)])
+    if MATCH_ENGINE == 'gallery':
+        minutiae, _, _, coarse = deserialize_template(template)
+        get_gallery().add((person_id, finger_index, member), minutiae, coarse)
+
+def load_image(person_id, finger_index, member):
+    """Return ``(image_bmp, sha1)`` for one finger from the image cache or the DB, or None."""
+    key = (person_id, finger_index, member)
+    cached = image_cache.get(key)
+    if cached is not None:
+        return cached
+
+    image_bmp = fetch_image_bmp(person_id, finger_index, member)
+    if image_bmp is None:
+        return None
+    digest = image_digest(image_bmp)
+    image_cache.put(key, image_bmp, digest)
+    return image_bmp, digest
+
+def not_modified(etag):
+    """Return a 304 response if the client's If-None-Match already holds ``etag``."""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+def binary_image_response(image_bmp, digest=None):
+    """Return raw BMP bytes with content type, length and ETag set."""
+    etag = digest or image_digest(image_bmp)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    response = Response(image_bmp, mimetype=BMP_MIMETYPE)
+    response.content_length = len(image_bmp)
+    response.set_etag(etag)
+    return response
+
+def requested_image_mode(data=None, req=None):
+    """Image mode from the JSON body or query string, falling back to DEFAULT_IMAGE_MODE.
+
+    ``req`` defaults to the current Flask request; the asyncio serving mode
+    passes its own request object, which has the same ``args`` and ``headers``.
+    """
+    req = req or request
+    mode = (data or {}).get('image') or req.args.get('image') or DEFAULT_IMAGE_MODE
+    return mode if mode in IMAGE_MODES else DEFAULT_IMAGE_MODE
+
+def wants_binary_image():
+    """True if the Accept header prefers a bitmap over JSON."""
+    best = request.accept_mimetypes.best_match(['application/json', BMP_MIMETYPE])
+    return best == BMP_MIMETYPE
+
+def wants_async(data=None, req=None):
+    """True if the client asked for a job ID instead of waiting for the result.
+
+    Either ``"async": true`` in the JSON body, ``?async=1`` or a
+    ``Prefer: respond-async`` header.
+    """
+    req = req or request
+    return (bool((data or {}).get('async'))
+            or req.args.get('async', '').lower() in ('1', 'true')
+            or 'respond-async' in req.headers.get('Prefer', ''))
+
+def parse_finger_request(data, endpoint):
+    """person_id, finger_index and member from a /capture or /verify body.
+
+    Raises:
+        ValueError: With the message for the 400 response.
+    """
+    if not data:
+        raise ValueError("Invalid JSON")
+    person_id = data.get('person_id')
+    try:
+        finger_index = int(data.get('finger_index', 1))
+    except (TypeError, ValueError):
+        raise ValueError("finger_index must be an integer")
+    member = data.get('member', 'prisoner')
+
+    if not person_id:
+        logging.error(f"Missing person_id in {endpoint} request")
+        raise ValueError("Missing person_id")
+    if member not in ['prisoner', 'suspect']:
+        logging.error(f"Invalid member '{member}' in {endpoint} request")
+        raise ValueError("Member must be 'prisoner' or 'suspect'")
+    return person_id, finger_index, member
+
+def parse_batch_request(data):
+    """finger_indices and probe images from a /verify/batch body.
+
+    Fingers listed in ``finger_indices`` are scanned; each entry of ``probes``
+    supplies an already captured image for its finger, either as
+    ``bmp_base64`` or as the ``image_sha1`` of a recent live capture.
+
+    Returns:
+        tuple: (finger_indices in order, {finger_index: image bytes})
+
+    Raises:
+        ValueError: With the message for the 400 response.
+    """
+    try:
+        finger_indices = data.get('finger_indices') or []
+        probe_list = data.get('probes') or []
+        if not isinstance(finger_indices, list) or not isinstance(probe_list, list):
+            raise TypeError
+        finger_indices = [int(i) for i in finger_indices]
+        probes = {int(probe['finger_index']): probe for probe in probe_list}
+    except (TypeError, ValueError, KeyError):
+        raise ValueError("finger_indices must be a list of integers and each probe needs a finger_index")
+    for finger_index in probes:
+        if finger_index not in finger_indices:
+            finger_indices.append(finger_index)
+    if not finger_indices:
+        raise ValueError("finger_indices or probes is required")
+    if len(set(finger_indices)) != len(finger_indices) or len(probes) != len(probe_list):
+        raise ValueError("Each finger may only be listed once")
+    if len(finger_indices) > VERIFY_BATCH_MAX_FINGERS:
+        raise ValueError(f"At most {VERIFY_BATCH_MAX_FINGERS} fingers per request")
+
+    images = {}
+    for finger_index, probe in probes.items():
+        if probe.get('image_sha1'):
+            images[finger_index] = live_images.get(probe['image_sha1'])
+            if images[finger_index] is None:
+                raise ValueError(f"Live image {probe['image_sha1']} has expired; send bmp_base64 instead")
+        else:
+            try:
+                images[finger_index] = base64.b64decode(probe.get('bmp_base64') or '', validate=True)
+            except (binascii.Error, ValueError):
+                raise ValueError(f"Probe for finger {finger_index} is not valid base64")
+            if not images[finger_index]:
+                raise ValueError(f"Probe for finger {finger_index} needs bmp_base64 or image_sha1")
+    return finger_indices, images
+
+def parse_match_options(data):
+    """match_fingerprint() or identify_fingerprint() options from a /match body.
+
+    ``top_k`` and ``member`` apply to both engines; ``finger_index`` and
+    ``penetration_rate`` only to the gallery engine.
+
+    Raises:
+        ValueError: With the message for the 400 response.
+    """
+    data = data or {}
+    options = {}
+    if data.get('top_k') is not None:
+        try:
+            options['top_k'] = int(data['top_k'])
+        except (TypeError, ValueError):
+            raise ValueError("top_k must be an integer")
+        if not 1 <= options['top_k'] <= MATCH_MAX_TOP_K:
+            raise ValueError(f"top_k must be between 1 and {MATCH_MAX_TOP_K}")
+    if data.get('member') is not None:
+        if data['member'] not in MEMBERS:
+            raise ValueError("Member must be 'prisoner' or 'suspect'")
+        options['member'] = data['member']
+    if MATCH_ENGINE != 'gallery':
+        return options
+    try:
+        if data.get('finger_index') is not None:
+            options['finger_index'] = int(data['finger_index'])
+        if data.get('penetration_rate') is not None:
+            options['penetration_rate'] = float(data['penetration_rate'])
+    except (TypeError, ValueError):
+        raise ValueError("finger_index must be an integer and penetration_rate a number")
+    if not 0 < options.get('penetration_rate', 1.0) <= 1:
+        raise ValueError("penetration_rate must be in (0, 1]")
+    return options
+
+def device_schedule(data, req=None):
+    """Scheduler options for a device request from ``deadline``, ``priority`` and ``station`` in the body.
+
+    ``deadline`` is in seconds from now and covers the time spent queued as
+    a job as well as the wait for the scanner.
+
+    Returns:
+        dict: ``deadline``, ``priority`` and ``station`` keyword arguments for the bridge call.
+
+    Raises:
+        ValueError: If either value is invalid.
+    """
+    data = data or {}
+    schedule = {"priority": PRIORITY_NAMES.get(str(data.get('priority', 'normal')).lower())}
+    if schedule["priority"] is None:
+        raise ValueError(f"priority must be one of {', '.join(PRIORITY_NAMES)}")
+    schedule["deadline"] = None
+    if data.get('deadline') is not None:
+        seconds = float(data['deadline'])
+        if seconds <= 0:
+            raise ValueError("deadline must be a positive number of seconds")
+        schedule["deadline"] = time.monotonic() + seconds
+    schedule["station"] = data.get('station') or (req or request).args.get('station')
+    if schedule["station"] is not None and schedule["station"] not in get_bridge_registry().endpoints:
+        raise ValueError(f"Unknown station '{schedule['station']}'")
+    return schedule
+
+def result_response(result, operation=""):
+    """JSON response for an operation result; 503 with Retry-After if the device scheduler refused it."""
+    with stage_timer('json_encode', operation):
+        response = jsonify(result)
+    if result.get("retry_after") is not None:
+        response.status_code = 503
+        response.headers['Retry-After'] = str(max(int(result["retry_after"] + 0.5), 1))
+    return response
+
+def submit_job(operation, fn, *args, **kwargs):
+    """Queue ``fn`` as a background job and describe it for a 202 response.
+
+    Returns:
+        dict: The job, with its status_url and events_url.
+    """
+    job = job_manager.submit(operation, fn, *args, **kwargs)
+    body = job.to_dict()
+    body["status_url"] = f"/jobs/{job.id}"
+    body["events_url"] = f"/jobs/{job.id}/events"
+    return body
+
+def run_or_submit(operation, fn, data, *args, **kwargs):
+    """Run ``fn`` now and return its result, or queue it as a job if the client asked for one."""
+    if not wants_async(data):
+        return result_response(fn(*args, **kwargs), operation)
+    body = submit_job(operation, fn, *args, **kwargs)
+    response = jsonify(body)
+    response.status_code = 202
+    response.headers['Location'] = body["status_url"]
+    return response
 
 # -----------------------------
 # ✅ GET SAVED IMAGE (BMP) FROM DB
@@ -53,10 +395,12 @@ def get_image():
     Query Parameters:
         person_id (str): The unique identifier of the person
         finger_index (str): The index of the finger (1-10)
-        status (str): Whether the person is "prisoner" or "suspect" (optional, defaults to "prisoner")
+        member (str): Whether the person is "prisoner" or "suspect" (optional, defaults to "prisoner")
+        image (str): "base64" (default) or "url" to return only image_url and image_sha1
     
     Returns:
-        JSON: Contains base64 encoded BMP image or error message
+        JSON: Contains base64 encoded BMP image or error message.
+        With "Accept: image/bmp" the raw bitmap is returned instead.
     """
     person_id = request.args.get('person_id')
     finger_index = request.args.get('finger_index')
@@ -69,23 +413,153 @@ def get_image():
         return jsonify({"error": "member must be 'prisoner' or 'suspect'"}), 400
 
     try:
-        conn = pymysql.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
-        cursor = conn.cursor()
-        cursor.execute("SELECT image_bmp FROM fingerprint_templates WHERE person_id = %s AND finger_index = %s AND member = %s",
-                       (person_id, finger_index, member))
-        result = cursor.fetchone()
-        conn.close()
-
-        if not result:
-            return jsonify({"error": "No image found"}), 404
+        finger_index = int(finger_index)
+    except ValueError:
+        return jsonify({"error": "finger_index must be an integer"}), 400
 
-        image_bmp = result[0]
-        encoded_image = base64.b64encode(image_bmp).decode('utf-8')
-        return jsonify({"image_base64": encoded_image})
+    try:
+        image = load_image(person_id, finger_index, member)
     except Exception as e:
         logging.error(f"Database error in /get-image: {e}")
         return jsonify({"error": "Database connection failed"}), 500
 
+    if image is None:
+        return jsonify({"error": "No image found"}), 404
+    image_bmp, digest = image
+
+    if wants_binary_image():
+        response = binary_image_response(image_bmp, digest)
+        response.vary.add('Accept')
+        return response
+
+    # The JSON representations get their own ETags so they never satisfy a
+    # conditional request for the raw bitmap (or vice versa).
+    mode = requested_image_mode()
+    etag = f"{digest}-{mode}"
+    response = not_modified(etag)
+    if response is None:
+        if mode == 'url':
+            response = jsonify({
+                "image_url": url_for('get_stored_image', person_id=person_id, finger_index=finger_index, member=member),
+                "image_sha1": digest,
+            })
+        else:
+            encoded_image = base64.b64encode(image_bmp).decode('utf-8')
+            response = jsonify({"image_base64": encoded_image})
+        response.set_etag(etag)
+    response.vary.add('Accept')
+    return response
+
+# -----------------------------
+# ✅ BINARY IMAGES
+# -----------------------------
+@app.route('/images/<person_id>/<int:finger_index>', methods=['GET'])
+def get_stored_image(person_id, finger_index):
+    """Return a stored fingerprint image as a raw BMP.
+
+    Query Parameters:
+        member (str): Whether the person is "prisoner" or "suspect" (optional, defaults to "prisoner")
+
+    Returns:
+        image/bmp: The stored bitmap, with Content-Length and ETag headers
+    """
+    member = request.args.get('member', 'prisoner')
+    if member not in ['prisoner', 'suspect']:
+        return jsonify({"error": "member must be 'prisoner' or 'suspect'"}), 400
+
+    try:
+        image = load_image(person_id, finger_index, member)
+    except Exception as e:
+        logging.error(f"Database error in /images: {e}")
+        return jsonify({"error": "Database connection failed"}), 500
+
+    if image is None:
+        return jsonify({"error": "No image found"}), 404
+    return binary_image_response(*image)
+
+@app.route('/live-images/<sha1>', methods=['GET'])
+def get_live_image(sha1):
+    """Return a recent live capture (from /capture, /verify or /match) as a raw BMP.
+
+    Returns:
+        image/bmp: The captured bitmap, or 404 once it has left the live image store
+    """
+    image_bmp = live_images.get(sha1)
+    if image_bmp is None:
+        return jsonify({"error": "No image found"}), 404
+    return binary_image_response(image_bmp)
+
+# -----------------------------
+# ✅ DATABASE POOL METRICS
+# -----------------------------
+@app.route('/db-pool', methods=['GET'])
+def db_pool_stats():
+    """Report connection pool metrics.
+
+    Returns:
+        JSON: Open/idle/in-use connection counts and checkout counters
+    """
+    return jsonify(get_pool().stats())
+
+# -----------------------------
+# ✅ IMAGE CACHE METRICS
+# -----------------------------
+@app.route('/image-cache', methods=['GET'])
+def image_cache_stats():
+    """Report image cache metrics.
+
+    Returns:
+        JSON: Entry count, cached bytes and hit/miss/eviction counters
+    """
+    return jsonify(image_cache.stats())
+
+# -----------------------------
+# ✅ DEVICE QUEUE METRICS
+# -----------------------------
+@app.route('/device-queue', methods=['GET'])
+def device_queue_stats():
+    """Report the scanner queue of every station.
+
+    Returns:
+        JSON: Per station: queue depth, the command holding the scanner, estimated
+        and mean wait in seconds, per-command service estimates and served/rejected/expired counters
+    """
+    return jsonify({station: endpoint.scheduler.stats()
+                    for station, endpoint in get_bridge_registry().endpoints.items()})
+
+# -----------------------------
+# ✅ BRIDGE STATIONS
+# -----------------------------
+@app.route('/stations', methods=['GET'])
+def station_stats():
+    """Report the bridge stations this API routes to.
+
+    Returns:
+        JSON: Per station: address, name reported by PING, breaker state,
+        last health check, connection pool and scanner queue
+    """
+    return jsonify(get_bridge_registry().stats())
+
+# -----------------------------
+# ✅ PROMETHEUS METRICS
+# -----------------------------
+metrics.register(metrics.Gauge(
+    "fingerprint_api_device_queue_depth", "Device requests waiting for each station's scanner.", ("station",),
+    lambda: {(station,): endpoint.scheduler.stats()["depth"]
+             for station, endpoint in get_bridge_registry().endpoints.items()}))
+metrics.register(metrics.Gauge(
+    "fingerprint_api_db_connections", "Database pool connections by state.", ("state",),
+    lambda: {(state,): value for state, value in get_pool().stats().items() if state in ("idle", "in_use")}))
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request and per-stage latency histograms in the Prometheus text format (see metrics.py).
+
+    Returns:
+        text/plain: Histogram buckets, sums and counts, plus queue and pool gauges
+    """
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 # -----------------------------
 # ✅ CAPTURE
 # -----------------------------
@@ -96,31 +570,52 @@ def capture():
     Request Body:
         person_id (str): The unique identifier of the person
         finger_index (int): The index of the finger (1-10)
-        status (str): Whether the person is "prisoner" or "suspect"
+        member (str): Whether the person is "prisoner" or "suspect"
+        image (str): "base64" (default) or "url" to omit bmp_base64
+        async (bool): Return 202 with a job ID instead of waiting (see /jobs)
+        deadline (float): Seconds the request may wait for the scanner (default DEVICE_DEADLINE)
+        priority (str): "high", "normal" (default) or "low" place in the scanner queue
+        station (str): Scanner station to use; omitted routes to the least-loaded one
     
     Returns:
-        JSON: Contains status, message, and base64 encoded BMP image
+        JSON: Contains status, message, base64 encoded BMP image, image_url and image_sha1
     """
-    data = request.get_json()
-    if not data:
-        return jsonify({"status": "error", "message": "Invalid JSON"}), 400
-
-    person_id = data.get('person_id')
-    finger_index = int(data.get('finger_index', 1))
-    member = data.get('member', 'prisoner')
-
-    if not person_id:
-        logging.error("Missing person_id in /capture request")
-        return jsonify({"status": "error", "message": "Missing person_id"}), 400
+    try:
+        with stage_timer('request_parse', 'capture'):
+            data = request.get_json()
+            person_id, finger_index, member = parse_finger_request(data, '/capture')
+            schedule = device_schedule(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
 
-    if member not in ['prisoner', 'suspect']:
-        logging.error(f"Invalid member '{member}' in /capture request")
-        return jsonify({"status": "error", "message": "Member must be 'prisoner' or 'suspect'"}), 400
+    stored_url = url_for('get_stored_image', person_id=person_id, finger_index=finger_index, member=member)
+    return run_or_submit('capture', run_capture, data, person_id, finger_index, member,
+                         requested_image_mode(data), stored_url, schedule)
 
+def run_capture(person_id, finger_index, member, image_mode, stored_url, schedule, on_progress=None):
+    """Capture through the bridge, store the derived copies and build the response body."""
     logging.info(f"Calling capture_fingerprint_bmp({person_id}, {finger_index}, {member})")
-    result = capture_fingerprint_bmp(person_id, finger_index, member)
-    logging.info(f"Bridge response: {result}")
-    return jsonify(result)
+    result = capture_fingerprint_bmp(person_id, finger_index, member, on_progress=on_progress, **schedule)
+    logging.info(f"Bridge response: {result.get('status')} {result.get('message')}")
+    return store_capture(person_id, finger_index, member, result, image_mode, stored_url)
+
+def store_capture(person_id, finger_index, member, result, image_mode, stored_url):
+    """Store the derived copies of a successful capture and build the response body."""
+    if result.get("status") != "success":
+        stored_url = None
+    else:
+        image_cache.invalidate((person_id, finger_index, member))
+        if result.get("bmp_base64"):
+            bmp_bytes = base64.b64decode(result["bmp_base64"])
+            try:
+                save_compressed_image(person_id, finger_index, member, bmp_bytes)
+            except Exception as e:
+                logging.warning(f"Could not store compressed image for {person_id}/{finger_index}: {e}")
+            try:
+                save_capture_template(person_id, finger_index, member, bmp_bytes)
+            except Exception as e:
+                logging.warning(f"Could not store minutiae template for {person_id}/{finger_index}: {e}")
+    return apply_image_mode(result, image_mode, stored_url)
 
 # -----------------------------
 # ✅ VERIFY
@@ -132,49 +627,267 @@ def verify():
     Request Body:
         person_id (str): The unique identifier of the person
         finger_index (int): The index of the finger (1-10)
-        status (str): Whether the person is "prisoner" or "suspect"
+        member (str): Whether the person is "prisoner" or "suspect"
+        image (str): "base64" (default) or "url" to omit bmp_base64
+        async (bool): Return 202 with a job ID instead of waiting (see /jobs)
+        deadline (float): Seconds the request may wait for the scanner (default DEVICE_DEADLINE)
+        priority (str): "high", "normal" (default) or "low" place in the scanner queue
+        station (str): Scanner station to use; omitted routes to the least-loaded one
     
     Returns:
-        JSON: Contains verification result
+        JSON: Contains verification result, image_url and image_sha1
     """
-    data = request.get_json()
-    if not data:
-        return jsonify({"status": "error", "message": "Invalid JSON"}), 400
+    try:
+        with stage_timer('request_parse', 'verify'):
+            data = request.get_json()
+            person_id, finger_index, member = parse_finger_request(data, '/verify')
+            schedule = device_schedule(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
 
-    person_id = data.get('person_id')
-    finger_index = int(data.get('finger_index', 1))
-    member = data.get('member', 'prisoner')
+    return run_or_submit('verify', run_verify, data, person_id, finger_index, member,
+                         requested_image_mode(data), schedule)
 
-    if not person_id:
-        logging.error("Missing person_id in /verify request")
-        return jsonify({"status": "error", "message": "Missing person_id"}), 400
+def run_verify(person_id, finger_index, member, image_mode, schedule, on_progress=None):
+    """Verify through the bridge and build the response body."""
+    logging.info(f"Calling verify_fingerprint({person_id}, {finger_index}, {member})")
+    result = verify_fingerprint(person_id, finger_index, member, on_progress=on_progress, **schedule)
+    logging.info(f"Bridge response: {result.get('status')} {result.get('message')}")
+    return apply_image_mode(result, image_mode)
 
-    if member not in ['prisoner', 'suspect']:
-        logging.error(f"Invalid member '{member}' in /verify request")
-        return jsonify({"status": "error", "message": "Member must be 'prisoner' or 'suspect'"}), 400
+@app.route('/verify/batch', methods=['POST'])
+def verify_batch():
+    """Verify several fingers of one person and return a fused, person-level decision.
 
-    logging.info(f"Calling verify_fingerprint({person_id}, {finger_index}, {member})")
-    result = verify_fingerprint(person_id, finger_index, member)
-    logging.info(f"Bridge response: {result}")
-    return jsonify(result)
+    Request Body:
+        person_id (str): The unique identifier of the person
+        member (str): Whether the person is "prisoner" or "suspect"
+        finger_indices (list): Fingers to scan and verify, in scanning order
+        probes (list): Already captured fingers, not scanned again; each has
+            finger_index and either bmp_base64 or the image_sha1 of a recent live capture
+        image (str): "base64" (default) or "url" to omit each finger's bmp_base64
+        async (bool): Return 202 with a job ID instead of waiting (see /jobs)
+        deadline (float): Seconds the first scan may wait for the scanner (default DEVICE_DEADLINE)
+        priority (str): "high", "normal" (default) or "low" place of the first scan in the scanner queue
+        station (str): Scanner station to use; omitted routes to the least-loaded one
+
+    Returns:
+        JSON: status ("success" or "no_match"), fused score, matched_fingers,
+        compared_fingers and a per-finger "fingers" list with score and image
+    """
+    try:
+        with stage_timer('request_parse', 'verify_batch'):
+            data = request.get_json()
+            person_id, _, member = parse_finger_request(data, '/verify/batch')
+            finger_indices, probes = parse_batch_request(data)
+            schedule = device_schedule(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    return run_or_submit('verify_batch', run_verify_batch, data, person_id, finger_indices, member, probes,
+                         requested_image_mode(data), schedule)
+
+def run_verify_batch(person_id, finger_indices, member, probes, image_mode, schedule, on_progress=None):
+    """Verify a set of fingers and build the response body."""
+    logging.info(f"Calling verify_fingers({person_id}, {finger_indices}, {member}, {len(probes)} probe(s))")
+    try:
+        result = verify_fingers(person_id, finger_indices, member, probes, on_progress=on_progress, **schedule)
+    except Exception as e:
+        logging.error(f"Batch verification failed for {person_id}: {e}")
+        return {"status": "error", "message": f"Batch verification failed: {e}"}
+    logging.info(f"Batch verify: {result.get('status')} {result.get('message')}")
+    for finger in result.get("fingers", []):
+        apply_image_mode(finger, image_mode)
+    return result
 
 # -----------------------------
 # ✅ MATCH
 # -----------------------------
 @app.route('/match', methods=['POST'])
 def match():
-    """Match a captured fingerprint against all stored templates."""
-    logging.info("Calling match_fingerprint()")
-    result = match_fingerprint()
-    logging.info(f"Bridge response: {result}")
-    return jsonify(result)
+    """Match a captured fingerprint against all stored templates.
+
+    The response carries the best match as before, plus "candidates" (the
+    top_k strongest stored fingers, best first) and "persons" (the same
+    candidates aggregated per person, scored by their best finger).
+
+    Request Body (optional):
+        top_k (int): Number of finger candidates to return (default MATCH_TOP_K)
+        member (str): Only search "prisoner" or "suspect" templates
+        finger_index (int): Only search templates of this finger (1-10), gallery engine only
+        penetration_rate (float): Fraction of the gallery scored after coarse pre-filtering (0-1],
+            gallery engine only
+        image (str): "base64" (default) or "url" to omit bmp_base64
+        async (bool): Return 202 with a job ID instead of waiting (see /jobs)
+        deadline (float): Seconds the request may wait for the scanner (default DEVICE_DEADLINE)
+        priority (str): "high", "normal" (default) or "low" place in the scanner queue
+        station (str): Scanner station to use; omitted routes to the least-loaded one
+    """
+    try:
+        with stage_timer('request_parse', 'match'):
+            data = request.get_json(silent=True)
+            options = parse_match_options(data)
+            schedule = device_schedule(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return run_or_submit('match', run_match, data, requested_image_mode(data), options, schedule)
+
+def run_match(image_mode, options, schedule, on_progress=None):
+    """Identify with the configured engine and build the response body."""
+    if MATCH_ENGINE == 'gallery':
+        logging.info(f"Calling identify_fingerprint({options})")
+        result = identify_fingerprint(on_progress=on_progress, **options, **schedule)
+    else:
+        logging.info(f"Calling match_fingerprint({options})")
+        result = match_fingerprint(on_progress=on_progress, **options, **schedule)
+    logging.info(f"Bridge response: {result.get('status')} {result.get('message')}")
+    return apply_image_mode(result, image_mode)
+
+# -----------------------------
+# ✅ BULK IMPORT
+# -----------------------------
+@app.route('/imports', methods=['POST'])
+def start_import():
+    """Start a bulk enrollment import as a background job (see bulk_import.py).
+
+    Only sources inside IMPORT_ROOT are accepted; with IMPORT_ROOT unset the
+    endpoint is disabled and imports run from the command line only.
+
+    Request Body:
+        source (str): Directory, zip or tar archive inside IMPORT_ROOT (relative to it)
+        member (str): "prisoner" (default) or "suspect" for entries whose path names none
+        pattern (str): Regex with person_id and finger_index groups matched against entry paths
+        overwrite (bool): Replace fingers already on file (default false)
+        resume (bool): Continue from the <source>.import.json checkpoint (default true); false starts over
+        limit (int): Stop after this many entries
+
+    Returns:
+        JSON: 202 with the job; progress reports fingers imported and fingers/sec
+    """
+    if not IMPORT_ROOT:
+        return jsonify({"status": "error",
+                        "message": "Bulk import over HTTP is disabled; set IMPORT_ROOT or run bulk_import.py"}), 403
+    data = request.get_json(silent=True) or {}
+    member = data.get('member', 'prisoner')
+    pattern = data.get('pattern') or DEFAULT_PATTERN
+    if not isinstance(data.get('source'), str) or not data['source']:
+        return jsonify({"status": "error", "message": "source must be an existing directory or archive"}), 400
+    try:
+        source = resolve_import_source(data['source'], IMPORT_ROOT)
+    except ImportSourceError as e:
+        logging.warning(f"[Import] Rejected source {data['source']!r}: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if member not in MEMBERS:
+        return jsonify({"status": "error", "message": "Member must be 'prisoner' or 'suspect'"}), 400
+    try:
+        groups = re.compile(pattern).groupindex
+        limit = int(data['limit']) if data.get('limit') is not None else None
+    except (re.error, TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": f"Invalid pattern or limit: {e}"}), 400
+    if 'person_id' not in groups or 'finger_index' not in groups:
+        return jsonify({"status": "error", "message": "pattern needs person_id and finger_index groups"}), 400
+
+    checkpoint = default_checkpoint(source)
+    if not data.get('resume', True) and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    body = submit_job('import', run_import, source, member, pattern, checkpoint_path=checkpoint,
+                      overwrite=bool(data.get('overwrite')), limit=limit)
+    response = jsonify(body)
+    response.status_code = 202
+    response.headers['Location'] = body["status_url"]
+    return response
+
+# -----------------------------
+# ✅ JOBS
+# -----------------------------
+@app.route('/jobs', methods=['GET'])
+def job_stats():
+    """Report job queue metrics.
+
+    Returns:
+        JSON: Queued/running/finished job counts and submission counters
+    """
+    return jsonify(job_manager.stats())
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Return the state of a job, optionally long-polling for progress.
+
+    Query Parameters:
+        wait (float): Seconds to wait for a new event or completion (capped at JOB_MAX_WAIT)
+        after (int): Sequence number of the last event already seen; includes newer events
+
+    Returns:
+        JSON: Job status, latest stage and message, events when requested, and the
+        operation's result once finished
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown or expired job"}), 404
+    try:
+        wait = min(float(request.args.get('wait', 0)), JOB_MAX_WAIT)
+        after = request.args.get('after')
+        after = int(after) if after is not None else None
+    except ValueError:
+        return jsonify({"status": "error", "message": "wait and after must be numbers"}), 400
+    if wait > 0 and not job.done:
+        job.wait(after or 0, wait)
+    return jsonify(job.to_dict(after))
+
+# Each open event stream holds a server thread for as long as the job runs.
+job_stream_slots = threading.BoundedSemaphore(JOB_MAX_STREAMS)
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Stream a job's progress as Server-Sent Events.
+
+    Each event is sent as ``event: progress`` with the event JSON; the stream
+    ends with ``event: result`` carrying the full job once it finishes. A
+    reconnecting client's Last-Event-ID resumes after the events it has seen.
+    At most JOB_MAX_STREAMS streams are open at once; beyond that the request
+    gets 503 and should long-poll ``/jobs/<job_id>?wait=`` instead.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown or expired job"}), 404
+    try:
+        after = int(request.headers.get('Last-Event-ID') or request.args.get('after') or 0)
+    except ValueError:
+        after = 0
+    if not job_stream_slots.acquire(blocking=False):
+        logging.warning(f"[Jobs] Refused event stream for job {job_id}: {JOB_MAX_STREAMS} streams open")
+        response = jsonify({"status": "error",
+                            "message": "Too many open event streams; long-poll status_url instead",
+                            "status_url": f"/jobs/{job_id}?wait={JOB_MAX_WAIT}&after={after}"})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(JOB_MAX_WAIT)
+        return response
+
+    def stream(after):
+        while True:
+            events = job.wait(after, timeout=15)
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            for event in events:
+                after = event["seq"]
+                yield f"id: {after}\nevent: progress\ndata: {json.dumps(event)}\n\n"
+            if events[-1]["stage"] in (JOB_DONE, JOB_FAILED):
+                yield f"event: result\ndata: {json.dumps(job.to_dict())}\n\n"
+                return
+
+    response = Response(stream(after), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(job_stream_slots.release)
+    return response
 
 # -----------------------------
 # ✅ RUN SERVER
 # -----------------------------
 if __name__ == '__main__':
     try:
-        logging.info("Starting Flask API service on http://0.0.0.0:5001")
-        app.run(host='0.0.0.0', port=5001, debug=False)
+        logging.info(f"Starting Flask API service on http://{API_HOST}:{API_PORT}")
+        warm_up()
+        app.run(host=API_HOST, port=API_PORT, debug=False)
     except Exception as e:
         logging.exception("Exception occurred while running the Flask API service: %s", e)
@@ -0,0 +1,238 @@
+"""Asyncio serving mode for the fingerprint API.
+
+The Flask app is synchronous, and so is the server fingerprintapi.py runs it
+with. A client waiting for a finger on the scanner therefore holds an OS
+thread for up to a minute. In this mode the device-bound routes (POST
+/capture, /verify and /match) are served by Quart coroutines, which talk
+to the bridge through asyncio streams (async_bridge). Hundreds of waiting
+clients then cost hundreds of coroutines, not hundreds of threads.
+
+Every other route is still served by the unchanged Flask app, through
+Hypercorn's WSGI adapter on a bounded thread pool. These routes are short
+database and cache reads, so the URLs and JSON contracts are the same in
+both modes. Blocking database writes made by the async routes (storing a
+capture) are offloaded to the same pool.
+
+Requires the optional ``quart`` and ``hypercorn`` packages, pinned to
+versions that match the Flask/Werkzeug in requirements.txt:
+
+    pip install -r requirements-async.txt
+    python async_app.py
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import app as flask_api
+from capture import capture_fingerprint_bmp_async
+from config import API_HOST, API_PORT, ASYNC_OFFLOAD_THREADS, MATCH_ENGINE
+from match import identify_fingerprint_async, match_fingerprint_async
+from metrics import observe_request, stage_timer
+import tracing
+from verify import verify_fingerprint_async
+
+try:
+    from quart import Quart, g, jsonify, request
+    from hypercorn.middleware import AsyncioWSGIMiddleware
+    QUART_AVAILABLE = True
+except ImportError:
+    QUART_AVAILABLE = False
+
+# Served by coroutines for POST; everything else goes to the Flask app.
+ASYNC_ROUTES = ("/capture", "/verify", "/match")
+
+
+def _result_response(result, operation):
+    """Quart counterpart of app.result_response()."""
+    with stage_timer('json_encode', operation):
+        response = jsonify(result)
+    if result.get("retry_after") is not None:
+        response.status_code = 503
+        response.headers['Retry-After'] = str(max(int(result["retry_after"] + 0.5), 1))
+    return response
+
+
+def _job_response(operation, fn, *args):
+    """Queue a background job exactly as the Flask routes do and answer 202."""
+    body = flask_api.submit_job(operation, fn, *args)
+    response = jsonify(body)
+    response.status_code = 202
+    response.headers['Location'] = body["status_url"]
+    return response
+
+
+def _error(message):
+    return jsonify({"status": "error", "message": message}), 400
+
+
+def create_device_app():
+    """Build the Quart app serving the device-bound routes.
+
+    Validation, job submission and response bodies are shared with the
+    Flask routes in app.py, so both modes answer identically.
+    """
+    device_app = Quart(__name__)
+    stored_urls = flask_api.app.url_map.bind("")
+
+    @device_app.before_request
+    async def start_request_timer():
+        g.request_started = time.perf_counter()
+        route = request.url_rule.rule if request.url_rule else request.path
+        g.trace = tracing.begin_trace(f"{request.method} {route}", request.headers.get(tracing.CORRELATION_HEADER),
+                                      request.headers.get('traceparent'), http_method=request.method, route=route)
+
+    @device_app.teardown_request
+    async def end_request_trace(error=None):
+        trace = g.pop('trace', None)
+        if trace is not None:
+            tracing.end_trace(trace, error=error)
+
+    @device_app.after_request
+    async def allow_cors(response):
+        # Same headers flask_cors sends for the Flask routes, including on preflight OPTIONS.
+        response.headers.setdefault('Access-Control-Allow-Origin', '*')
+        response.headers.setdefault('Access-Control-Expose-Headers', tracing.CORRELATION_HEADER)
+        if request.method == 'OPTIONS':
+            response.headers.setdefault('Access-Control-Allow-Methods', 'POST, OPTIONS')
+            allow_headers = request.headers.get('Access-Control-Request-Headers')
+            if allow_headers:
+                response.headers.setdefault('Access-Control-Allow-Headers', allow_headers)
+        started = g.get('request_started')
+        if started is not None:
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            observe_request(request.method, endpoint, response.status_code, time.perf_counter() - started)
+        trace = g.get('trace')
+        if trace is not None:
+            trace[0].set(http_status=response.status_code)
+            if response.status_code >= 500:
+                trace[0].fail(f"HTTP {response.status_code}")
+            response.headers[tracing.CORRELATION_HEADER] = trace[0].trace.correlation_id
+        return response
+
+    @device_app.route('/capture', methods=['POST'])
+    async def capture():
+        try:
+            with stage_timer('request_parse', 'capture'):
+                data = await request.get_json(silent=True)
+                person_id, finger_index, member = flask_api.parse_finger_request(data, '/capture')
+                schedule = flask_api.device_schedule(data, request)
+        except (TypeError, ValueError) as e:
+            return _error(str(e))
+        image_mode = flask_api.requested_image_mode(data, request)
+        stored_url = stored_urls.build('get_stored_image', {
+            'person_id': person_id, 'finger_index': finger_index, 'member': member})
+        if flask_api.wants_async(data, request):
+            return _job_response('capture', flask_api.run_capture, person_id, finger_index, member,
+                                 image_mode, stored_url, schedule)
+
+        logging.info(f"Calling capture_fingerprint_bmp_async({person_id}, {finger_index}, {member})")
+        result = await capture_fingerprint_bmp_async(person_id, finger_index, member, **schedule)
+        logging.info(f"Bridge response: {result.get('status')} {result.get('message')}")
+        body = await asyncio.to_thread(flask_api.store_capture, person_id, finger_index, member,
+                                       result, image_mode, stored_url)
+        return _result_response(body, 'capture')
+
+    @device_app.route('/verify', methods=['POST'])
+    async def verify():
+        try:
+            with stage_timer('request_parse', 'verify'):
+                data = await request.get_json(silent=True)
+                person_id, finger_index, member = flask_api.parse_finger_request(data, '/verify')
+                schedule = flask_api.device_schedule(data, request)
+        except (TypeError, ValueError) as e:
+            return _error(str(e))
+        image_mode = flask_api.requested_image_mode(data, request)
+        if flask_api.wants_async(data, request):
+            return _job_response('verify', flask_api.run_verify, person_id, finger_index, member,
+                                 image_mode, schedule)
+
+        logging.info(f"Calling verify_fingerprint_async({person_id}, {finger_index}, {member})")
+        result = await verify_fingerprint_async(person_id, finger_index, member, **schedule)
+        logging.info(f"Bridge response: {result.get('status')} {result.get('message')}")
+        return _result_response(flask_api.apply_image_mode(result, image_mode), 'verify')
+
+    @device_app.route('/match', methods=['POST'])
+    async def match():
+        try:
+            with stage_timer('request_parse', 'match'):
+                data = await request.get_json(silent=True)
+                options = flask_api.parse_match_options(data)
+                schedule = flask_api.device_schedule(data, request)
+        except (TypeError, ValueError) as e:
+            return _error(str(e))
+        image_mode = flask_api.requested_image_mode(data, request)
+        if flask_api.wants_async(data, request):
+            return _job_response('match', flask_api.run_match, image_mode, options, schedule)
+
+        if MATCH_ENGINE == 'gallery':
+            logging.info(f"Calling identify_fingerprint_async({options})")
+            result = await identify_fingerprint_async(**options, **schedule)
+        else:
+            logging.info(f"Calling match_fingerprint_async({options})")
+            result = await match_fingerprint_async(**options, **schedule)
+        logging.info(f"Bridge response: {result.get('status')} {result.get('message')}")
+        return _result_response(flask_api.apply_image_mode(result, image_mode), 'match')
+
+    return device_app
+
+
+class RouteSplitter:
+    """ASGI app sending device-bound POSTs (and their preflights) to Quart and the rest to Flask.
+
+    Args:
+        device_app: ASGI app for ASYNC_ROUTES.
+        wsgi_app: The Flask app, run on the event loop's default executor.
+    """
+
+    def __init__(self, device_app, wsgi_app):
+        self.device_app = device_app
+        self.wsgi_app = AsyncioWSGIMiddleware(wsgi_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan" or (
+                scope["type"] == "http" and scope["method"] in ("POST", "OPTIONS") and scope["path"] in ASYNC_ROUTES):
+            await self.device_app(scope, receive, send)
+        else:
+            await self.wsgi_app(scope, receive, send)
+
+
+def create_asgi_app():
+    """The ASGI application for this serving mode.
+
+    Raises:
+        RuntimeError: If the optional ``quart`` package is not installed.
+    """
+    if not QUART_AVAILABLE:
+        raise RuntimeError("The asyncio serving mode requires the optional 'quart>=0.19' package")
+    device_app = create_device_app()
+
+    @device_app.before_serving
+    async def start():
+        # Bounded pool for the Flask routes and the blocking work offloaded by the async ones.
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=ASYNC_OFFLOAD_THREADS, thread_name_prefix="offload"))
+        flask_api.warm_up()
+
+    return RouteSplitter(device_app, flask_api.app)
+
+
+async def serve(host=API_HOST, port=API_PORT, shutdown_trigger=None):
+    """Serve the ASGI app with Hypercorn until ``shutdown_trigger`` completes (or forever)."""
+    from hypercorn.asyncio import serve as hypercorn_serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [f"{host}:{port}"]
+    config.accesslog = None
+    kwargs = {"shutdown_trigger": shutdown_trigger} if shutdown_trigger is not None else {}
+    await hypercorn_serve(create_asgi_app(), config, **kwargs)
+
+
+if __name__ == '__main__':
+    try:
+        logging.info(f"Starting async fingerprint API on http://{API_HOST}:{API_PORT}")
+        asyncio.run(serve())
+    except Exception as e:
+        logging.exception("Exception occurred while running the async API service: %s", e)
@@ -0,0 +1,182 @@
+"""Non-blocking bridge client for the asyncio serving mode (see async_app).
+
+Speaks the same framed and legacy protocols as bridge_client over asyncio
+streams, so a request waiting for a finger on the scanner costs a coroutine
+instead of an OS thread. Stations, circuit breakers and device queues are
+shared with bridge_client's registry. The scanner therefore stays serialised,
+and breakers stay accurate, when threads (background jobs) and coroutines
+both send it commands. Breaker accounting, failover and error responses are
+bridge_client's own helpers, so both paths apply one policy.
+"""
+
+import asyncio
+import itertools
+import socket
+import time
+
+from bridge_client import (breaker_accounting, error_response, fail_over, finish_response,
+                           get_bridge_registry)
+from bridge_reader import BridgeProtocolError, BridgeResponseParser
+from config import BRIDGE_CONNECT_TIMEOUT, BRIDGE_POOL_SIZE, BRIDGE_PROTOCOL
+from metrics import observe_stage
+import tracing
+from scheduler import PRIORITY_NORMAL, is_device_command
+
+END_PREFIX = b"END "
+LINE_LIMIT = 16 * 1024 * 1024   # longest response line (the base64 BMP) the stream reader accepts
+
+_ids = itertools.count(1)
+_idle = {}                      # station_id -> idle AsyncBridgeConnection list, most recent last
+
+
+class AsyncBridgeConnection:
+    """A framed connection to one bridge, driven by asyncio streams."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.requests_served = 0
+
+    @classmethod
+    async def open(cls, endpoint):
+        start = time.perf_counter()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(endpoint.host, endpoint.port, limit=LINE_LIMIT), BRIDGE_CONNECT_TIMEOUT)
+        observe_stage("bridge_connect", time.perf_counter() - start)
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return cls(reader, writer)
+
+    async def request(self, command, timeout, parser):
+        """Send one framed command and feed its response lines to ``parser``.
+
+        Raises:
+            ConnectionError: If the bridge closed the connection before END.
+            BridgeProtocolError: If the END line carries a different request ID.
+            socket.timeout: If no line arrives within ``timeout`` seconds.
+        """
+        request_id = tracing.frame_id(next(_ids))
+        parser.sent_at = time.perf_counter()
+        self.writer.write(f"REQ {request_id} {command.strip()}\n".encode())
+        await self.writer.drain()
+        while True:
+            line = await _read_line(self.reader, timeout)
+            if line is None:
+                raise ConnectionError("Bridge closed the connection before end of response")
+            if line.startswith(END_PREFIX):
+                end_id = line[len(END_PREFIX):].strip().decode(errors="ignore")
+                if end_id != str(request_id):
+                    raise BridgeProtocolError(f"Expected END {request_id}, got END {end_id}")
+                self.requests_served += 1
+                return
+            parser.feed_line(line)
+
+    def close(self):
+        self.writer.close()
+
+
+async def _read_line(reader, timeout):
+    """Next line without its newline, or None at end of stream."""
+    try:
+        line = await asyncio.wait_for(reader.readuntil(b"\n"), timeout)
+    except asyncio.TimeoutError:
+        raise socket.timeout(f"No response line within {timeout} seconds") from None
+    except asyncio.IncompleteReadError as e:
+        return e.partial or None
+    return line[:-1]
+
+
+async def _request_framed(endpoint, command, timeout, parser):
+    idle = _idle.setdefault(endpoint.station_id, [])
+    reused = bool(idle)
+    conn = idle.pop() if reused else await AsyncBridgeConnection.open(endpoint)
+    try:
+        await conn.request(command, timeout, parser)
+    except (ConnectionError, BridgeProtocolError) as e:
+        conn.close()
+        if reused and isinstance(e, ConnectionError) and parser.is_empty():
+            # The bridge may have been restarted while the connection sat idle.
+            conn = await AsyncBridgeConnection.open(endpoint)
+            try:
+                await conn.request(command, timeout, parser)
+            except BaseException:
+                conn.close()
+                raise
+        else:
+            raise
+    except BaseException:
+        conn.close()
+        raise
+    if len(idle) < BRIDGE_POOL_SIZE:
+        idle.append(conn)
+    else:
+        conn.close()
+
+
+async def _request_legacy(endpoint, command, timeout, parser):
+    start = time.perf_counter()
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(endpoint.host, endpoint.port, limit=LINE_LIMIT), BRIDGE_CONNECT_TIMEOUT)
+    observe_stage("bridge_connect", time.perf_counter() - start)
+    try:
+        parser.sent_at = time.perf_counter()
+        writer.write(command.encode())
+        await writer.drain()
+        while (line := await _read_line(reader, timeout)) is not None:
+            parser.feed_line(line)
+    finally:
+        writer.close()
+
+
+async def _request(endpoint, command, timeout, parser):
+    with tracing.span("bridge.exchange", station=endpoint.station_id, protocol=BRIDGE_PROTOCOL):
+        if BRIDGE_PROTOCOL == "legacy":
+            await _request_legacy(endpoint, command, timeout, parser)
+        else:
+            await _request_framed(endpoint, command, timeout, parser)
+
+
+async def _send(endpoint, command, timeout, parser, deadline, priority, on_progress):
+    """Async counterpart of bridge_client._send, with the same breaker accounting."""
+    with breaker_accounting(endpoint, parser):
+        if is_device_command(command):
+            await endpoint.scheduler.run_async(command.split()[0].upper(),
+                                               lambda: _request(endpoint, command, timeout, parser),
+                                               deadline=deadline, priority=priority, on_progress=on_progress)
+        else:
+            await _request(endpoint, command, timeout, parser)
+
+
+async def send_bridge_command_async(command, timeout=30, on_progress=None, deadline=None,
+                                    priority=PRIORITY_NORMAL, station=None):
+    """Coroutine version of bridge_client.send_bridge_command().
+
+    Takes the same arguments and returns the same response dictionary.
+    """
+    with tracing.span(f"bridge {command.split()[0].upper()}", requested_station=station):
+        result = await _send_command(command, timeout, tracing.progress_recorder(on_progress), deadline,
+                                     priority, station)
+        tracing.record_result(result)
+        return result
+
+
+async def _send_command(command, timeout, on_progress, deadline, priority, station):
+    """Mirror of bridge_client._send_command; the policy is in the shared helpers."""
+    registry = get_bridge_registry()
+    endpoint = None
+    try:
+        start_time = time.time()
+        endpoint = registry.select(station)
+        parser = BridgeResponseParser(on_progress=on_progress)
+        try:
+            await _send(endpoint, command, timeout, parser, deadline, priority, on_progress)
+        except ConnectionError as e:
+            endpoint = fail_over(registry, endpoint, station, parser, e)
+            await _send(endpoint, command, timeout, parser, deadline, priority, on_progress)
+        return finish_response(parser, command, endpoint, start_time)
+    except Exception as e:
+        return error_response(e, command, timeout, endpoint)
+    finally:
+        if endpoint is not None:
+            registry.release(endpoint)
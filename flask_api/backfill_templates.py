@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Extract and store minutiae templates for existing fingerprint rows.
+
+Adds the minutiae_template/extractor_version columns if they are missing,
+then walks fingerprint_templates in key order and fills in a template for
+every row that has none or whose template came from an older extractor
+version. Safe to stop and re-run; finished rows are skipped.
+
+Usage:
+    python backfill_templates.py [--batch-size 200] [--workers 4] [--sleep 0]
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from db_pool import get_pool
+from image_codec import stored_image_to_bmp
+from minutiae import EXTRACTOR_VERSION
+from schema import ensure_columns
+from template_store import extract_template, fetch_missing_batch, save_templates
+
+
+def _extract_row(row):
+    person_id, finger_index, member, image_data, image_format, image_bmp = row
+    try:
+        blob = extract_template(stored_image_to_bmp(image_data, image_format, image_bmp))
+        return (person_id, finger_index, member, blob), None
+    except Exception as e:
+        return (person_id, finger_index, member, None), str(e)
+
+
+def backfill(batch_size, workers, sleep, limit=None):
+    pool = get_pool()
+    with pool.connection() as conn:
+        added = ensure_columns(conn, "image_data", "image_format", "minutiae_template", "extractor_version")
+    if added:
+        print(f"Added columns: {', '.join(added)}")
+    print(f"Extractor version {EXTRACTOR_VERSION}, {workers} worker(s)")
+
+    after = ("", -1, "")
+    done = failed = 0
+    start = time.time()
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while limit is None or done < limit:
+            with pool.connection() as conn:
+                rows = fetch_missing_batch(conn, after, batch_size)
+            if not rows:
+                break
+
+            results = executor.map(_extract_row, rows, chunksize=8) if executor else map(_extract_row, rows)
+            templates = []
+            for (person_id, finger_index, member, blob), error in results:
+                if error:
+                    failed += 1
+                    print(f"❌ {person_id}/{finger_index}/{member}: {error}")
+                else:
+                    templates.append((person_id, finger_index, member, blob))
+
+            with pool.connection() as conn:
+                save_templates(conn, templates)
+
+            done += len(templates)
+            after = rows[-1][:3]
+            print(f"✅ {done} templates stored ({failed} failed), {done / (time.time() - start):.1f} rows/sec")
+            if sleep:
+                time.sleep(sleep)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    print(f"Done: {done} templates stored, {failed} failed in {time.time() - start:.1f} sec")
+    return done, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="extraction processes")
+    parser.add_argument("--sleep", type=float, default=0.0, help="seconds to pause between batches")
+    parser.add_argument("--limit", type=int, help="stop after this many rows")
+    args = parser.parse_args()
+
+    backfill(args.batch_size, args.workers, args.sleep, args.limit)
+
+
+if __name__ == "__main__":
+    main()
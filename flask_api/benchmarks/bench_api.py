@@ -0,0 +1,567 @@
+#!/usr/bin/env python3
+"""
+Reproducible end-to-end benchmark of the API hot paths.
+
+Runs the production server (wsgi_server, Waitress) against simulated bridge
+stations (bridge_simulator.py) and a local database stand-in, then has
+concurrent keep-alive clients call each endpoint:
+
+    get-image   GET /get-image for a stored finger (image cache as configured)
+    verify      POST /verify for an enrolled finger
+    match       POST /match; with the gallery engine the scanned print is
+                identified in-process against the whole gallery
+    capture     POST /capture, which stores the compressed image and the
+                minutiae template of an enrolled finger
+
+For every gallery size the database is seeded with that many fingers (ten
+per person): random minutiae templates, plus the simulator's prints planted
+at the first rows so /match has a true mate. The first ``--image-rows`` rows
+also hold a stored image for /get-image. The API is started in a fresh
+process per gallery size and loads the gallery through the normal DB loader.
+
+Reported per endpoint, gallery size and concurrency level (each level sends
+``--requests`` requests, or as many as start within ``--max-seconds``):
+
+    req/s          completed requests per second
+    p50/p95/p99    request latency in ms, nearest rank
+    errors         non-2xx responses and connection failures
+
+Database stand-ins:
+    sqlite (default)  a temporary SQLite file behind the API's connection pool;
+                      the MySQL dialect the API speaks is translated per statement
+    mysql             a local MySQL server given with --mysql-host. The
+                      fingerprint_templates table is created if missing and only
+                      rows whose person_id starts with "bench-" are written or deleted.
+
+Every random choice is seeded, so two runs of the same release send the same
+requests. Write the results with --json and pass an earlier file as
+--baseline to flag regressions against it.
+
+Usage:
+    python benchmarks/bench_api.py [--sizes 1000 10000 100000] [--concurrency 1 8 32]
+        [--requests 200] [--max-seconds 60] [--endpoints get-image verify match capture] [--stations 8]
+        [--service-ms 0] [--match-engine gallery] [--db sqlite] [--json results.json]
+        [--baseline previous.json] [--tolerance 0.2]
+"""
+
+import argparse
+import base64
+import datetime
+import http.client
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bridge_simulator import ImagePool, start_stations, synthetic_pool  # noqa: E402
+
+ENDPOINTS = ("get-image", "verify", "match", "capture")
+TABLE = "fingerprint_templates"
+MEMBER = "prisoner"
+PERSON_PREFIX = "bench-"
+SEED_BATCH = 1000
+
+
+# -----------------------------
+# SQLite stand-in
+# -----------------------------
+_SQLITE_REWRITES = [
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\bIF\("), "IIF("),
+    (re.compile(r"\bNOW\(3\)"), "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime') AS \"now [datetime]\""),
+]
+_SHOW_COLUMNS = re.compile(r"^\s*SHOW COLUMNS FROM `?(\w+)`?\s*$", re.IGNORECASE)
+
+sqlite3.register_converter("datetime", lambda value: datetime.datetime.fromisoformat(value.decode()))
+
+SQLITE_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS {TABLE} (
+    person_id TEXT NOT NULL,
+    finger_index INTEGER NOT NULL,
+    member TEXT NOT NULL DEFAULT 'prisoner',
+    image_bmp BLOB,
+    template BLOB,
+    image_data BLOB,
+    image_format TEXT,
+    minutiae_template BLOB,
+    extractor_version INTEGER,
+    updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')),
+    PRIMARY KEY (person_id, finger_index, member)
+)
+"""
+
+
+def to_sqlite(query):
+    """Rewrite one MySQL statement as the API sends it into SQLite's dialect."""
+    match = _SHOW_COLUMNS.match(query)
+    if match:
+        return f"SELECT name FROM pragma_table_info('{match.group(1)}')"
+    for pattern, replacement in _SQLITE_REWRITES:
+        query = pattern.sub(lambda _: replacement, query)
+    return query
+
+
+class SQLiteCursor:
+    """The part of a PyMySQL cursor the API uses."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def execute(self, query, args=None):
+        self._cursor.execute(to_sqlite(query), tuple(args or ()))
+        return self._cursor.rowcount
+
+    def executemany(self, query, args):
+        self._cursor.executemany(to_sqlite(query), [tuple(row) for row in args])
+        return self._cursor.rowcount
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+
+class SQLiteConnection:
+    """The part of a PyMySQL connection the API and db_pool.ConnectionPool use, over a SQLite file."""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False,
+                                     detect_types=sqlite3.PARSE_COLNAMES)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+
+    def cursor(self):
+        return SQLiteCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def ping(self, reconnect=False):
+        self._conn.execute("SELECT 1")
+
+    def close(self):
+        self._conn.close()
+
+
+def connect_factory(settings):
+    """Zero-argument connection factory for the database stand-in in ``settings``."""
+    if settings["db"] == "sqlite":
+        return lambda: SQLiteConnection(settings["db_path"])
+    import pymysql
+    from db_pool import TimedCursor
+    return lambda: pymysql.connect(host=settings["mysql_host"], user=settings["mysql_user"],
+                                   password=settings["mysql_password"], database=settings["mysql_database"],
+                                   cursorclass=TimedCursor)
+
+
+# -----------------------------
+# Seeding
+# -----------------------------
+def row_key(row):
+    """(person_id, finger_index) of gallery row ``row``: ten fingers per person."""
+    return f"{PERSON_PREFIX}{row // 10:07d}", 1 + row % 10
+
+
+def prepare_table(conn, settings):
+    """Create the template table if needed and remove earlier benchmark rows."""
+    with conn.cursor() as cursor:
+        if settings["db"] == "sqlite":
+            cursor.execute(SQLITE_SCHEMA)
+        else:
+            from schema import ensure_columns
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS `{TABLE}` ("
+                           "`person_id` VARCHAR(50) NOT NULL, `finger_index` INT NOT NULL, "
+                           "`member` VARCHAR(20) NOT NULL DEFAULT 'prisoner', `image_bmp` LONGBLOB NULL, "
+                           "`template` BLOB NULL, PRIMARY KEY (`person_id`, `finger_index`, `member`))")
+            conn.commit()
+            ensure_columns(conn, "image_data", "image_format", "minutiae_template", "extractor_version",
+                           "updated_at")
+        cursor.execute(f"DELETE FROM {TABLE} WHERE person_id LIKE %s", (PERSON_PREFIX + "%",))
+    conn.commit()
+
+
+def seed_gallery(conn, size, images, image_rows, seed=0):
+    """Insert ``size`` fingers: the simulator's prints first, then random templates.
+
+    Args:
+        conn: Connection to the database stand-in.
+        size (int): Fingers to enroll.
+        images (ImagePool): The simulator's prints; finger i is planted at row i.
+        image_rows (int): Leading rows that also get a stored image.
+        seed (int): Seed of the random templates.
+    """
+    import numpy as np
+
+    from bench_parallel_search import random_template
+    from config import IMAGE_STORAGE_FORMAT
+    from image_codec import encode_image
+    from minutiae import EXTRACTOR_VERSION, MAX_MINUTIAE
+    from template_store import extract_template, serialize_template
+
+    rng = np.random.default_rng(seed)
+    bmps = [base64.b64decode(impressions[0]) for impressions in images.fingers]
+    planted = [extract_template(bmp) for bmp in bmps]
+    stored = [encode_image(bmp, IMAGE_STORAGE_FORMAT) for bmp in bmps]
+
+    batch = []
+    for row in range(size):
+        if row < len(planted):
+            template = planted[row]
+        else:
+            template = serialize_template(random_template(rng, int(rng.integers(25, MAX_MINUTIAE + 1))))
+        image = stored[row % len(stored)] if row < image_rows else None
+        batch.append((*row_key(row), MEMBER, image, IMAGE_STORAGE_FORMAT if image else None, template,
+                      EXTRACTOR_VERSION))
+        if len(batch) == SEED_BATCH or row == size - 1:
+            with conn.cursor() as cursor:
+                cursor.executemany(f"INSERT INTO {TABLE} (person_id, finger_index, member, image_data, "
+                                   "image_format, minutiae_template, extractor_version) "
+                                   "VALUES (%s, %s, %s, %s, %s, %s, %s)", batch)
+            conn.commit()
+            batch = []
+
+
+# -----------------------------
+# API process
+# -----------------------------
+def serve(settings):
+    """Subprocess entry point: load the gallery from the stand-in database and serve the API."""
+    import config
+    config.BRIDGE_STATIONS = {f"s{i}": address for i, address in enumerate(settings["stations"])}
+    config.DEVICE_QUEUE_MAX = 100000
+    config.DEVICE_SERVICE_ESTIMATE = max(settings["service_ms"], 1) / 1000
+    config.MATCH_ENGINE = settings["match_engine"]
+    # Always load through the DB, never from or into a snapshot, and keep traces off disk.
+    config.GALLERY_SNAPSHOT_PATH = ""
+    config.GALLERY_POLL_INTERVAL = 0
+    config.TRACE_EXPORTER = ""
+    if settings["no_image_cache"]:
+        config.IMAGE_CACHE_MAX_BYTES = 0
+
+    import db_pool
+    db_pool._pool = db_pool.ConnectionPool(connect_factory(settings), max_size=config.DB_POOL_SIZE,
+                                           timeout=config.DB_POOL_TIMEOUT, recycle=config.DB_POOL_RECYCLE,
+                                           ping_interval=config.DB_POOL_PING_INTERVAL)
+
+    loaded = load_seconds = None
+    if config.MATCH_ENGINE == "gallery":
+        from identification import get_gallery, load_gallery_from_db
+        start = time.perf_counter()
+        loaded = load_gallery_from_db(get_gallery(start_loading=False), db_pool.get_pool())
+        load_seconds = time.perf_counter() - start
+
+    import app
+    from wsgi_server import create_server
+    app.warm_up()
+    server = create_server(app.app, "127.0.0.1", settings["port"])
+    with open(settings["ready_file"], "w") as f:
+        json.dump({"gallery_templates": loaded, "gallery_load_seconds": load_seconds}, f)
+    server.serve_forever()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_api(settings, workdir, timeout):
+    """Start the API subprocess and wait until it serves; returns (process, port, ready info)."""
+    port = free_port()
+    ready_file = os.path.join(workdir, f"ready-{port}.json")
+    log_path = os.path.join(workdir, f"server-{port}.log")
+    settings = dict(settings, port=port, ready_file=ready_file)
+    with open(log_path, "w") as log:
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", json.dumps(settings)],
+                                   stdout=subprocess.DEVNULL, stderr=log)
+    deadline = time.time() + timeout
+    while not os.path.exists(ready_file):
+        if process.poll() is not None or time.time() > deadline:
+            process.kill()
+            with open(log_path, errors="replace") as f:
+                tail = f.read()[-2000:]
+            raise RuntimeError(f"API process did not start:\n{tail}")
+        time.sleep(0.2)
+    time.sleep(0.2)
+    with open(ready_file) as f:
+        return process, port, json.load(f)
+
+
+# -----------------------------
+# Load generator
+# -----------------------------
+def build_request(endpoint, rng, size, image_rows, image_mode):
+    """(method, path, body) of one request to ``endpoint``."""
+    if endpoint == "get-image":
+        person_id, finger_index = row_key(rng.randrange(image_rows))
+        path = f"/get-image?person_id={person_id}&finger_index={finger_index}&member={MEMBER}"
+        return "GET", path + ("&image=url" if image_mode == "url" else ""), None
+    body = {"image": image_mode}
+    if endpoint in ("verify", "capture"):
+        body["person_id"], body["finger_index"] = row_key(rng.randrange(size))
+        body["member"] = MEMBER
+    return "POST", f"/{endpoint}", json.dumps(body)
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    return ordered[min(max(int(len(ordered) * fraction + 0.5) - 1, 0), len(ordered) - 1)]
+
+
+def run_level(port, endpoint, concurrency, requests, max_seconds, size, image_rows, image_mode, seed):
+    """Send ``requests`` requests to ``endpoint`` from ``concurrency`` keep-alive clients.
+
+    No new request starts after ``max_seconds`` (0 for no limit), so slow
+    configurations such as /match on a large gallery report fewer samples
+    instead of running for hours.
+    """
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    sent = 0
+    cutoff = time.perf_counter() + max_seconds if max_seconds else float("inf")
+
+    def take():
+        nonlocal sent
+        with lock:
+            sent += 1
+            return sent <= requests and (sent <= concurrency or time.perf_counter() < cutoff)
+
+    def client(n):
+        rng = random.Random(f"{seed}/{endpoint}/{size}/{concurrency}/{n}")
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        headers = {"Content-Type": "application/json"}
+        while take():
+            method, path, body = build_request(endpoint, rng, size, image_rows, image_mode)
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                status = 0
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] += 1
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "endpoint": endpoint,
+        "gallery_size": size,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "requests_per_second": len(latencies) / elapsed,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "errors": sum(count for status, count in statuses.items() if not 200 <= status < 300),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+# -----------------------------
+# Reporting
+# -----------------------------
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, baseline_path, tolerance):
+    """Print how each result moved against a baseline file; returns the regressed rows."""
+    with open(baseline_path) as f:
+        baseline = {(r["endpoint"], r["gallery_size"], r["concurrency"]): r for r in json.load(f)["results"]}
+    regressions = []
+    print(f"Compared with {baseline_path} (tolerance {tolerance:.0%})")
+    print("=" * 66)
+    print(f"{'endpoint':>9} | {'size':>7} | {'conc':>4} | {'req/s':>9} | {'p95':>9} | {'verdict':>10}")
+    print("-" * 66)
+    for result in results:
+        key = (result["endpoint"], result["gallery_size"], result["concurrency"])
+        before = baseline.get(key)
+        if before is None:
+            continue
+        throughput = result["requests_per_second"] / before["requests_per_second"] - 1
+        p95 = result["p95_ms"] / before["p95_ms"] - 1
+        regressed = throughput < -tolerance or p95 > tolerance
+        if regressed:
+            regressions.append(key)
+        print(f"{key[0]:>9} | {key[1]:>7} | {key[2]:>4} | {throughput:>+9.1%} | {p95:>+9.1%} | "
+              f"{'REGRESSED' if regressed else 'ok':>10}")
+    print("=" * 66)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="gallery sizes in fingers")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and concurrency level")
+    parser.add_argument("--max-seconds", type=float, default=60,
+                        help="stop sending a level's requests after this long; 0 for no limit")
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS), choices=ENDPOINTS)
+    parser.add_argument("--stations", type=int, default=8, help="simulated bridge stations")
+    parser.add_argument("--service-ms", type=float, default=0, help="simulated scanner time per command")
+    parser.add_argument("--image-rows", type=int, default=1000, help="leading gallery rows with a stored image")
+    parser.add_argument("--image", dest="image_mode", choices=["base64", "url"], default="base64",
+                        help="image representation requested in responses")
+    parser.add_argument("--no-image-cache", action="store_true", help="serve every /get-image from the database")
+    parser.add_argument("--match-engine", choices=["gallery", "bridge"], default="gallery")
+    parser.add_argument("--db", choices=["sqlite", "mysql"], default="sqlite", help="database stand-in")
+    parser.add_argument("--mysql-host", default="127.0.0.1")
+    parser.add_argument("--mysql-user", default="root")
+    parser.add_argument("--mysql-password", default="")
+    parser.add_argument("--mysql-database", default="fingerprint_bench")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start-timeout", type=float, default=900, help="seconds to wait for the gallery load")
+    parser.add_argument("--json", help="write results to this file as JSON")
+    parser.add_argument("--baseline", help="earlier --json output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="relative drop in req/s or rise in p95 counted as a regression")
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(json.loads(args.serve))
+        return
+
+    images = synthetic_pool(fingers=8, impressions=2)
+    images = ImagePool(images.fingers, labels=[row_key(row) for row in range(len(images.fingers))])
+    if min(args.sizes) < len(images.fingers):
+        parser.error(f"gallery sizes must be at least {len(images.fingers)}")
+    stations, _ = start_stations(args.stations, images, latency_ms=args.service_ms, jitter_ms=0,
+                                 processing_ms=0, match_rate=1.0, seed=args.seed)
+
+    workdir = tempfile.mkdtemp(prefix="bench_api_")
+    settings = {
+        "stations": stations,
+        "service_ms": args.service_ms,
+        "match_engine": args.match_engine,
+        "no_image_cache": args.no_image_cache,
+        "db": args.db,
+        "db_path": os.path.join(workdir, "gallery.sqlite3"),
+        "mysql_host": args.mysql_host,
+        "mysql_user": args.mysql_user,
+        "mysql_password": args.mysql_password,
+        "mysql_database": args.mysql_database,
+    }
+    print(f"{len(args.endpoints)} endpoints x {len(args.concurrency)} concurrency levels x "
+          f"{args.requests} requests per gallery size; {args.stations} stations at {args.service_ms:.0f} ms, "
+          f"{args.db} database, {args.match_engine} match engine")
+
+    results = []
+    galleries = []
+    try:
+        for size in args.sizes:
+            image_rows = min(args.image_rows, size)
+            conn = connect_factory(settings)()
+            try:
+                start = time.perf_counter()
+                prepare_table(conn, settings)
+                seed_gallery(conn, size, images, image_rows, seed=args.seed)
+                seed_seconds = time.perf_counter() - start
+            finally:
+                conn.close()
+
+            process, port, ready = start_api(settings, workdir, args.start_timeout)
+            try:
+                galleries.append({"gallery_size": size, "seed_seconds": seed_seconds, **ready})
+                loaded = (f", gallery loaded in {ready['gallery_load_seconds']:.1f} sec"
+                          if ready["gallery_load_seconds"] is not None else "")
+                print(f"\nGallery of {size} fingers (seeded in {seed_seconds:.1f} sec{loaded})")
+                print("=" * 82)
+                print(f"{'endpoint':>9} | {'conc':>4} | {'req/s':>8} | {'p50 ms':>8} | {'p95 ms':>8} | "
+                      f"{'p99 ms':>8} | {'max ms':>8} | {'errors':>6}")
+                print("-" * 82)
+                for endpoint in args.endpoints:
+                    for concurrency in args.concurrency:
+                        result = run_level(port, endpoint, concurrency, args.requests, args.max_seconds, size,
+                                           image_rows, args.image_mode, args.seed)
+                        results.append(result)
+                        print(f"{endpoint:>9} | {concurrency:>4} | {result['requests_per_second']:>8.1f} | "
+                              f"{result['p50_ms']:>8.1f} | {result['p95_ms']:>8.1f} | {result['p99_ms']:>8.1f} | "
+                              f"{result['max_ms']:>8.1f} | {result['errors']:>6}")
+                print("=" * 82)
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+        if args.db == "mysql":
+            conn = connect_factory(settings)()
+            try:
+                prepare_table(conn, settings)
+            finally:
+                conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        report = {
+            "benchmark": "api",
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "environment": {"commit": git_commit(), "python": platform.python_version(),
+                            "platform": platform.platform(), "cpus": os.cpu_count()},
+            "settings": {key: value for key, value in vars(args).items()
+                         if key not in ("json", "baseline", "serve", "mysql_password")},
+            "galleries": galleries,
+            "results": results,
+        }
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.json}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} of {len(results)} results regressed beyond {args.tolerance:.0%}")
+            sys.exit(1)
+        print("✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the bridge response reader.
+
+Compares the old receive loop (``data += chunk``, decode, splitlines, print
+every line) against BridgeResponseReader/BridgeResponseParser for framed
+responses of increasing size, sent over a local socket pair.
+
+Reports parse time and peak Python memory (tracemalloc) per response size.
+
+Usage:
+    python benchmarks/bench_bridge_reader.py [--repeat 5] [--json results.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bridge_reader import BridgeResponseParser, BridgeResponseReader  # noqa: E402
+
+SIZES = [64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024]
+
+
+def build_response(bmp_size, request_id=1):
+    header = (
+        "✅ Match: 42, Finger: Right Thumb, Score: 87.10\n"
+        "PERSON_ID:42\nFINGER_INDEX:1\nMEMBER:prisoner\nSCORE:87.10\n"
+    ).encode("utf-8")
+    return header + b"BMP:" + b"Q" * bmp_size + b"\n\n" + f"END {request_id}\n".encode()
+
+
+def legacy_read(sock):
+    """The receive loop used by send_bridge_command before the streaming reader."""
+    data = b""
+    while True:
+        chunk = sock.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    decoded = data.decode("utf-8", errors="ignore")
+    fields = {}
+    for line in decoded.splitlines():
+        clean_line = line.strip().lstrip("\ufeff")
+        print(f"[Bridge] {clean_line}")
+        if clean_line.startswith("BMP:"):
+            fields["bmp_base64"] = clean_line[4:]
+        elif clean_line.startswith("PERSON_ID:"):
+            fields["person_id"] = clean_line[10:].strip()
+        elif clean_line.startswith("SCORE:"):
+            fields["score"] = float(clean_line[6:].strip())
+    return fields
+
+
+def streaming_read(sock, reader):
+    parser = BridgeResponseParser()
+    reader.read(sock, parser, request_id=1)
+    return parser.result()
+
+
+def run_once(payload, read_fn):
+    """Send ``payload`` through a socket pair and time ``read_fn`` on the receiving end."""
+    a, b = socket.socketpair()
+
+    def send():
+        with a:
+            a.sendall(payload)
+
+    sender = threading.Thread(target=send)
+    sender.start()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = read_fn(b)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    sender.join()
+    b.close()
+    assert result.get("person_id") == "42"
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per size; the best time is reported")
+    parser.add_argument("--json", help="write results to this file as JSON")
+    args = parser.parse_args()
+
+    results = []
+    print("=" * 72)
+    print(f"{'size':>10} | {'legacy ms':>10} {'peak MB':>9} | {'stream ms':>10} {'peak MB':>9} | {'speedup':>7}")
+    print("-" * 72)
+    for size in SIZES:
+        payload = build_response(size)
+        legacy = [run_once(payload, legacy_read) for _ in range(args.repeat)]
+        reader = BridgeResponseReader()
+        stream = [run_once(payload, lambda s: streaming_read(s, reader)) for _ in range(args.repeat)]
+
+        legacy_time = min(t for t, _ in legacy)
+        legacy_peak = max(p for _, p in legacy)
+        stream_time = min(t for t, _ in stream)
+        stream_peak = max(p for _, p in stream)
+        results.append({
+            "response_bytes": len(payload),
+            "legacy_seconds": legacy_time,
+            "legacy_peak_bytes": legacy_peak,
+            "streaming_seconds": stream_time,
+            "streaming_peak_bytes": stream_peak,
+        })
+        print(f"{len(payload) // 1024:>8}KB | {legacy_time * 1000:>10.2f} {legacy_peak / 2**20:>9.2f} | "
+              f"{stream_time * 1000:>10.2f} {stream_peak / 2**20:>9.2f} | {legacy_time / stream_time:>6.1f}x")
+    print("=" * 72)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"benchmark": "bridge_reader", "results": results}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark for multi-core 1:N gallery search.
+
+Builds a synthetic gallery of random minutiae templates, plants a rotated and
+shifted copy of the probe at a known row, then times a query with the
+in-process TemplateGallery.identify and with ParallelSearcher at increasing
+worker counts. Every run must rank the planted row first.
+
+Usage:
+    python benchmarks/bench_parallel_search.py [--size 20000] [--workers 1 2 4] [--repeat 3] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from identification import TemplateGallery  # noqa: E402
+from minutiae import MAX_MINUTIAE  # noqa: E402
+from parallel_search import ParallelSearcher  # noqa: E402
+
+
+def random_template(rng, count):
+    template = np.empty((count, 4), dtype=np.float32)
+    template[:, 0] = rng.uniform(20, 236, count)
+    template[:, 1] = rng.uniform(20, 340, count)
+    template[:, 2] = rng.uniform(0, 2 * np.pi, count)
+    template[:, 3] = rng.choice([1, 3], count)
+    return template
+
+
+def transformed(template, angle, dx, dy):
+    """Rotate ``template`` by ``angle`` about the origin and shift it by (dx, dy)."""
+    out = template.copy()
+    c, s = np.cos(angle), np.sin(angle)
+    out[:, 0] = c * template[:, 0] - s * template[:, 1] + dx
+    out[:, 1] = s * template[:, 0] + c * template[:, 1] + dy
+    out[:, 2] = np.mod(template[:, 2] + angle, 2 * np.pi)
+    return out
+
+
+def build_gallery(size, seed=0):
+    rng = np.random.default_rng(seed)
+    gallery = TemplateGallery(capacity=size)
+    probe = random_template(rng, 40)
+    planted = size // 2
+    for row in range(size):
+        if row == planted:
+            template = transformed(probe, 0.2, 15.0, -10.0)
+        else:
+            template = random_template(rng, int(rng.integers(25, MAX_MINUTIAE + 1)))
+        gallery.add((str(row), 1, "prisoner"), template)
+    gallery.ready.set()
+    return gallery, probe, str(planted)
+
+
+def time_query(identify, probe, expected, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        candidates = identify(probe, k=10)
+        best = min(best, time.perf_counter() - start)
+        assert candidates and candidates[0]["person_id"] == expected, candidates[:1]
+    return best
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    default_workers = sorted({1, 2, 4, 8, cpus} & set(range(1, cpus + 1))) or [1]
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=20000, help="templates in the synthetic gallery")
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers, help="worker counts to time")
+    parser.add_argument("--repeat", type=int, default=3, help="queries per configuration; the best time is reported")
+    parser.add_argument("--json", help="write results to this file as JSON")
+    args = parser.parse_args()
+
+    print(f"Building a gallery of {args.size} templates ({cpus} CPU(s))...")
+    gallery, probe, expected = build_gallery(args.size)
+
+    baseline = time_query(gallery.identify, probe, expected, args.repeat)
+    results = [{"workers": 0, "seconds": baseline, "templates_per_second": args.size / baseline}]
+
+    print("=" * 56)
+    print(f"{'workers':>10} | {'query ms':>10} | {'templates/sec':>14} | {'speedup':>7}")
+    print("-" * 56)
+    print(f"{'in-proc':>10} | {baseline * 1000:>10.1f} | {args.size / baseline:>14,.0f} | {1.0:>6.2f}x")
+    for workers in args.workers:
+        searcher = ParallelSearcher(gallery, workers=workers)
+        try:
+            # First query starts the workers and publishes the gallery; not timed.
+            searcher.identify(probe, k=10)
+            elapsed = time_query(searcher.identify, probe, expected, args.repeat)
+        finally:
+            searcher.close()
+        results.append({"workers": workers, "seconds": elapsed, "templates_per_second": args.size / elapsed})
+        print(f"{workers:>10} | {elapsed * 1000:>10.1f} | {args.size / elapsed:>14,.0f} | {baseline / elapsed:>6.2f}x")
+    print("=" * 56)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"benchmark": "parallel_search", "size": args.size, "cpus": cpus, "results": results}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Accuracy and speed of the minutiae matcher on a labelled corpus.
+
+Verification (1:1) follows the FVC protocol: every impression of a finger is
+compared with each earlier impression of that finger (genuine), and the
+first impression of every finger with the first impression of every other
+finger (impostor). Comparisons run in ``--workers`` processes. From the two
+score distributions it reports:
+
+    EER            where the false match and false non-match rates cross
+    FMR100/1000    lowest FNMR with FMR at most 1% / 0.1% (and FMR10000)
+    ZeroFMR        lowest FNMR with no false match at all
+    configured     FMR and FNMR at VERIFY_FINGER_THRESHOLD and
+                   GALLERY_MATCH_THRESHOLD (plus any --thresholds)
+
+and the full DET curve (FMR against FNMR over every threshold) with
+--det-csv, or as a plot with --plot if matplotlib is installed.
+
+Identification (1:N) enrolls the first impression of every finger, plus
+``--distractors`` random templates, and searches every other impression at
+each ``--rates`` penetration rate, reporting the rank-k identification rate
+for each ``--ranks`` and the query time.
+
+Both parts report comparisons/sec, so a change to the matcher or to the
+pre-filter is judged on accuracy and speed together. Scores are the
+in-process matcher's (identification.hough_scores, 0-100), which the gallery
+engine and /verify/batch use.
+
+The corpus is either synthetic (see synthetic_prints) or a directory, zip or
+tar archive of images. ``--pattern`` must have a named group ``finger``
+that identifies the finger an image belongs to. The default matches FVC
+names such as ``101_1.tif``.
+
+Usage:
+    python benchmarks/eval_accuracy.py [--subjects 200] [--impressions 4] [--corpus DB1_A]
+        [--pattern REGEX] [--workers 4] [--distractors 10000] [--rates 1 0.3]
+        [--ranks 1 5 10] [--det-csv det.csv] [--plot det.png] [--json results.json]
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulk_import import iter_source  # noqa: E402
+from config import GALLERY_MATCH_THRESHOLD, VERIFY_FINGER_THRESHOLD  # noqa: E402
+from eval_prefilter import add_distractors, synthetic_finger  # noqa: E402
+from gallery_index import coarse_features, select_rows  # noqa: E402
+from identification import TemplateGallery, hough_scores  # noqa: E402
+from minutiae import MAX_MINUTIAE, extract_minutiae, load_grayscale  # noqa: E402
+from parallel_search import ParallelSearcher  # noqa: E402
+
+try:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    MATPLOTLIB_AVAILABLE = True
+except ImportError:
+    MATPLOTLIB_AVAILABLE = False
+
+DEFAULT_PATTERN = r"(?:^|/)(?P<finger>[^/]+?)_(?P<impression>\d+)\.(?:bmp|png|jpe?g|tiff?|wsq)$"
+FMR_TARGETS = (("FMR100", 1e-2), ("FMR1000", 1e-3), ("FMR10000", 1e-4), ("ZeroFMR", 0.0))
+
+
+# -----------------------------
+# Corpus
+# -----------------------------
+def extract_image(data):
+    """Worker: minutiae and coarse features of one image."""
+    image = load_grayscale(data)
+    return extract_minutiae(image), coarse_features(image)
+
+
+def load_synthetic(subjects, impressions, executor):
+    return {finger: features for finger, _, features in
+            executor.map(synthetic_finger, [(f, impressions) for f in range(subjects)])}
+
+
+def load_corpus(source, pattern, executor):
+    """Extract every image in ``source`` whose name matches ``pattern``, grouped by finger.
+
+    Fingers with a single usable impression are dropped, since they have no
+    genuine comparison.
+    """
+    regex = re.compile(pattern, re.IGNORECASE)
+    names = []
+    images = []
+    for name, data in iter_source(source):
+        match = regex.search(name.replace("\\", "/"))
+        if match:
+            names.append((match.group("finger"), name))
+            images.append(data)
+    fingers = defaultdict(list)
+    for (finger, name), features in zip(names, executor.map(_extract_or_none, images, chunksize=8)):
+        if features is None:
+            print(f"❌ Skipped unreadable image {name}")
+        else:
+            fingers[finger].append((name, features))
+    return {finger: [features for _, features in sorted(entries)]
+            for finger, entries in fingers.items() if len(entries) >= 2}
+
+
+def _extract_or_none(data):
+    try:
+        return extract_image(data)
+    except Exception:
+        return None
+
+
+# -----------------------------
+# Verification (1:1)
+# -----------------------------
+_templates = None
+
+
+def _init_scoring(minutiae, counts):
+    global _templates
+    _templates = (minutiae, counts)
+
+
+def _score_task(task):
+    """Worker: scores of template ``probe`` against the templates ``references``."""
+    probe, references = task
+    minutiae, counts = _templates
+    return hough_scores(minutiae[probe, :counts[probe]], minutiae[references], counts[references])
+
+
+def comparison_tasks(fingers):
+    """FVC protocol (probe, references) tasks over the flattened template list.
+
+    Returns:
+        tuple: (genuine tasks, impostor tasks, list of (finger, impression) per template)
+    """
+    index = []
+    first = []
+    genuine = []
+    for finger, impressions in fingers.items():
+        start = len(index)
+        first.append(start)
+        for i in range(len(impressions)):
+            index.append((finger, i))
+            if i:
+                genuine.append((start + i, np.arange(start, start + i)))
+    impostor = [(probe, np.array(first[n + 1:])) for n, probe in enumerate(first[:-1])]
+    return genuine, impostor, index
+
+
+def run_comparisons(fingers, workers):
+    """Score every genuine and impostor pair in parallel.
+
+    Returns:
+        tuple: (genuine scores, impostor scores, seconds spent scoring)
+    """
+    genuine, impostor, index = comparison_tasks(fingers)
+    minutiae = np.zeros((len(index), MAX_MINUTIAE, 4), dtype=np.float32)
+    counts = np.zeros(len(index), dtype=np.int64)
+    for row, (finger, impression) in enumerate(index):
+        template = fingers[finger][impression][0][:MAX_MINUTIAE]
+        minutiae[row, :len(template)] = template
+        counts[row] = len(template)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_scoring,
+                             initargs=(minutiae, counts)) as executor:
+        genuine_scores = list(executor.map(_score_task, genuine, chunksize=16))
+        impostor_scores = list(executor.map(_score_task, impostor, chunksize=4))
+    elapsed = time.perf_counter() - start
+    return np.concatenate(genuine_scores), np.concatenate(impostor_scores), elapsed
+
+
+def error_rates(genuine, impostor, thresholds):
+    """FMR (impostor score >= t) and FNMR (genuine score < t) at each threshold."""
+    genuine = np.sort(genuine)
+    impostor = np.sort(impostor)
+    fnmr = np.searchsorted(genuine, thresholds, side="left") / len(genuine)
+    fmr = 1.0 - np.searchsorted(impostor, thresholds, side="left") / len(impostor)
+    return fmr, fnmr
+
+
+def operating_points(genuine, impostor, thresholds=()):
+    """EER, the FVC FMR targets and the given thresholds as (name, threshold, FMR, FNMR) dicts."""
+    candidates = np.unique(np.concatenate([genuine, impostor, [np.inf]]))
+    fmr, fnmr = error_rates(genuine, impostor, candidates)
+    crossing = int(np.argmin(np.abs(fmr - fnmr)))
+    points = [{"name": "EER", "threshold": float(candidates[crossing]),
+               "fmr": float(fmr[crossing]), "fnmr": float(fnmr[crossing]),
+               "eer": float((fmr[crossing] + fnmr[crossing]) / 2)}]
+    for name, target in FMR_TARGETS:
+        allowed = np.flatnonzero(fmr <= target)
+        best = allowed[np.argmin(fnmr[allowed])]
+        points.append({"name": name, "threshold": float(candidates[best]),
+                       "fmr": float(fmr[best]), "fnmr": float(fnmr[best])})
+    for name, threshold in thresholds:
+        at_fmr, at_fnmr = error_rates(genuine, impostor, np.array([threshold]))
+        points.append({"name": name, "threshold": float(threshold),
+                       "fmr": float(at_fmr[0]), "fnmr": float(at_fnmr[0])})
+    return points
+
+
+def det_curve(genuine, impostor):
+    """(threshold, FMR, FNMR) at every distinct score, from accept-all to reject-all."""
+    thresholds = np.unique(np.concatenate([genuine, impostor, [np.inf]]))
+    fmr, fnmr = error_rates(genuine, impostor, thresholds)
+    return [{"threshold": float(t), "fmr": float(a), "fnmr": float(b)} for t, a, b in zip(thresholds, fmr, fnmr)]
+
+
+def plot_det(curve, points, path):
+    """Save the DET curve on normal-deviate axes, as in the FVC reports."""
+    from statistics import NormalDist
+    probit = NormalDist().inv_cdf
+    clip = lambda rate: min(max(rate, 1e-5), 1 - 1e-5)  # noqa: E731
+    ticks = [1e-4, 1e-3, 1e-2, 0.05, 0.2, 0.5]
+    figure, axes = plt.subplots(figsize=(6, 6))
+    axes.plot([probit(clip(p["fmr"])) for p in curve], [probit(clip(p["fnmr"])) for p in curve])
+    for point in points:
+        axes.plot(probit(clip(point["fmr"])), probit(clip(point["fnmr"])), "o")
+        axes.annotate(point["name"], (probit(clip(point["fmr"])), probit(clip(point["fnmr"]))), fontsize=8)
+    axes.set_xticks([probit(t) for t in ticks], [f"{t:g}" for t in ticks])
+    axes.set_yticks([probit(t) for t in ticks], [f"{t:g}" for t in ticks])
+    axes.set_xlabel("False match rate")
+    axes.set_ylabel("False non-match rate")
+    axes.set_title("DET curve")
+    axes.grid(True)
+    figure.savefig(path, dpi=120, bbox_inches="tight")
+
+
+# -----------------------------
+# Identification (1:N)
+# -----------------------------
+def run_identification(fingers, distractors, rates, ranks, search_workers):
+    """Rank-k identification rate and query speed at each penetration rate."""
+    gallery = TemplateGallery(capacity=len(fingers) + distractors)
+    probes = []
+    for finger, impressions in fingers.items():
+        (minutiae, coarse), rest = impressions[0], impressions[1:]
+        gallery.add((finger, 1, "prisoner"), minutiae, coarse[:4])
+        probes.extend((finger, probe) for probe in rest)
+    add_distractors(gallery, distractors, gallery.snapshot().coarse)
+    gallery.ready.set()
+    snapshot = gallery.snapshot()
+    size = len(snapshot.keys)
+
+    searcher = ParallelSearcher(gallery, workers=search_workers) if search_workers > 1 else gallery
+    results = []
+    try:
+        if searcher is not gallery:
+            # The first query starts the workers and publishes the gallery; not timed.
+            searcher.identify(probes[0][1][0], k=1)
+        for rate in rates:
+            found = np.zeros(len(probes), dtype=np.int64)   # rank of the mate, 0 if not in the top max(ranks)
+            scored = 0
+            elapsed = 0.0
+            for n, (finger, (minutiae, coarse)) in enumerate(probes):
+                rows = select_rows(snapshot.coarse, snapshot.fingers, coarse, None, rate)
+                scored += size if rows is None else len(rows)
+                start = time.perf_counter()
+                candidates = searcher.identify(minutiae, k=max(ranks), coarse=coarse, penetration_rate=rate)
+                elapsed += time.perf_counter() - start
+                for rank, candidate in enumerate(candidates, 1):
+                    if candidate["person_id"] == finger:
+                        found[n] = rank
+                        break
+            results.append({
+                "penetration_rate": rate,
+                "penetration": scored / (len(probes) * size),
+                "rank": {str(k): float(np.mean((found > 0) & (found <= k))) for k in ranks},
+                "query_seconds": elapsed / len(probes),
+                "comparisons_per_second": scored / elapsed,
+            })
+    finally:
+        if searcher is not gallery:
+            searcher.close()
+    return size, len(probes), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subjects", type=int, default=200, help="synthetic fingers to generate")
+    parser.add_argument("--impressions", type=int, default=4, help="synthetic impressions per finger")
+    parser.add_argument("--corpus", help="directory, zip or tar of labelled images instead of synthetic prints")
+    parser.add_argument("--pattern", default=DEFAULT_PATTERN,
+                        help="regex with a named group 'finger' applied to each entry path")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes for extraction and 1:1 comparisons")
+    parser.add_argument("--thresholds", type=float, nargs="*", default=[],
+                        help="extra score thresholds to report FMR/FNMR at")
+    parser.add_argument("--distractors", type=int, default=0, help="random templates added to the 1:N gallery")
+    parser.add_argument("--rates", type=float, nargs="+", default=[1.0], help="1:N penetration rates")
+    parser.add_argument("--ranks", type=int, nargs="+", default=[1, 5, 10], help="ranks k of the identification rate")
+    parser.add_argument("--search-workers", type=int, default=1,
+                        help="ParallelSearcher processes for 1:N; 1 scores in this process")
+    parser.add_argument("--det-csv", help="write the DET curve to this CSV file")
+    parser.add_argument("--plot", help="save the DET curve as an image (needs matplotlib)")
+    parser.add_argument("--json", help="write results to this file as JSON")
+    args = parser.parse_args()
+    if args.plot and not MATPLOTLIB_AVAILABLE:
+        parser.error("--plot needs the optional 'matplotlib' package")
+
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        if args.corpus:
+            fingers = load_corpus(args.corpus, args.pattern, executor)
+        else:
+            fingers = load_synthetic(args.subjects, args.impressions, executor)
+    impressions = sum(len(f) for f in fingers.values())
+    if len(fingers) < 2:
+        print(f"❌ Need at least two fingers with two impressions each, found {len(fingers)}")
+        sys.exit(1)
+    print(f"Extracted {impressions} impressions of {len(fingers)} fingers in {time.time() - start:.1f} sec")
+
+    genuine, impostor, seconds = run_comparisons(fingers, args.workers)
+    comparisons = len(genuine) + len(impostor)
+    configured = [("VERIFY_FINGER_THRESHOLD", VERIFY_FINGER_THRESHOLD),
+                  ("GALLERY_MATCH_THRESHOLD", GALLERY_MATCH_THRESHOLD)]
+    points = operating_points(genuine, impostor, configured + [(f"t={t:g}", t) for t in args.thresholds])
+    curve = det_curve(genuine, impostor)
+
+    print(f"\nVerification (1:1): {len(genuine)} genuine and {len(impostor)} impostor comparisons in "
+          f"{seconds:.1f} sec ({comparisons / seconds:,.0f} comparisons/sec on {args.workers} workers)")
+    print(f"Genuine scores {np.mean(genuine):.1f} +/- {np.std(genuine):.1f}, "
+          f"impostor scores {np.mean(impostor):.1f} +/- {np.std(impostor):.1f}")
+    print("=" * 64)
+    print(f"{'operating point':>24} | {'threshold':>9} | {'FMR':>10} | {'FNMR':>10}")
+    print("-" * 64)
+    for point in points:
+        print(f"{point['name']:>24} | {point['threshold']:>9.2f} | {point['fmr']:>10.4%} | {point['fnmr']:>10.4%}")
+    print("=" * 64)
+    print(f"EER = {points[0]['eer']:.2%}")
+    unresolved = [name for name, target in FMR_TARGETS if 0 < target < 1 / len(impostor)]
+    if unresolved:
+        print(f"{', '.join(unresolved)} need more than {len(impostor)} impostor comparisons to be meaningful")
+
+    size, probes, identification = run_identification(fingers, args.distractors, args.rates, args.ranks,
+                                                      args.search_workers)
+    print(f"\nIdentification (1:N): {probes} probes against a gallery of {size} templates")
+    width = 46 + 9 * len(args.ranks)
+    print("=" * width)
+    print(f"{'rate':>6} | {'penetration':>11} | " + "".join(f"{f'rank-{k}':>8} | " for k in args.ranks)
+          + f"{'query ms':>9} | {'comparisons/sec':>15}")
+    print("-" * width)
+    for result in identification:
+        print(f"{result['penetration_rate']:>6.2f} | {result['penetration']:>11.1%} | "
+              + "".join(f"{result['rank'][str(k)]:>8.1%} | " for k in args.ranks)
+              + f"{result['query_seconds'] * 1000:>9.1f} | {result['comparisons_per_second']:>15,.0f}")
+    print("=" * width)
+
+    if args.det_csv:
+        with open(args.det_csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["threshold", "fmr", "fnmr"])
+            writer.writeheader()
+            writer.writerows(curve)
+        print(f"DET curve written to {args.det_csv}")
+    if args.plot:
+        plot_det(curve, points, args.plot)
+        print(f"DET plot written to {args.plot}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "benchmark": "accuracy",
+                "corpus": args.corpus or f"synthetic {args.subjects}x{args.impressions}",
+                "fingers": len(fingers),
+                "impressions": impressions,
+                "verification": {
+                    "genuine": len(genuine),
+                    "impostor": len(impostor),
+                    "seconds": seconds,
+                    "workers": args.workers,
+                    "comparisons_per_second": comparisons / seconds,
+                    "operating_points": points,
+                    "det": curve,
+                },
+                "identification": {"gallery_size": size, "probes": probes, "results": identification},
+            }, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Accuracy/speed trade-off of the coarse identification pre-filter.
+
+Enrolls the first impression of every finger into a TemplateGallery and
+identifies each remaining impression at several penetration rates, reporting
+per rate:
+
+    penetration   mean fraction of the gallery actually scored
+    missed        probes whose mate was pruned before scoring
+    rank-1        probes whose mate was the best candidate
+    query ms      mean identification time
+
+The test set is either synthetic (see synthetic_prints) or a directory of
+images named ``<finger>_<impression>.<ext>`` as in the FVC databases
+(e.g. ``101_1.tif``). ``--distractors`` pads the gallery with random
+templates, carrying coarse keys drawn from the enrolled ones, so timings
+reflect a realistic gallery size.
+
+Usage:
+    python benchmarks/eval_prefilter.py [--subjects 200] [--impressions 2] [--dir DB1_A]
+        [--distractors 10000] [--rates 1 0.5 0.3 0.2 0.1] [--workers 4] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gallery_index import PATTERN_NAMES, coarse_features, select_rows  # noqa: E402
+from identification import TemplateGallery  # noqa: E402
+from minutiae import MAX_MINUTIAE, extract_minutiae, load_grayscale  # noqa: E402
+import synthetic_prints  # noqa: E402
+
+DEFAULT_RATES = [1.0, 0.5, 0.3, 0.2, 0.1]
+FILE_PATTERN = re.compile(r"^(\w+?)_(\d+)\.(bmp|png|tif|tiff|jpg|jpeg)$", re.IGNORECASE)
+
+
+def _features(image):
+    return extract_minutiae(image), coarse_features(image)
+
+
+def synthetic_finger(args):
+    """Worker: generate and extract every impression of one synthetic finger."""
+    finger, impressions = args
+    master, pattern = synthetic_prints.master_print(finger)
+    return str(finger), pattern, [_features(synthetic_prints.impression(master, finger * 100 + i))
+                                  for i in range(impressions)]
+
+
+def image_file(path):
+    """Worker: extract one image file."""
+    with open(path, "rb") as f:
+        return _features(load_grayscale(f.read()))
+
+
+def load_synthetic(subjects, impressions, executor):
+    fingers = {}
+    truth = {}
+    for finger, pattern, features in executor.map(synthetic_finger, [(f, impressions) for f in range(subjects)]):
+        fingers[finger] = features
+        truth[finger] = pattern
+    return fingers, truth
+
+
+def load_directory(path, executor):
+    grouped = defaultdict(list)
+    for name in sorted(os.listdir(path)):
+        match = FILE_PATTERN.match(name)
+        if match:
+            grouped[match.group(1)].append((int(match.group(2)), os.path.join(path, name)))
+    jobs = [(finger, file) for finger, files in grouped.items() for _, file in sorted(files)]
+    fingers = defaultdict(list)
+    for (finger, _), features in zip(jobs, executor.map(image_file, [file for _, file in jobs])):
+        fingers[finger].append(features)
+    return {finger: features for finger, features in fingers.items() if len(features) >= 2}, None
+
+
+def add_distractors(gallery, count, coarse_pool, seed=1):
+    rng = np.random.default_rng(seed)
+    for i in range(count):
+        n = int(rng.integers(25, MAX_MINUTIAE + 1))
+        template = np.empty((n, 4), dtype=np.float32)
+        template[:, 0] = rng.uniform(20, 280, n)
+        template[:, 1] = rng.uniform(20, 340, n)
+        template[:, 2] = rng.uniform(0, 2 * np.pi, n)
+        template[:, 3] = rng.choice([1, 3], n)
+        gallery.add((f"distractor-{i}", 0, "prisoner"), template, coarse_pool[rng.integers(len(coarse_pool))])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subjects", type=int, default=200, help="synthetic fingers to generate")
+    parser.add_argument("--impressions", type=int, default=2, help="synthetic impressions per finger")
+    parser.add_argument("--dir", help="evaluate images named <finger>_<impression>.<ext> instead")
+    parser.add_argument("--distractors", type=int, default=0, help="random templates added to the gallery")
+    parser.add_argument("--rates", type=float, nargs="+", default=DEFAULT_RATES, help="penetration rates")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="extraction processes")
+    parser.add_argument("--json", help="write results to this file as JSON")
+    args = parser.parse_args()
+
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        if args.dir:
+            fingers, truth = load_directory(args.dir, executor)
+        else:
+            fingers, truth = load_synthetic(args.subjects, args.impressions, executor)
+    print(f"Extracted {sum(len(f) for f in fingers.values())} impressions of {len(fingers)} fingers "
+          f"in {time.time() - start:.1f} sec")
+
+    gallery = TemplateGallery(capacity=len(fingers) + args.distractors)
+    probes = []
+    for finger, features in fingers.items():
+        (minutiae, coarse), rest = features[0], features[1:]
+        gallery.add((finger, 1, "prisoner"), minutiae, coarse[:4])
+        probes.extend((finger, probe) for probe in rest)
+    snapshot = gallery.snapshot()
+    add_distractors(gallery, args.distractors, snapshot.coarse)
+    snapshot = gallery.snapshot()
+    mate_row = {key[0]: row for row, key in enumerate(snapshot.keys)}
+
+    # How stable the coarse keys are between impressions of the same finger.
+    enrolled = {finger: features[0][1] for finger, features in fingers.items()}
+    same_class = np.mean([coarse.pattern == enrolled[finger].pattern for finger, (_, coarse) in probes])
+    print(f"Pattern class agrees between impressions for {same_class:.1%} of probes")
+    if truth:
+        confusion = Counter((truth[finger], PATTERN_NAMES[coarse.pattern]) for finger, (_, coarse) in probes)
+        accuracy = sum(n for (t, p), n in confusion.items() if t == p) / len(probes)
+        print(f"Pattern class matches the generated class for {accuracy:.1%} of probes")
+
+    results = []
+    print("=" * 68)
+    print(f"{'rate':>6} | {'penetration':>11} | {'missed':>8} | {'rank-1':>8} | {'query ms':>9} | {'speedup':>7}")
+    print("-" * 68)
+    baseline = None
+    for rate in args.rates:
+        scored = missed = hits = 0
+        elapsed = 0.0
+        for finger, (minutiae, coarse) in probes:
+            rows = select_rows(snapshot.coarse, snapshot.fingers, coarse, None, rate)
+            scored += len(snapshot.keys) if rows is None else len(rows)
+            if rows is not None and mate_row[finger] not in set(rows.tolist()):
+                missed += 1
+            t = time.perf_counter()
+            candidates = gallery.identify(minutiae, k=1, coarse=coarse, penetration_rate=rate)
+            elapsed += time.perf_counter() - t
+            hits += bool(candidates) and candidates[0]["person_id"] == finger
+
+        n = len(probes)
+        query = elapsed / n
+        baseline = baseline or query
+        result = {
+            "penetration_rate": rate,
+            "penetration": scored / (n * len(snapshot.keys)),
+            "missed": missed / n,
+            "rank1": hits / n,
+            "query_seconds": query,
+        }
+        results.append(result)
+        print(f"{rate:>6.2f} | {result['penetration']:>11.1%} | {result['missed']:>8.1%} | "
+              f"{result['rank1']:>8.1%} | {query * 1000:>9.1f} | {baseline / query:>6.2f}x")
+    print("=" * 68)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"benchmark": "prefilter", "gallery_size": len(snapshot.keys), "probes": len(probes),
+                       "results": results}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
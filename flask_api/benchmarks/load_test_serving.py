@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Load test of the threaded (werkzeug) and asyncio (Quart/Hypercorn) serving modes.
+
+Starts simulated bridge stations (bridge_simulator.py) that take
+``--service-ms`` +/- ``--jitter-ms`` per command, as a scanner waiting for a
+finger would. It then runs the API in a subprocess
+in each mode and has ``--clients`` concurrent clients send POST /verify
+requests until each has completed ``--requests``. Reported per mode:
+
+    req/s          completed requests per second
+    p50/p95 ms     request latency, including time queued for a scanner
+    errors         non-2xx responses and connection failures
+    peak threads   highest OS thread count of the API process
+    peak RSS MB    highest resident memory of the API process
+
+Thread and memory sampling reads /proc and is skipped on other platforms.
+The asyncio mode needs requirements-async.txt installed; the test stops
+with an error if it is requested (the default) and 'quart' is missing.
+
+Usage:
+    python benchmarks/load_test_serving.py [--clients 200] [--requests 5] [--stations 8]
+        [--service-ms 200] [--jitter-ms 0] [--modes sync async] [--json results.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bridge_simulator import start_stations, synthetic_pool
+
+
+# -----------------------------
+# API process
+# -----------------------------
+def serve(mode, port, stations, service_ms):
+    """Subprocess entry point: run the API in ``mode`` against the simulated stations."""
+    import config
+    config.BRIDGE_STATIONS = {f"s{i}": address for i, address in enumerate(stations.split(","))}
+    config.DEVICE_QUEUE_MAX = 10000
+    config.DEVICE_SERVICE_ESTIMATE = service_ms / 1000
+    if mode == "async":
+        import async_app
+        asyncio.run(async_app.serve("127.0.0.1", port))
+    else:
+        from werkzeug.serving import make_server
+        import app
+        app.warm_up()
+        make_server("127.0.0.1", port, app.app, threaded=True).serve_forever()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def sample_process(pid, stop, peaks):
+    """Track the peak thread count and RSS of ``pid`` from /proc/<pid>/status."""
+    path = f"/proc/{pid}/status"
+    while not stop.is_set():
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.startswith("Threads:"):
+                        peaks["threads"] = max(peaks.get("threads", 0), int(line.split()[1]))
+                    elif line.startswith("VmRSS:"):
+                        peaks["rss_mb"] = max(peaks.get("rss_mb", 0), int(line.split()[1]) / 1024)
+        except (OSError, ValueError):
+            return
+        stop.wait(0.1)
+
+
+# -----------------------------
+# Load generator
+# -----------------------------
+async def post_verify(port, client, i):
+    body = json.dumps({"person_id": f"load-{client}", "finger_index": 1 + i % 10, "image": "url"}).encode()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"POST /verify HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+                 b"Connection: close\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+    await writer.drain()
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    return int(status_line.split()[1])
+
+
+async def run_load(port, clients, requests):
+    latencies = []
+    errors = 0
+
+    async def client(n):
+        nonlocal errors
+        for i in range(requests):
+            start = time.perf_counter()
+            try:
+                status = await post_verify(port, n, i)
+            except (OSError, IndexError, ValueError):
+                status = 0
+            latencies.append(time.perf_counter() - start)
+            errors += not 200 <= status < 300
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(clients)))
+    return time.perf_counter() - start, sorted(latencies), errors
+
+
+def run_mode(mode, args, stations):
+    port = free_port()
+    script = os.path.abspath(__file__)
+    process = subprocess.Popen([sys.executable, script, "--serve", mode, "--port", str(port),
+                                "--station-list", ",".join(stations), "--service-ms", str(args.service_ms)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port(port):
+            raise RuntimeError(f"{mode} server did not start (exit code {process.poll()})")
+        peaks = {}
+        stop = threading.Event()
+        sampler = threading.Thread(target=sample_process, args=(process.pid, stop, peaks), daemon=True)
+        sampler.start()
+        elapsed, latencies, errors = asyncio.run(run_load(port, args.clients, args.requests))
+        stop.set()
+        sampler.join()
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+    n = len(latencies)
+    return {
+        "mode": mode,
+        "clients": args.clients,
+        "requests": n,
+        "requests_per_second": n / elapsed,
+        "p50_ms": latencies[n // 2] * 1000,
+        "p95_ms": latencies[min(int(n * 0.95), n - 1)] * 1000,
+        "errors": errors,
+        "peak_threads": peaks.get("threads"),
+        "peak_rss_mb": peaks.get("rss_mb"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=5, help="requests per client")
+    parser.add_argument("--stations", type=int, default=8, help="simulated bridge stations")
+    parser.add_argument("--service-ms", type=float, default=200, help="simulated scanner time per command")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="uniform +/- variation of the scanner time")
+    parser.add_argument("--modes", nargs="+", default=["sync", "async"], choices=["sync", "async"])
+    parser.add_argument("--json", help="write results to this file as JSON")
+    parser.add_argument("--serve", choices=["sync", "async"], help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--station-list", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.station_list, args.service_ms)
+        return
+
+    modes = list(args.modes)
+    if "async" in modes:
+        import async_app
+        if not async_app.QUART_AVAILABLE:
+            print("❌ The async mode needs the optional 'quart' package: pip install -r requirements-async.txt "
+                  "(or pass --modes sync)")
+            sys.exit(1)
+
+    stations, _ = start_stations(args.stations, synthetic_pool(fingers=4, impressions=2),
+                                 latency_ms=args.service_ms, jitter_ms=args.jitter_ms, processing_ms=0,
+                                 match_rate=1.0, seed=0)
+    ideal = args.stations * 1000 / args.service_ms
+    print(f"{args.clients} clients x {args.requests} requests, {args.stations} stations at "
+          f"{args.service_ms:.0f} ms per command (at most {ideal:.0f} req/s)")
+
+    results = []
+    print("=" * 78)
+    print(f"{'mode':>6} | {'req/s':>7} | {'p50 ms':>8} | {'p95 ms':>8} | {'errors':>6} | "
+          f"{'peak threads':>12} | {'peak RSS MB':>11}")
+    print("-" * 78)
+    for mode in modes:
+        result = run_mode(mode, args, stations)
+        results.append(result)
+        threads = result["peak_threads"] if result["peak_threads"] is not None else "n/a"
+        rss = f"{result['peak_rss_mb']:.1f}" if result["peak_rss_mb"] is not None else "n/a"
+        print(f"{mode:>6} | {result['requests_per_second']:>7.1f} | {result['p50_ms']:>8.1f} | "
+              f"{result['p95_ms']:>8.1f} | {result['errors']:>6} | {threads:>12} | {rss:>11}")
+    print("=" * 78)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"benchmark": "serving", "stations": args.stations, "service_ms": args.service_ms,
+                       "results": results}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,104 +1,486 @@
 """Client for communicating with the Fingerprint Bridge Service.
+
+The bridge speaks a line protocol on BRIDGE_PORT. In the framed protocol each
+command is sent as ``REQ <id> <command>`` over a long-lived connection and the
+bridge terminates its response with an ``END <id>`` line, so connections can be
+kept in a small pool and reused across Flask requests. The legacy protocol (one
+bare command per connection, response ends when the bridge closes the socket)
+is still available via BRIDGE_PROTOCOL = "legacy" for older bridge builds.
+
+One API can drive several scanner stations (BRIDGE_STATIONS). Each station
+has its own connection pool, scanner queue and circuit breaker. A request
+goes to the station it names, or else to the least-loaded station that is
+in rotation. Stations are health-checked with PING in the background.
+
+The routing and failure policy (breaker accounting, failover to another
+station, error responses) lives in the helpers below _send(). async_bridge
+calls the same helpers, so the threaded and asyncio paths cannot drift apart.
 """
 
+import asyncio
+import itertools
+import logging
+import queue
 import socket
+import threading
 import time
-from config import BRIDGE_HOST, BRIDGE_PORT
+from contextlib import contextmanager
+from bridge_reader import BridgeProtocolError, BridgeResponseParser, BridgeResponseReader
+from circuit_breaker import CircuitBreaker
+from config import (BRIDGE_HOST, BRIDGE_PORT, BRIDGE_PROTOCOL, BRIDGE_POOL_SIZE, BRIDGE_CONNECT_TIMEOUT,
+                    BRIDGE_STATIONS, BRIDGE_HEALTH_INTERVAL)
+from metrics import observe_bridge_response, stage_timer
+import tracing
+from scheduler import PRIORITY_NORMAL, DeviceScheduler, SchedulerRejected, is_device_command
+
+
+class BridgeConnection:
+    """A single long-lived, framed connection to the bridge."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, host, port, connect_timeout=BRIDGE_CONNECT_TIMEOUT):
+        with stage_timer("bridge_connect"):
+            self.sock = socket.create_connection((host, port), timeout=connect_timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = BridgeResponseReader()
+        self.requests_served = 0
+
+    def request(self, command, timeout, parser):
+        """Send one command and stream its framed response into ``parser``.
+
+        Args:
+            command (str): The command line, without the REQ prefix.
+            timeout (float): Socket timeout in seconds for each receive.
+            parser (BridgeResponseParser): Receives the response lines.
+
+        Returns:
+            int: Number of response bytes received.
+
+        Raises:
+            ConnectionError: If the bridge closed the connection before END.
+            BridgeProtocolError: If the END line carries a different request ID.
+        """
+        request_id = tracing.frame_id(next(self._ids))
+        self.sock.settimeout(timeout)
+        parser.sent_at = time.perf_counter()
+        self.sock.sendall(f"REQ {request_id} {command.strip()}\n".encode())
+        received = self.reader.read(self.sock, parser, request_id)
+        self.requests_served += 1
+        return received
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
 
-def send_bridge_command(command, timeout=30):
-    """Sends a command to the fingerprint bridge service and gets the response.
+
+class BridgeConnectionPool:
+    """Keeps up to ``max_idle`` idle bridge connections for reuse.
+
+    Connections are checked out for the duration of one request. A connection
+    that failed or timed out mid-request is closed rather than returned, since
+    a late response could otherwise be read by the next caller.
+    """
+
+    def __init__(self, host, port, max_idle=2):
+        self.host = host
+        self.port = port
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self):
+        """Return an idle connection, or open a new one.
+
+        Returns:
+            tuple: (BridgeConnection, reused) where ``reused`` is True if the
+                connection had served an earlier request.
+        """
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.reused += 1
+            return conn, True
+        except queue.Empty:
+            conn = BridgeConnection(self.host, self.port)
+            with self._lock:
+                self.created += 1
+            return conn, False
+
+    def release(self, conn):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def stats(self):
+        return {"idle": self._idle.qsize(), "created": self.created, "reused": self.reused}
+
+
+class BridgeEndpoint:
+    """One bridge station: its address, connection pool, scanner queue and breaker.
 
     Args:
-        command (str): The command string to send.
-        timeout (int): The socket timeout in seconds.
+        station_id (str): Name the station is addressed by.
+        host (str): Bridge host.
+        port (int): Bridge port.
+    """
+
+    def __init__(self, station_id, host, port):
+        self.station_id = station_id
+        self.host = host
+        self.port = port
+        self.pool = BridgeConnectionPool(host, port, max_idle=BRIDGE_POOL_SIZE)
+        self.scheduler = DeviceScheduler()
+        self.breaker = CircuitBreaker()
+        self.inflight = 0             # requests routed here and not yet answered (guarded by the registry lock)
+        self.last_ping = None         # (time.time(), round trip seconds or None if it failed)
+        self.reported_station = None  # station name the bridge itself answered PING with
+
+    def load(self):
+        """Sort key for routing: fewest requests in flight, then shortest estimated wait."""
+        queue_stats = self.scheduler.stats()
+        return self.inflight, queue_stats["estimated_wait"], queue_stats["served"]
+
+    def ping(self, timeout=BRIDGE_CONNECT_TIMEOUT):
+        """Health-check the bridge with PING and feed the result to the breaker.
+
+        Returns:
+            bool: True if the bridge answered.
+        """
+        parser = BridgeResponseParser(echo=False)
+        start = time.time()
+        try:
+            _request(self, "PING", timeout, parser)
+        except (OSError, BridgeProtocolError) as e:
+            self.last_ping = (start, None)
+            self.breaker.record_failure()
+            logging.warning(f"[Bridge] Station {self.station_id} failed its health check: {e}")
+            return False
+        self.last_ping = (start, time.time() - start)
+        # Older bridge builds answer "ERROR Unknown command", which still proves they are up.
+        words = parser.result_message.split()
+        if len(words) >= 3 and words[1] == "PONG":
+            self.reported_station = words[2]
+        self.breaker.record_success()
+        return True
+
+    def stats(self):
+        return {
+            "station": self.station_id,
+            "address": f"{self.host}:{self.port}",
+            "reported_station": self.reported_station,
+            "inflight": self.inflight,
+            "breaker": self.breaker.stats(),
+            "last_ping": None if self.last_ping is None else {
+                "time": self.last_ping[0],
+                "seconds": None if self.last_ping[1] is None else round(self.last_ping[1], 4),
+            },
+            "connections": self.pool.stats(),
+            "queue": self.scheduler.stats(),
+        }
+
+
+class StationUnavailable(Exception):
+    """No bridge station can take the request."""
+
+
+class BridgeRegistry:
+    """The bridge stations this API drives, with routing and health checks.
+
+    Args:
+        stations (dict): station_id -> "host:port".
+        health_interval (float): Seconds between PING rounds; 0 disables them.
+    """
+
+    def __init__(self, stations, health_interval=BRIDGE_HEALTH_INTERVAL):
+        self.endpoints = {}
+        for station_id, address in stations.items():
+            host, _, port = address.rpartition(":")
+            self.endpoints[station_id] = BridgeEndpoint(station_id, host, int(port))
+        self.health_interval = health_interval
+        self._health_thread = None
+        self._lock = threading.Lock()
+
+    def select(self, station=None, exclude=None):
+        """Choose the endpoint for a request.
+
+        Args:
+            station (str | None): Station to use; None routes to the least-loaded
+                station whose breaker is closed, preferring idle ones.
+            exclude (BridgeEndpoint | None): Endpoint not to route to (a failover's source).
+
+        Returns:
+            BridgeEndpoint: The chosen endpoint, with its breaker permission claimed
+                and the request counted in flight until release() is called.
+
+        Raises:
+            StationUnavailable: If the named station is unknown or out of rotation,
+                or no station is available.
+        """
+        with self._lock:
+            if station is not None:
+                endpoint = self.endpoints.get(station)
+                if endpoint is None:
+                    raise StationUnavailable(f"Unknown station '{station}'")
+                if not endpoint.breaker.allow():
+                    raise StationUnavailable(f"Station '{station}' is out of rotation after repeated failures")
+                endpoint.inflight += 1
+                return endpoint
+            # Choosing and counting under one lock keeps a burst of requests from
+            # all picking the same idle station before any of them reaches its queue.
+            for endpoint in sorted((e for e in self.endpoints.values()
+                                    if e is not exclude and e.breaker.available()), key=BridgeEndpoint.load):
+                if endpoint.breaker.allow():
+                    endpoint.inflight += 1
+                    return endpoint
+        raise StationUnavailable("No scanner station is available")
+
+    def release(self, endpoint):
+        """Count a request chosen by select() as finished."""
+        with self._lock:
+            endpoint.inflight -= 1
+
+    def check_health(self):
+        """PING every station once."""
+        for endpoint in list(self.endpoints.values()):
+            endpoint.ping()
+
+    def start_health_checks(self):
+        """Start the background PING loop, once."""
+        with self._lock:
+            if self.health_interval <= 0 or self._health_thread is not None:
+                return
+            self._health_thread = threading.Thread(target=self._health_loop, name="bridge-health", daemon=True)
+            self._health_thread.start()
+
+    def _health_loop(self):
+        while True:
+            try:
+                self.check_health()
+            except Exception:
+                logging.exception("[Bridge] Health check round failed")
+            time.sleep(self.health_interval)
+
+    def stats(self):
+        return {station_id: endpoint.stats() for station_id, endpoint in self.endpoints.items()}
+
+
+_registry = BridgeRegistry(BRIDGE_STATIONS or {"default": f"{BRIDGE_HOST}:{BRIDGE_PORT}"})
+
+
+def get_bridge_registry():
+    """Return the process-wide bridge station registry."""
+    return _registry
+
+
+def _request_framed(endpoint, command, timeout, parser):
+    pool = endpoint.pool
+    conn, reused = pool.acquire()
+    try:
+        conn.request(command, timeout, parser)
+    except (ConnectionError, BridgeProtocolError) as e:
+        conn.close()
+        if reused and isinstance(e, ConnectionError) and parser.is_empty():
+            # The bridge may have been restarted while the connection sat idle.
+            # Retry once on a fresh connection.
+            conn = BridgeConnection(pool.host, pool.port)
+            try:
+                conn.request(command, timeout, parser)
+            except BaseException:
+                conn.close()
+                raise
+            pool.release(conn)
+            return
+        raise
+    except BaseException:
+        conn.close()
+        raise
+    pool.release(conn)
+
+
+def _request_legacy(endpoint, command, timeout, parser):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        with stage_timer("bridge_connect"):
+            s.connect((endpoint.host, endpoint.port))
+        parser.sent_at = time.perf_counter()
+        s.sendall(command.encode())
+        BridgeResponseReader().read(s, parser)
+
+
+def parse_bridge_response(data):
+    """Parse a complete raw bridge response into the API response dictionary.
+
+    Args:
+        data (bytes): The response lines as received from the bridge.
 
     Returns:
         dict: A dictionary containing the status, message, bmp_base64 and structured fields.
     """
-    try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.settimeout(timeout)
-            s.connect((BRIDGE_HOST, BRIDGE_PORT))
-            s.sendall(command.encode())
-
-            start_time = time.time()
-            data = b""
-            while True:
-                chunk = s.recv(4096)
-                if not chunk:
-                    break
-                data += chunk
-            duration = time.time() - start_time
-            print(f"[Bridge] Response received in {duration:.2f} sec")
-
-            decoded = data.decode("utf-8", errors="ignore")
-            lines = decoded.splitlines()
-
-            result_message = "No valid response from bridge"
-            base64_bmp = ""
-            
-            # Enhanced parsing for structured fields
-            person_id = None
-            finger_index = None
-            member = None
-            score = None
-
-            for line in lines:
-                clean_line = line.strip().lstrip("\ufeff")
-                print(f"[Bridge] {clean_line}")
-                
-                if clean_line.startswith("BMP:"):
-                    base64_bmp = clean_line[4:]
-                elif clean_line.startswith("PERSON_ID:"):
-                    person_id = clean_line[10:].strip()
-                elif clean_line.startswith("FINGER_INDEX:"):
-                    try:
-                        finger_index = int(clean_line[13:].strip())
-                    except ValueError:
-                        pass
-                elif clean_line.startswith("MEMBER:"):
-                    member = clean_line[7:].strip()
-                elif clean_line.startswith("SCORE:"):
-                    try:
-                        score = float(clean_line[6:].strip())
-                    except ValueError:
-                        pass
-                elif "✅" in clean_line or "❌" in clean_line or clean_line.upper().startswith("OK") or "ERROR" in clean_line.upper():
-                    result_message = clean_line
-
-            status_str = "error"
-            if "✅" in result_message or "OK" in result_message.upper():
-                status_str = "success"
-            if "❌" in result_message: # No match is not an error
-                status_str = "no_match"
-            if "match" in result_message.lower():
-                if "✅" in result_message:
-                    status_str = "match"
-                elif "❌" in result_message:
-                    status_str = "no_match"
-
-            # Build enhanced response with backward compatibility
-            response = {
-                "status": status_str,
-                "message": result_message,
-                "bmp_base64": base64_bmp
-            }
-            
-            # Add structured fields when available (for enhanced match endpoint)
-            if person_id is not None:
-                response["person_id"] = person_id
-            if finger_index is not None:
-                response["finger_index"] = finger_index
-            if member is not None:
-                response["member"] = member
-            if score is not None:
-                response["score"] = score
-                
-            return response
+    parser = BridgeResponseParser()
+    for line in data.splitlines():
+        parser.feed_line(line)
+    return parser.result()
 
+
+def _request(endpoint, command, timeout, parser):
+    with tracing.span("bridge.exchange", station=endpoint.station_id, protocol=BRIDGE_PROTOCOL):
+        if BRIDGE_PROTOCOL == "legacy":
+            _request_legacy(endpoint, command, timeout, parser)
+        else:
+            _request_framed(endpoint, command, timeout, parser)
+
+
+@contextmanager
+def breaker_accounting(endpoint, parser):
+    """Record the exchange in the body of a ``with`` block on ``endpoint``'s breaker.
+
+    Connection failures and silent timeouts count against the station. A
+    timeout after the bridge has started answering does not count, because
+    that usually means nobody placed a finger. Exceptions are re-raised.
+    """
+    try:
+        yield
     except socket.timeout:
+        if parser.is_empty():
+            endpoint.breaker.record_failure()
+        else:
+            endpoint.breaker.record_success()
+        raise
+    except (OSError, BridgeProtocolError, asyncio.TimeoutError):
+        endpoint.breaker.record_failure()
+        raise
+    except SchedulerRejected:
+        # The request never reached the bridge, so it says nothing about the station.
+        endpoint.breaker.release()
+        raise
+    endpoint.breaker.record_success()
+
+
+def fail_over(registry, failed, station, parser, error):
+    """Choose the station to retry a command on after ``failed`` could not be reached.
+
+    A command is retried once, and only if the caller did not name a station
+    and the bridge had not started answering.
+
+    Args:
+        registry (BridgeRegistry): Registry ``failed`` was selected from.
+        failed (BridgeEndpoint): The unreachable endpoint, still held by the caller.
+        station (str | None): The station the caller asked for.
+        parser (BridgeResponseParser): Parser of the failed attempt.
+        error (ConnectionError): The failure.
+
+    Returns:
+        BridgeEndpoint: The endpoint to retry on, selected from ``registry``.
+            ``failed`` has been released.
+
+    Raises:
+        ConnectionError: ``error`` if no retry applies, or a new one if no other
+            station is available; ``failed`` is then still held.
+    """
+    if station is not None or not parser.is_empty():
+        raise error
+    try:
+        endpoint = registry.select(exclude=failed)
+    except StationUnavailable:
+        raise ConnectionError(f"Station '{failed.station_id}' is unreachable and no other is available") from error
+    registry.release(failed)
+    print(f"[Bridge] Station {failed.station_id} unreachable, retrying on {endpoint.station_id}")
+    return endpoint
+
+
+def finish_response(parser, command, endpoint, start_time):
+    """Record the bridge stages and build the response dictionary of a completed command."""
+    observe_bridge_response(parser, command.split()[0].lower())
+    duration = time.time() - start_time
+    print(f"[Bridge] Response received from {endpoint.station_id} in {duration:.2f} sec")
+    result = parser.result()
+    result["station"] = endpoint.station_id
+    return result
+
+
+def error_response(error, command, timeout, endpoint):
+    """The response dictionary for a command that failed with ``error``."""
+    if isinstance(error, StationUnavailable):
+        return {"status": "error", "message": str(error)}
+    if isinstance(error, SchedulerRejected):
+        print(f"[Bridge] {command.strip()} rejected: {error}")
+        return {"status": "error", "message": str(error), "retry_after": round(error.retry_after, 1),
+                "station": endpoint.station_id}
+    if isinstance(error, (socket.timeout, asyncio.TimeoutError)):
         return {"status": "error", "message": f"Socket timeout after {timeout} seconds"}
-    except socket.error as e:
-        return {"status": "error", "message": f"Socket error: {str(e)}"}
+    if isinstance(error, OSError):
+        return {"status": "error", "message": f"Socket error: {str(error)}"}
+    if isinstance(error, BridgeProtocolError):
+        return {"status": "error", "message": f"Bridge protocol error: {str(error)}"}
+    return {"status": "error", "message": f"An unexpected error occurred: {str(error)}"}
+
+
+def _send(endpoint, command, timeout, parser, deadline, priority, on_progress):
+    """Send one command to ``endpoint``, queueing device commands for its scanner."""
+    with breaker_accounting(endpoint, parser):
+        if is_device_command(command):
+            endpoint.scheduler.run(command.split()[0].upper(), lambda: _request(endpoint, command, timeout, parser),
+                                   deadline=deadline, priority=priority, on_progress=on_progress)
+        else:
+            _request(endpoint, command, timeout, parser)
+
+
+def send_bridge_command(command, timeout=30, on_progress=None, deadline=None, priority=PRIORITY_NORMAL,
+                        station=None):
+    """Sends a command to the fingerprint bridge service and gets the response.
+
+    Commands that use the scanner wait their turn in the chosen station's
+    device scheduler first; other commands go straight to the bridge. If
+    no station was named and the chosen one cannot be reached, the command
+    is retried once on the next available station.
+
+    Args:
+        command (str): The command string to send.
+        timeout (int): The socket timeout in seconds.
+        on_progress (callable | None): Called as ``on_progress(stage, message)``
+            for each progress line the bridge sends before its result.
+        deadline (float | None): ``time.monotonic()`` by which a device command
+            must have reached the scanner (see scheduler.DeviceScheduler.run).
+        priority (int): Scheduler priority of a device command.
+        station (str | None): Station to send to; None picks the least-loaded one.
+
+    Returns:
+        dict: A dictionary containing the status, message, bmp_base64 and structured fields,
+            and the "station" that served the command. A request refused by the
+            scheduler also carries "retry_after" in seconds.
+    """
+    with tracing.span(f"bridge {command.split()[0].upper()}", requested_station=station):
+        result = _send_command(command, timeout, tracing.progress_recorder(on_progress), deadline, priority, station)
+        tracing.record_result(result)
+        return result
+
+
+def _send_command(command, timeout, on_progress, deadline, priority, station):
+    endpoint = None
+    try:
+        start_time = time.time()
+        endpoint = _registry.select(station)
+        parser = BridgeResponseParser(on_progress=on_progress)
+        try:
+            _send(endpoint, command, timeout, parser, deadline, priority, on_progress)
+        except ConnectionError as e:
+            endpoint = fail_over(_registry, endpoint, station, parser, e)
+            _send(endpoint, command, timeout, parser, deadline, priority, on_progress)
+        return finish_response(parser, command, endpoint, start_time)
     except Exception as e:
-        return {"status": "error", "message": f"An unexpected error occurred: {str(e)}"}
+        return error_response(e, command, timeout, endpoint)
+    finally:
+        if endpoint is not None:
+            _registry.release(endpoint)
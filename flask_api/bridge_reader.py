@@ -0,0 +1,265 @@
+"""Incremental reader for bridge responses.
+
+Bridge responses are short status lines followed by a ``BMP:`` line holding a
+base64 bitmap that can run to hundreds of KB. Rather than concatenating recv
+chunks and splitting the whole buffer afterwards, the reader receives directly
+into a reusable ``bytearray`` through a ``memoryview`` and hands each complete
+line to a ``BridgeResponseParser`` as soon as its newline arrives.
+"""
+
+import time
+
+MIN_BUFFER_SIZE = 64 * 1024
+
+_END_PREFIX = b"END "
+_BOM = b"\xef\xbb\xbf"
+
+
+class BridgeProtocolError(Exception):
+    """Raised when the bridge sends a response that does not match the request."""
+
+
+class BridgeResponseParser:
+    """Recognises bridge response fields line by line.
+
+    The parser never keeps more than the current line and the extracted
+    fields; the base64 image is kept as bytes and never logged.
+
+    ``PROGRESS:<stage> <message>`` lines, sent by the bridge while it waits
+    for the finger or processes the image, are passed to ``on_progress`` and
+    never taken as the result line.
+
+    MATCH responses may list the strongest stored fingers as
+    ``CANDIDATE:<rank>|<finger_index>|<member>|<score>|<person_id>`` lines,
+    best first; they are collected in ``candidates``.
+
+    For the latency metrics the parser also keeps ``time.perf_counter()``
+    timestamps: ``sent_at`` (set by the caller when the command is sent),
+    ``first_line_at`` (any line) and ``result_at`` (the first line that is not
+    a progress update), plus ``parse_seconds`` spent in feed_line().
+
+    Args:
+        echo (bool): Print each non-image line as it is parsed.
+        on_progress (callable | None): Called as ``on_progress(stage, message)``.
+    """
+
+    def __init__(self, echo=True, on_progress=None):
+        self.echo = echo
+        self.on_progress = on_progress
+        self.result_message = "No valid response from bridge"
+        self.bmp_base64 = b""
+        self.person_id = None
+        self.finger_index = None
+        self.member = None
+        self.score = None
+        self.candidates = []
+        self.lines_seen = 0
+        self.sent_at = None
+        self.first_line_at = None
+        self.result_at = None
+        self.parse_seconds = 0.0
+
+    def is_empty(self):
+        """Return True if no response line has been parsed yet."""
+        return self.lines_seen == 0
+
+    def feed_line(self, line):
+        """Parse one response line.
+
+        Args:
+            line (bytes | bytearray | memoryview): The line without its newline.
+        """
+        start = time.perf_counter()
+        if self.first_line_at is None:
+            self.first_line_at = start
+        try:
+            self._feed_line(line)
+        finally:
+            self.parse_seconds += time.perf_counter() - start
+
+    def _feed_line(self, line):
+        self.lines_seen += 1
+        line = memoryview(line)
+
+        # Skip leading whitespace and a UTF-8 BOM without copying the line.
+        head = bytes(line[:16])
+        offset = len(head) - len(head.lstrip())
+        if head[offset:].startswith(_BOM):
+            offset += len(_BOM)
+
+        if self.result_at is None and head[offset:offset + 9] != b"PROGRESS:":
+            self.result_at = time.perf_counter()
+        if head[offset:offset + 4] == b"BMP:":
+            # Copy the image payload exactly once.
+            self.bmp_base64 = bytes(line[offset + 4:]).rstrip()
+            if self.echo:
+                print(f"[Bridge] BMP:<{len(self.bmp_base64)} bytes base64>")
+            return
+
+        line = bytes(line[offset:]).strip()
+        clean_line = line.decode("utf-8", errors="ignore")
+        if self.echo and clean_line:
+            print(f"[Bridge] {clean_line}")
+
+        if clean_line.startswith("PROGRESS:"):
+            stage, _, message = clean_line[9:].partition(" ")
+            if self.on_progress is not None:
+                self.on_progress(stage, message.strip())
+        elif clean_line.startswith("PERSON_ID:"):
+            self.person_id = clean_line[10:].strip()
+        elif clean_line.startswith("FINGER_INDEX:"):
+            try:
+                self.finger_index = int(clean_line[13:].strip())
+            except ValueError:
+                pass
+        elif clean_line.startswith("MEMBER:"):
+            self.member = clean_line[7:].strip()
+        elif clean_line.startswith("SCORE:"):
+            try:
+                self.score = float(clean_line[6:].strip())
+            except ValueError:
+                pass
+        elif clean_line.startswith("CANDIDATE:"):
+            # The person ID comes last so that it may itself contain "|".
+            fields = clean_line[10:].split("|", 4)
+            try:
+                self.candidates.append({
+                    "person_id": fields[4].strip(),
+                    "finger_index": int(fields[1]),
+                    "member": fields[2].strip(),
+                    "score": float(fields[3]),
+                })
+            except (IndexError, ValueError):
+                pass
+        elif "✅" in clean_line or "❌" in clean_line or clean_line.upper().startswith("OK") or "ERROR" in clean_line.upper():
+            self.result_message = clean_line
+
+    def result(self):
+        """Build the API response dictionary from the parsed fields.
+
+        Returns:
+            dict: A dictionary containing the status, message, bmp_base64 and structured
+                fields, with a "candidates" list when the bridge sent CANDIDATE lines.
+        """
+        result_message = self.result_message
+
+        status_str = "error"
+        if "✅" in result_message or "OK" in result_message.upper():
+            status_str = "success"
+        if "❌" in result_message: # No match is not an error
+            status_str = "no_match"
+        if "match" in result_message.lower():
+            if "✅" in result_message:
+                status_str = "match"
+            elif "❌" in result_message:
+                status_str = "no_match"
+
+        # Build enhanced response with backward compatibility
+        response = {
+            "status": status_str,
+            "message": result_message,
+            "bmp_base64": self.bmp_base64.decode("ascii", errors="ignore")
+        }
+
+        # Add structured fields when available (for enhanced match endpoint)
+        if self.person_id is not None:
+            response["person_id"] = self.person_id
+        if self.finger_index is not None:
+            response["finger_index"] = self.finger_index
+        if self.member is not None:
+            response["member"] = self.member
+        if self.score is not None:
+            response["score"] = self.score
+        if self.candidates:
+            response["candidates"] = self.candidates
+
+        return response
+
+
+class BridgeResponseReader:
+    """Reads framed or legacy responses from a socket into a reusable buffer.
+
+    The buffer starts at ``initial_size`` bytes and doubles only when a single
+    line does not fit, so total work stays linear in the response size and a
+    connection that has seen one large image does not reallocate again.
+    """
+
+    def __init__(self, initial_size=MIN_BUFFER_SIZE):
+        self._buf = bytearray(max(initial_size, 1024))
+
+    @property
+    def capacity(self):
+        return len(self._buf)
+
+    def _grow(self, used):
+        new_buf = bytearray(len(self._buf) * 2)
+        new_buf[:used] = memoryview(self._buf)[:used]
+        self._buf = new_buf
+
+    def read(self, sock, parser, request_id=None):
+        """Receive one response from ``sock`` and feed its lines to ``parser``.
+
+        Args:
+            sock (socket.socket): A connected socket with its timeout already set.
+            parser (BridgeResponseParser): Receives each complete line.
+            request_id (int | None): For framed responses, the expected END id.
+                If None, the response ends when the peer closes the connection.
+
+        Returns:
+            int: Total number of response bytes received.
+
+        Raises:
+            ConnectionError: If a framed response ends before its END line.
+            BridgeProtocolError: If the END line carries a different request ID.
+        """
+        buf = self._buf
+        view = memoryview(buf)
+        used = 0        # bytes currently held in buf
+        scanned = 0     # bytes of buf already searched for a newline
+        line_start = 0  # start of the current (incomplete) line
+        total = 0
+
+        while True:
+            if used == len(buf):
+                if line_start > 0:
+                    # Slide the incomplete line to the front.
+                    remaining = used - line_start
+                    buf[:remaining] = bytes(view[line_start:used])
+                    used -= line_start
+                    scanned -= line_start
+                    line_start = 0
+                else:
+                    view.release()
+                    self._grow(used)
+                    buf = self._buf
+                    view = memoryview(buf)
+
+            received = sock.recv_into(view[used:])
+            if not received:
+                if line_start < used:
+                    parser.feed_line(view[line_start:used])
+                view.release()
+                if request_id is not None:
+                    raise ConnectionError("Bridge closed the connection before end of response")
+                return total
+            used += received
+            total += received
+
+            while True:
+                newline = buf.find(b"\n", scanned, used)
+                if newline < 0:
+                    scanned = used
+                    break
+                line = view[line_start:newline]
+                if request_id is not None and bytes(line[:len(_END_PREFIX)]) == _END_PREFIX:
+                    end_id = bytes(line[len(_END_PREFIX):]).strip().decode(errors="ignore")
+                    view.release()
+                    if end_id != str(request_id):
+                        raise BridgeProtocolError(f"Expected END {request_id}, got END {end_id}")
+                    return total
+                parser.feed_line(line)
+                line_start = scanned = newline + 1
+
+            if line_start == used:
+                # Everything consumed; reuse the buffer from the start.
+                used = scanned = line_start = 0
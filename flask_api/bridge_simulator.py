@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+Offline simulator of the fingerprint bridge (MainForm.cs) for load and latency tests.
+
+Listens on the bridge port and answers CAPTURE, VERIFY, MATCH, SCAN and PING
+with the same lines the C# bridge writes: PROGRESS: lines while "waiting for
+the finger", the ✅/❌ result line, PERSON_ID:/FINGER_INDEX:/MEMBER:/SCORE:
+for a match, CANDIDATE: lines for "MATCH [top_k] [member]" and a BMP: line
+with the image. Both wire formats are served:
+framed "REQ <id> <command>" requests ending with "END <id>" on a kept-open
+connection, and legacy one-command connections. As on the real bridge, each
+station runs one device command at a time and PING is answered at once.
+
+Images come from a local corpus (a directory, zip or tar of prints named as
+for bulk_import.py) or, without --corpus, from synthetic prints. Each
+(person, finger) always gets impressions of the same finger, so genuine
+VERIFY/MATCH results carry a matching print for gallery-side matching.
+
+Scanner behaviour is configurable:
+
+    --latency-ms, --jitter-ms   time on the scanner: latency +/- uniform jitter
+    --processing-ms             time spent saving or matching after the scan
+    --match-rate                fraction of VERIFY/MATCH that find a match
+    --failure-rate              fraction of device commands whose capture fails
+    --timeout-rate              fraction that never answer (a stuck scanner)
+    --disconnect-rate           fraction that drop the connection mid-response
+
+Nothing is written to a database. Point the API at it with BRIDGE_HOST and
+BRIDGE_PORT (or BRIDGE_STATIONS for --stations above 1); the test scripts
+test_socket_basic.py and test_enhanced_match.py also run against it.
+
+Usage:
+    python bridge_simulator.py [--port 8123] [--stations 1] [--corpus DIR|ZIP|TAR]
+        [--latency-ms 1500] [--jitter-ms 500] [--failure-rate 0.02] [--timeout-rate 0]
+"""
+
+import argparse
+import asyncio
+import base64
+import logging
+import random
+import re
+import threading
+import zlib
+
+from config import BRIDGE_HOST, BRIDGE_PORT
+
+FINGER_NAMES = {
+    1: "Right Thumb", 2: "Right Index", 3: "Right Middle", 4: "Right Ring", 5: "Right Little",
+    6: "Left Thumb", 7: "Left Index", 8: "Left Middle", 9: "Left Ring", 10: "Left Little",
+}
+DEVICE_COMMANDS = ("CAPTURE", "VERIFY", "MATCH", "SCAN")
+MATCH_SCORE_THRESHOLD = 40   # the bridge's SourceAFIS match threshold
+SYNTHETIC_FINGERS = 16
+SYNTHETIC_IMPRESSIONS = 4
+
+
+def finger_name(finger_index):
+    return FINGER_NAMES.get(finger_index, "Unknown")
+
+
+# -----------------------------
+# Image sources
+# -----------------------------
+class ImagePool:
+    """Base64 BMP impressions grouped by finger, with optional (person_id, finger_index) labels.
+
+    Args:
+        fingers (list): One list of base64 BMP impressions per finger.
+        labels (list | None): (person_id, finger_index) of each finger, or None
+            when fingers are assigned to people by hash (synthetic prints).
+    """
+
+    def __init__(self, fingers, labels=None):
+        if not fingers:
+            raise ValueError("The image pool is empty")
+        self.fingers = fingers
+        self.labels = labels
+        self.by_label = {label: i for i, label in enumerate(labels)} if labels else {}
+
+    def finger_for(self, person_id, finger_index):
+        """Index of the finger that (person_id, finger_index) always maps to."""
+        label = (person_id, finger_index)
+        if label in self.by_label:
+            return self.by_label[label]
+        return zlib.crc32(f"{person_id}/{finger_index}".encode()) % len(self.fingers)
+
+    def impression(self, finger, rng):
+        return rng.choice(self.fingers[finger])
+
+    def other_finger(self, finger, rng):
+        """A finger other than ``finger`` (an impostor), when the pool has one."""
+        if len(self.fingers) == 1:
+            return finger
+        other = rng.randrange(len(self.fingers) - 1)
+        return other + (other >= finger)
+
+    def label(self, finger):
+        """(person_id, finger_index) reported when MATCH identifies ``finger``."""
+        if self.labels:
+            return self.labels[finger]
+        return f"sim-{finger}", 1 + finger % 10
+
+
+def synthetic_pool(fingers=SYNTHETIC_FINGERS, impressions=SYNTHETIC_IMPRESSIONS):
+    """Render ``impressions`` synthetic prints of each of ``fingers`` fingers."""
+    from synthetic_prints import impression, master_print, to_bmp
+
+    pool = []
+    for finger in range(fingers):
+        master, _ = master_print(finger)
+        pool.append([base64.b64encode(to_bmp(impression(master, finger * 1000 + i))).decode("ascii")
+                     for i in range(impressions)])
+    return ImagePool(pool)
+
+
+def corpus_pool(source, pattern=None, limit=None):
+    """Load prints from a directory, zip or tar archive, grouped by their (person_id, finger_index).
+
+    Entry names are matched against ``pattern`` (bulk_import.DEFAULT_PATTERN by
+    default); names that do not match become single-image fingers of their own.
+    Images are converted to BMP as the scanner would deliver them.
+
+    Raises:
+        bulk_import.ImportSourceError: If ``source`` is not a directory, zip or tar archive.
+        ValueError: If no image in the source could be read.
+    """
+    from bulk_import import DEFAULT_PATTERN, iter_source
+    from image_codec import normalize_to_bmp
+
+    regex = re.compile(pattern or DEFAULT_PATTERN, re.IGNORECASE)
+    grouped = {}
+    for count, (name, data) in enumerate(iter_source(source)):
+        if limit and count >= limit:
+            break
+        try:
+            bmp, _ = normalize_to_bmp(data)
+        except Exception as e:
+            logging.warning(f"[Simulator] Skipping {name}: {e}")
+            continue
+        match = regex.search(name)
+        label = (match["person_id"], int(match["finger_index"])) if match else (name, 1)
+        grouped.setdefault(label, []).append(base64.b64encode(bmp).decode("ascii"))
+    labels = list(grouped)
+    return ImagePool([grouped[label] for label in labels], labels)
+
+
+# -----------------------------
+# Simulated bridge
+# -----------------------------
+class _Dropped(Exception):
+    """The simulated bridge drops the connection without finishing its response."""
+
+
+class BridgeSimulator:
+    """One simulated bridge station with its own scanner.
+
+    Args:
+        images (ImagePool): Prints served as captures.
+        station_id (str): Name reported in "OK PONG <station_id>".
+        latency_ms (float): Mean time from the place_finger prompt to the capture.
+        jitter_ms (float): Captures take latency_ms +/- up to this much, uniformly.
+        processing_ms (float): Time after the capture spent saving or matching.
+        match_rate (float): Fraction of VERIFY and MATCH commands that match.
+        failure_rate (float): Fraction of device commands whose capture fails.
+        timeout_rate (float): Fraction of device commands that never answer.
+        disconnect_rate (float): Fraction of device commands whose connection is
+            closed after the place_finger prompt.
+        hang_sec (float): How long an unanswered command holds the scanner.
+        seed (int | None): Seed for reproducible latencies and outcomes.
+    """
+
+    def __init__(self, images, station_id="simulator", latency_ms=1500, jitter_ms=500, processing_ms=100,
+                 match_rate=0.9, failure_rate=0.0, timeout_rate=0.0, disconnect_rate=0.0, hang_sec=300,
+                 seed=None):
+        self.images = images
+        self.station_id = station_id
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.processing_ms = processing_ms
+        self.match_rate = match_rate
+        self.failure_rate = failure_rate
+        self.timeout_rate = timeout_rate
+        self.disconnect_rate = disconnect_rate
+        self.hang_sec = hang_sec
+        self.rng = random.Random(seed)
+        self.stats = {"commands": 0, "failures": 0, "timeouts": 0, "disconnects": 0}
+        self._scanner = None
+
+    async def serve(self, host, port):
+        """Start listening; returns the asyncio server."""
+        self._scanner = asyncio.Lock()
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader, writer):
+        """Serve one client connection in the framed or the legacy format."""
+        try:
+            while line := await reader.readline():
+                line = line.decode("utf-8", errors="replace").strip()
+                if not line.upper().startswith("REQ "):
+                    # Legacy one-shot connection
+                    await self.dispatch(line, writer)
+                    return
+                frame = line.split(None, 2)
+                request_id = frame[1] if len(frame) > 1 else "0"
+                await self.dispatch(frame[2] if len(frame) > 2 else "", writer)
+                writer.write(f"END {request_id}\n".encode())
+                await writer.drain()
+        except (_Dropped, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, line, writer):
+        """Answer one command line, holding the scanner for device commands."""
+        parts = line.split()
+        if not parts:
+            self._write(writer, "ERROR Empty command")
+            return
+        command = parts[0].upper()
+        if command == "PING":
+            self._write(writer, f"OK PONG {self.station_id}")
+            return
+        if command not in DEVICE_COMMANDS:
+            self._write(writer, "ERROR Unknown command")
+            return
+        if command in ("CAPTURE", "VERIFY"):
+            if len(parts) not in (3, 4):
+                self._write(writer, f"ERROR Usage: {command} <person_id> <finger_index> <member>")
+                return
+            try:
+                finger_index = int(parts[2])
+            except ValueError:
+                self._write(writer, "ERROR finger_index must be an integer")
+                return
+            args = (parts[1], finger_index, parts[3] if len(parts) == 4 else "prisoner")
+        elif command == "MATCH" and len(parts) > 1:
+            try:
+                top_k = int(parts[1])
+            except ValueError:
+                top_k = 0
+            if len(parts) > 3 or top_k < 1:
+                self._write(writer, "ERROR Usage: MATCH [top_k] [member]")
+                return
+            args = (top_k, parts[2] if len(parts) == 3 else None)
+        else:
+            args = ()
+
+        async with self._scanner:
+            self.stats["commands"] += 1
+            await getattr(self, f"_run_{command.lower()}")(writer, *args)
+        # The bridge writes the command's (empty) return value after its own lines.
+        self._write(writer, "")
+        await writer.drain()
+
+    # Device commands ------------------------------------------------------
+
+    async def _run_capture(self, writer, person_id, finger_index, member):
+        name = finger_name(finger_index)
+        bmp = await self._scan(writer, f"Place your {name} on the scanner",
+                               self.images.finger_for(person_id, finger_index))
+        if bmp is None:
+            self._write(writer, "❌ Capture failed. Please try again.")
+            return
+        self._progress(writer, "processing", "Saving fingerprint")
+        await self._sleep(self.processing_ms)
+        self._write(writer, f"✅ Successfully captured and saved {name}.")
+        self._write(writer, f"BMP:{bmp}")
+
+    async def _run_verify(self, writer, person_id, finger_index, member):
+        name = finger_name(finger_index)
+        finger = self.images.finger_for(person_id, finger_index)
+        matched = self.rng.random() < self.match_rate
+        bmp = await self._scan(writer, f"Place your {name} on the scanner",
+                               finger if matched else self.images.other_finger(finger, self.rng))
+        if bmp is None:
+            self._write(writer, "❌ Failed to capture fingerprint image.")
+            return
+        self._progress(writer, "processing", "Comparing with the stored fingerprint")
+        await self._sleep(self.processing_ms)
+        score = self._score(matched)
+        self._write(writer, f"✅ Match! Score: {score:.2f}" if matched else f"❌ No Match. Score: {score:.2f}")
+        self._write(writer, f"BMP:{bmp}")
+
+    async def _run_match(self, writer, top_k=1, member=None):
+        finger = self.rng.randrange(len(self.images.fingers))
+        bmp = await self._scan(writer, "Place your finger on the scanner", finger)
+        if bmp is None:
+            self._write(writer, "❌ Failed to capture fingerprint image.")
+            return
+        self._progress(writer, "processing", "Matching against stored fingerprints")
+        await self._sleep(self.processing_ms)
+        matched = self.rng.random() < self.match_rate
+        score = self._score(matched)
+        member = member or "prisoner"
+        if matched:
+            person_id, finger_index = self.images.label(finger)
+            self._write(writer, f"✅ Match: {person_id}, Finger: {finger_name(finger_index)}, Score: {score:.2f}")
+            self._write(writer, f"PERSON_ID:{person_id}")
+            self._write(writer, f"FINGER_INDEX:{finger_index}")
+            self._write(writer, f"MEMBER:{member}")
+            self._write(writer, f"SCORE:{score:.2f}")
+        else:
+            self._write(writer, f"❌ No good match found. Best score = {score:.2f}")
+
+        # The strongest stored fingers: the mate when matched, otherwise the
+        # best impostor at the reported score, then weaker impostors.
+        others = [other for other in range(len(self.images.fingers)) if other != finger]
+        others = self.rng.sample(others, min(top_k - matched, len(others)))
+        candidates = [(finger, score)] if matched else []
+        impostor_cap = min(score, MATCH_SCORE_THRESHOLD / 2)
+        candidates += [(other, self.rng.uniform(0, impostor_cap)) for other in others]
+        if not matched and candidates:
+            candidates[0] = (candidates[0][0], score)
+        candidates.sort(key=lambda candidate: candidate[1], reverse=True)
+        for rank, (candidate, candidate_score) in enumerate(candidates, 1):
+            person_id, finger_index = self.images.label(candidate)
+            self._write(writer, f"CANDIDATE:{rank}|{finger_index}|{member}|{candidate_score:.2f}|{person_id}")
+        self._write(writer, f"BMP:{bmp}")
+
+    async def _run_scan(self, writer):
+        finger = self.rng.randrange(len(self.images.fingers))
+        bmp = await self._scan(writer, "Place your finger on the scanner", finger)
+        if bmp is None:
+            self._write(writer, "❌ Failed to capture fingerprint image.")
+            return
+        self._write(writer, "✅ Scan captured.")
+        self._write(writer, f"BMP:{bmp}")
+
+    # Helpers --------------------------------------------------------------
+
+    async def _scan(self, writer, prompt, finger):
+        """Prompt, wait for the simulated finger and return an impression, or None on a failed capture.
+
+        Raises:
+            _Dropped: If this command was drawn to drop its connection.
+        """
+        self._progress(writer, "place_finger", prompt)
+        await writer.drain()
+        outcome = self.rng.random()
+        if outcome < self.timeout_rate:
+            self.stats["timeouts"] += 1
+            await asyncio.sleep(self.hang_sec)
+            raise _Dropped()
+        outcome -= self.timeout_rate
+        if outcome < self.disconnect_rate:
+            self.stats["disconnects"] += 1
+            raise _Dropped()
+        await self._sleep(self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms))
+        if outcome - self.disconnect_rate < self.failure_rate:
+            self.stats["failures"] += 1
+            return None
+        return self.images.impression(finger, self.rng)
+
+    def _score(self, matched):
+        if matched:
+            return self.rng.uniform(MATCH_SCORE_THRESHOLD, 3 * MATCH_SCORE_THRESHOLD)
+        return self.rng.uniform(0, MATCH_SCORE_THRESHOLD / 2)
+
+    @staticmethod
+    async def _sleep(ms):
+        await asyncio.sleep(max(ms, 0) / 1000)
+
+    @staticmethod
+    def _progress(writer, stage, message):
+        writer.write(f"PROGRESS:{stage} {message}\n".encode("utf-8"))
+
+    @staticmethod
+    def _write(writer, line):
+        writer.write(f"{line}\n".encode("utf-8"))
+
+
+def start_stations(count, images=None, host="127.0.0.1", port=0, **options):
+    """Run ``count`` simulated stations on a background event loop.
+
+    Args:
+        count (int): Number of stations, each with its own scanner.
+        images (ImagePool | None): Prints to serve; synthetic prints if None.
+        host (str): Address to listen on.
+        port (int): Port of the first station (the others follow it), or 0
+            to let the OS pick free ports.
+        **options: Passed to BridgeSimulator.
+
+    Returns:
+        tuple: (list of "host:port" addresses, list of BridgeSimulator)
+    """
+    images = images or synthetic_pool()
+    loop = asyncio.new_event_loop()
+    addresses = []
+    simulators = []
+    ready = threading.Event()
+    seed = options.pop("seed", None)
+
+    async def start():
+        for i in range(count):
+            simulator = BridgeSimulator(images, station_id=f"sim{i}",
+                                        seed=None if seed is None else seed + i, **options)
+            server = await simulator.serve(host, port + i if port else 0)
+            simulators.append(simulator)
+            addresses.append("%s:%d" % (host, server.sockets[0].getsockname()[1]))
+        ready.set()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(start())
+        loop.run_forever()
+
+    threading.Thread(target=run, name="bridge-simulator", daemon=True).start()
+    ready.wait()
+    return addresses, simulators
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=BRIDGE_HOST)
+    parser.add_argument("--port", type=int, default=BRIDGE_PORT, help="port of the first station")
+    parser.add_argument("--stations", type=int, default=1, help="stations on consecutive ports")
+    parser.add_argument("--corpus", help="directory, zip or tar of fingerprint images")
+    parser.add_argument("--pattern", help="regex with person_id and finger_index groups for corpus names")
+    parser.add_argument("--limit", type=int, help="load at most this many corpus images")
+    parser.add_argument("--latency-ms", type=float, default=1500)
+    parser.add_argument("--jitter-ms", type=float, default=500)
+    parser.add_argument("--processing-ms", type=float, default=100)
+    parser.add_argument("--match-rate", type=float, default=0.9)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--disconnect-rate", type=float, default=0.0)
+    parser.add_argument("--hang-sec", type=float, default=300, help="how long a timed-out command holds the scanner")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if args.corpus:
+        images = corpus_pool(args.corpus, args.pattern, args.limit)
+        print(f"Loaded {sum(len(f) for f in images.fingers)} images of {len(images.fingers)} fingers "
+              f"from {args.corpus}")
+    else:
+        images = synthetic_pool()
+        print(f"Generated {SYNTHETIC_IMPRESSIONS} impressions of {SYNTHETIC_FINGERS} synthetic fingers")
+
+    addresses, simulators = start_stations(
+        args.stations, images, args.host, args.port,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, processing_ms=args.processing_ms,
+        match_rate=args.match_rate, failure_rate=args.failure_rate, timeout_rate=args.timeout_rate,
+        disconnect_rate=args.disconnect_rate, hang_sec=args.hang_sec, seed=args.seed)
+    for simulator, address in zip(simulators, addresses):
+        print(f"✅ Station {simulator.station_id} listening on {address}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        for simulator in simulators:
+            print(f"{simulator.station_id}: " + ", ".join(f"{k}={v}" for k, v in simulator.stats.items()))
+
+
+if __name__ == "__main__":
+    main()
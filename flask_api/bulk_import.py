@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Bulk-enroll fingerprint images from a directory tree or a zip/tar archive.
+
+Streams every image in SOURCE, maps its path to (person_id, finger_index)
+with --pattern, normalises it to an 8-bit grayscale BMP and extracts its
+minutiae template in a process pool. Rows are written to
+fingerprint_templates with multi-row INSERTs and committed every
+--commit-every fingers. They land in the same columns as a live /capture:
+image_bmp, the compressed image_data copy and the minutiae template.
+
+The bridge's own ``template`` column (the scanner's vendor template) is
+left empty. No bridge command reads it: VERIFY and MATCH compare against
+image_bmp, written here as the same 8-bit grayscale BMP the scanner
+produces, so imported people are found by both match engines.
+
+Progress is checkpointed to --checkpoint after every commit. Re-running the
+same command resumes after the last committed entry. Existing fingers are
+kept unless --overwrite is given.
+
+The default pattern accepts "<person_id>/<finger_index>.<ext>" and
+"<person_id>_<finger_index>.<ext>" (also "finger_03"), anywhere in the tree.
+A custom --pattern is a regular expression searched in the entry path (with
+"/" separators). It needs named groups person_id and finger_index, and may
+add a member group. Entries that do not match are skipped.
+
+Usage:
+    python bulk_import.py SOURCE [--member prisoner] [--pattern REGEX] [--workers 4]
+        [--batch-size 200] [--commit-every 1000] [--checkpoint FILE] [--overwrite] [--limit N]
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from config import (IMPORT_BATCH_SIZE, IMPORT_COMMIT_EVERY, IMPORT_MAX_DIMENSION, IMPORT_MIN_DIMENSION,
+                    IMPORT_WORKERS, IMAGE_STORAGE_FORMAT)
+from db_pool import get_pool
+from image_codec import encode_image, normalize_to_bmp
+from minutiae import EXTRACTOR_VERSION
+from schema import ensure_columns
+from template_store import extract_template
+
+IMAGE_EXTENSIONS = (".bmp", ".png", ".jpg", ".jpeg", ".tif", ".tiff", ".wsq")
+DEFAULT_PATTERN = (r"(?:^|/)(?P<person_id>[^/_]+)[/_](?:finger_?)?(?P<finger_index>\d{1,2})"
+                   r"\.(?:bmp|png|jpe?g|tiff?|wsq)$")
+MEMBERS = ("prisoner", "suspect")
+
+
+class ImportSourceError(Exception):
+    """Raised when the import source cannot be opened."""
+
+
+# -----------------------------
+# Sources
+# -----------------------------
+def iter_directory(path):
+    """(relative path, bytes) for every image file under ``path``, in sorted order."""
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                full = os.path.join(root, name)
+                with open(full, "rb") as f:
+                    yield os.path.relpath(full, path).replace(os.sep, "/"), f.read()
+
+
+def iter_zip(path):
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                yield info.filename, archive.read(info)
+
+
+def iter_tar(path):
+    # Stream mode reads members in archive order without seeking, so compressed tars are not re-read.
+    with tarfile.open(path, mode="r|*") as archive:
+        for member in archive:
+            if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                yield member.name, archive.extractfile(member).read()
+
+
+def iter_source(path):
+    """Stream (entry path, image bytes) from a directory, zip or tar archive.
+
+    Raises:
+        ImportSourceError: If ``path`` is none of these.
+    """
+    if os.path.isdir(path):
+        return iter_directory(path)
+    if zipfile.is_zipfile(path):
+        return iter_zip(path)
+    if os.path.isfile(path) and tarfile.is_tarfile(path):
+        return iter_tar(path)
+    raise ImportSourceError(f"{path} is not a directory, zip or tar archive")
+
+
+def resolve_import_source(source, root):
+    """Absolute path of an import ``source`` requested over HTTP, confined to ``root``.
+
+    Relative sources are taken from ``root``, which is itself relative to the
+    executable (or this module). Symlinks are resolved before the check, so
+    a link cannot lead outside ``root``. ``root`` itself is refused because
+    its checkpoint, <root>.import.json, would lie outside it.
+
+    Raises:
+        ImportSourceError: If ``source`` is not an existing entry inside ``root``.
+    """
+    if not os.path.isabs(root):
+        base = os.path.dirname(sys.executable if getattr(sys, "frozen", False) else os.path.abspath(__file__))
+        root = os.path.join(base, root)
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, source))
+    if path == root or os.path.commonpath([root, path]) != root:
+        raise ImportSourceError("source must be inside the import directory (IMPORT_ROOT)")
+    if not os.path.exists(path):
+        raise ImportSourceError("source must be an existing directory or archive")
+    return path
+
+
+# -----------------------------
+# Worker side
+# -----------------------------
+def prepare_entry(entry):
+    """Normalise one image and extract its template; runs in the worker processes.
+
+    Args:
+        entry (tuple): (name, person_id, finger_index, member, image bytes)
+
+    Returns:
+        tuple: ((person_id, finger_index, member, bmp, image_data, template), None) on
+            success, (name, error message) on failure.
+    """
+    name, person_id, finger_index, member, data = entry
+    try:
+        bmp, (width, height) = normalize_to_bmp(data)
+        if min(width, height) < IMPORT_MIN_DIMENSION or max(width, height) > IMPORT_MAX_DIMENSION:
+            return name, f"image is {width}x{height}, outside {IMPORT_MIN_DIMENSION}-{IMPORT_MAX_DIMENSION} px"
+        image_data = encode_image(bmp, IMAGE_STORAGE_FORMAT) if IMAGE_STORAGE_FORMAT != "bmp" else None
+        return (person_id, finger_index, member, bmp, image_data, extract_template(bmp)), None
+    except Exception as e:
+        return name, str(e)
+
+
+# -----------------------------
+# Checkpoints
+# -----------------------------
+def load_checkpoint(path, source):
+    """Entries already committed for ``source`` and the counters so far."""
+    if not path or not os.path.exists(path):
+        return {"source": source, "position": 0, "imported": 0, "failed": 0, "skipped": 0}
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("source") != source:
+        raise ImportSourceError(f"Checkpoint {path} belongs to {checkpoint.get('source')}, not {source}")
+    return checkpoint
+
+
+def default_checkpoint(source):
+    """Checkpoint file kept next to the source: <source>.import.json."""
+    return os.path.abspath(source).rstrip("/\\") + ".import.json"
+
+
+def save_checkpoint(path, checkpoint):
+    if not path:
+        return
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp, path)
+
+
+# -----------------------------
+# Import
+# -----------------------------
+def insert_rows(conn, rows, overwrite):
+    """Write prepared fingers; PyMySQL batches executemany INSERTs into multi-row statements.
+
+    ``template`` stays NULL (see the module docstring): the bridge matches on
+    ``image_bmp``, and an overwritten finger must not keep the old scan's template.
+    """
+    if overwrite:
+        update = ("`image_bmp` = VALUES(`image_bmp`), `template` = NULL, `image_data` = VALUES(`image_data`), "
+                  "`image_format` = VALUES(`image_format`), `minutiae_template` = VALUES(`minutiae_template`), "
+                  "`extractor_version` = VALUES(`extractor_version`)")
+    else:
+        update = "`person_id` = `person_id`"
+    with conn.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO fingerprint_templates (person_id, finger_index, member, image_bmp, image_data, "
+            "image_format, minutiae_template, extractor_version) VALUES (%s, %s, %s, %s, %s, %s, %s, %s) "
+            f"ON DUPLICATE KEY UPDATE {update}",
+            [(person_id, finger_index, member, bmp, image_data, IMAGE_STORAGE_FORMAT if image_data else None,
+              template, EXTRACTOR_VERSION)
+             for person_id, finger_index, member, bmp, image_data, template in rows])
+
+
+def run_import(source, member="prisoner", pattern=DEFAULT_PATTERN, workers=IMPORT_WORKERS,
+               batch_size=IMPORT_BATCH_SIZE, commit_every=IMPORT_COMMIT_EVERY, checkpoint_path=None,
+               overwrite=False, limit=None, on_progress=None):
+    """Import every matching image in ``source`` into fingerprint_templates.
+
+    Args:
+        source (str): Directory, zip or tar archive.
+        member (str): Member for entries whose path has no member group.
+        pattern (str): Regular expression mapping entry paths to fingers.
+        workers (int): Extraction processes; 0 uses every CPU, 1 extracts in-process.
+        batch_size (int): Rows per multi-row INSERT.
+        commit_every (int): Fingers written between commits and checkpoints.
+        checkpoint_path (str | None): JSON checkpoint to resume from and update.
+        overwrite (bool): Replace fingers already on file instead of keeping them.
+        limit (int | None): Stop after this many entries.
+        on_progress (callable | None): Receives ("importing", message) after every commit.
+
+    Returns:
+        dict: The final checkpoint: position, imported, failed, skipped and
+            fingers_per_second for this run.
+    """
+    regex = re.compile(pattern)
+    checkpoint = load_checkpoint(checkpoint_path, os.path.abspath(source))
+    entries = iter_source(source)
+    if checkpoint["position"]:
+        logging.info(f"[Import] Resuming {source} after entry {checkpoint['position']}")
+        entries = islice(entries, checkpoint["position"], None)
+    if limit is not None:
+        entries = islice(entries, limit)
+
+    workers = workers or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    pool = get_pool()
+    with pool.connection() as conn:
+        ensure_columns(conn, "image_data", "image_format", "minutiae_template", "extractor_version")
+
+    def batches():
+        """(entries consumed, entries skipped, entries to prepare) per batch of the source."""
+        while True:
+            batch = list(islice(entries, batch_size))
+            if not batch:
+                return
+            jobs = []
+            for name, data in batch:
+                match = regex.search(name)
+                if match is None:
+                    continue
+                finger_index = int(match.group("finger_index"))
+                entry_member = match.groupdict().get("member") or member
+                if 1 <= finger_index <= 10 and entry_member in MEMBERS:
+                    jobs.append((name, match.group("person_id"), finger_index, entry_member, data))
+            yield len(batch), len(batch) - len(jobs), jobs
+
+    start = time.time()
+    imported = uncommitted = 0
+
+    def write(conn, consumed, skipped, results):
+        nonlocal imported, uncommitted
+        rows = []
+        for row, error in results:
+            if error:
+                checkpoint["failed"] += 1
+                print(f"❌ {row}: {error}")
+            else:
+                rows.append(row)
+        insert_rows(conn, rows, overwrite)
+        checkpoint["position"] += consumed
+        checkpoint["skipped"] += skipped
+        checkpoint["imported"] += len(rows)
+        imported += len(rows)
+        uncommitted += len(rows)
+
+    def commit(conn):
+        nonlocal uncommitted
+        conn.commit()
+        uncommitted = 0
+        rate = imported / max(time.time() - start, 1e-9)
+        checkpoint["fingers_per_second"] = round(rate, 1)
+        save_checkpoint(checkpoint_path, checkpoint)
+        message = (f"{checkpoint['imported']} fingers imported ({checkpoint['failed']} failed, "
+                   f"{checkpoint['skipped']} skipped), {rate:.1f} fingers/sec")
+        print(f"✅ {message}")
+        if on_progress is not None:
+            on_progress("importing", message)
+
+    try:
+        with pool.connection() as conn:
+            pending = None
+            for consumed, skipped, jobs in batches():
+                # Submitted before the previous batch is written, so extraction overlaps the INSERT.
+                results = executor.map(prepare_entry, jobs, chunksize=8) if executor else map(prepare_entry, jobs)
+                if pending is not None:
+                    write(conn, *pending)
+                    if uncommitted >= commit_every:
+                        commit(conn)
+                pending = (consumed, skipped, results)
+            if pending is not None:
+                write(conn, *pending)
+            commit(conn)
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+
+    print(f"Done: {imported} fingers imported in {time.time() - start:.1f} sec "
+          f"({checkpoint['imported']} in total, {checkpoint['failed']} failed, {checkpoint['skipped']} skipped)")
+    return checkpoint
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="directory, .zip or .tar(.gz) of fingerprint images")
+    parser.add_argument("--member", default="prisoner", choices=MEMBERS)
+    parser.add_argument("--pattern", default=DEFAULT_PATTERN, help="regex mapping entry paths to fingers")
+    parser.add_argument("--workers", type=int, default=IMPORT_WORKERS, help="extraction processes (0 = all CPUs)")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="rows per multi-row INSERT")
+    parser.add_argument("--commit-every", type=int, default=IMPORT_COMMIT_EVERY, help="fingers per commit")
+    parser.add_argument("--checkpoint", help="resume file (default: <source>.import.json)")
+    parser.add_argument("--overwrite", action="store_true", help="replace fingers already on file")
+    parser.add_argument("--limit", type=int, help="stop after this many entries")
+    args = parser.parse_args()
+
+    run_import(args.source, args.member, args.pattern, args.workers, args.batch_size, args.commit_every,
+               args.checkpoint or default_checkpoint(args.source), args.overwrite, args.limit)
+
+
+if __name__ == "__main__":
+    main()
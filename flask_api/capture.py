@@ -1,18 +1,57 @@
 """Fingerprint Capture Module"""
 
+from async_bridge import send_bridge_command_async
 from bridge_client import send_bridge_command
+from scheduler import PRIORITY_NORMAL
 
-def capture_fingerprint_bmp(person_id, finger_index, member="prisoner"):
+def capture_fingerprint_bmp(person_id, finger_index, member="prisoner", on_progress=None,
+                            deadline=None, priority=PRIORITY_NORMAL, station=None):
     """Capture a fingerprint image in BMP format.
 
     Args:
         person_id (str): Unique identifier for the person.
         finger_index (int): Index of the finger being captured (1-10).
         member (str): Whether the person is "prisoner" or "suspect".
+        on_progress (callable | None): Receives the bridge's progress updates.
+        deadline (float | None): ``time.monotonic()`` by which the scanner must be reached.
+        priority (int): Device scheduler priority.
+        station (str | None): Bridge station to use; None picks the least-loaded one.
 
     Returns:
         dict: A dictionary containing the result of the capture operation.
     """
     command = f"CAPTURE {person_id} {finger_index} {member}\n"
-    return send_bridge_command(command, timeout=30)
+    return send_bridge_command(command, timeout=30, on_progress=on_progress,
+                               deadline=deadline, priority=priority, station=station)
 
+
+def scan_fingerprint_bmp(on_progress=None, deadline=None, priority=PRIORITY_NORMAL, station=None):
+    """Capture a live fingerprint image without saving or matching it.
+
+    Args:
+        on_progress (callable | None): Receives the bridge's progress updates.
+        deadline (float | None): ``time.monotonic()`` by which the scanner must be reached.
+        priority (int): Device scheduler priority.
+        station (str | None): Bridge station to use; None picks the least-loaded one.
+
+    Returns:
+        dict: A dictionary containing the result of the scan and the BMP image.
+    """
+    command = "SCAN\n"
+    return send_bridge_command(command, timeout=30, on_progress=on_progress,
+                               deadline=deadline, priority=priority, station=station)
+
+
+async def capture_fingerprint_bmp_async(person_id, finger_index, member="prisoner", on_progress=None,
+                                        deadline=None, priority=PRIORITY_NORMAL, station=None):
+    """Coroutine version of capture_fingerprint_bmp() for the asyncio serving mode."""
+    command = f"CAPTURE {person_id} {finger_index} {member}\n"
+    return await send_bridge_command_async(command, timeout=30, on_progress=on_progress,
+                                           deadline=deadline, priority=priority, station=station)
+
+
+async def scan_fingerprint_bmp_async(on_progress=None, deadline=None, priority=PRIORITY_NORMAL, station=None):
+    """Coroutine version of scan_fingerprint_bmp() for the asyncio serving mode."""
+    command = "SCAN\n"
+    return await send_bridge_command_async(command, timeout=30, on_progress=on_progress,
+                                           deadline=deadline, priority=priority, station=station)
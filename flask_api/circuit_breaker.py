@@ -0,0 +1,82 @@
+"""Circuit breaker for taking an unreachable bridge station out of rotation.
+
+A breaker starts closed. ``failures`` consecutive failures open it, and
+while it is open the station gets no requests. After ``reset_timeout``
+seconds the breaker becomes half-open. It then lets a single trial through,
+either a health-check PING or a real request. A successful trial closes the
+breaker; a failed one opens it again for another ``reset_timeout``.
+"""
+
+import threading
+import time
+
+from config import BRIDGE_BREAKER_FAILURES, BRIDGE_BREAKER_RESET
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    Args:
+        failures (int): Consecutive failures that open the breaker.
+        reset_timeout (float): Seconds an open breaker waits before a trial.
+    """
+
+    def __init__(self, failures=BRIDGE_BREAKER_FAILURES, reset_timeout=BRIDGE_BREAKER_RESET):
+        self.max_failures = failures
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def _trial_due(self):
+        return self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout
+
+    def available(self):
+        """True if a request may be sent now, without claiming the half-open trial."""
+        with self._lock:
+            return self.state == CLOSED or self._trial_due() or (self.state == HALF_OPEN and not self._trial)
+
+    def allow(self):
+        """Claim permission to send a request; in half-open state only one caller gets it."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self._trial_due():
+                self.state = HALF_OPEN
+                self._trial = False
+            if self.state == HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def release(self):
+        """Give back a claimed half-open trial that was never sent."""
+        with self._lock:
+            self._trial = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.state == HALF_OPEN or self.failures >= self.max_failures:
+                if self.state != OPEN:
+                    self.trips += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "trips": self.trips}
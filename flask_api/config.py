@@ -10,4 +10,98 @@ DB_NAME = "apis2021_apims"
 
 # Bridge Service Configuration
 BRIDGE_HOST = "127.0.0.1"
-BRIDGE_PORT = 8123
\ No newline at end of file
+BRIDGE_PORT = 8123
+
+# API Server
+API_HOST = "0.0.0.0"
+API_PORT = 5001
+ASYNC_OFFLOAD_THREADS = 16    # asyncio mode: threads for Flask-served routes and blocking DB work
+
+# Tray Launcher Server
+SERVER_MODE = "waitress"      # "waitress" (production) or "werkzeug" (development server)
+SERVER_THREADS = 32           # worker threads; a synchronous scanner request holds one while it waits
+SERVER_CONNECTION_LIMIT = 200 # open connections before new ones wait in the listen backlog
+SERVER_BACKLOG = 128          # listen backlog once the connection limit is reached
+SERVER_CHANNEL_TIMEOUT = 120  # seconds an idle keep-alive connection is kept open
+SERVER_DRAIN_TIMEOUT = 30     # Pause/Exit: seconds in-flight requests get to finish
+
+# Database Connection Pool
+DB_POOL_SIZE = 5              # maximum open connections
+DB_POOL_TIMEOUT = 10          # seconds to wait for a free connection
+DB_POOL_RECYCLE = 3600        # seconds before a connection is replaced
+DB_POOL_PING_INTERVAL = 30    # idle seconds before a connection is pinged on checkout
+DB_CONNECT_TIMEOUT = 10       # seconds for the initial TCP/MySQL handshake
+
+# Bridge Connection Protocol
+BRIDGE_PROTOCOL = "framed"    # "framed" (REQ/END, pooled connections) or "legacy" (one command per connection)
+BRIDGE_POOL_SIZE = 2          # idle bridge connections kept for reuse
+BRIDGE_CONNECT_TIMEOUT = 5    # seconds to establish a bridge connection
+
+# Bridge Stations
+BRIDGE_STATIONS = {}          # station_id -> "host:port"; empty means one "default" station at BRIDGE_HOST:BRIDGE_PORT
+BRIDGE_HEALTH_INTERVAL = 10   # seconds between PING health checks of every station; 0 disables them
+BRIDGE_BREAKER_FAILURES = 3   # consecutive failures that take a station out of rotation
+BRIDGE_BREAKER_RESET = 30     # seconds before an out-of-rotation station gets a trial request
+
+# Device Scheduler
+DEVICE_QUEUE_MAX = 32         # device requests allowed to wait for the scanner
+DEVICE_DEADLINE = 60          # default seconds a device request may wait before it must start
+DEVICE_SERVICE_ESTIMATE = 10  # assumed seconds per device command until real timings are known
+
+# Image Responses
+DEFAULT_IMAGE_MODE = "base64" # "base64" (image inside JSON) or "url" (JSON carries image_url/image_sha1 only)
+LIVE_IMAGE_STORE_SIZE = 32    # recent live captures kept for /live-images/<sha1>
+
+# Image Storage
+IMAGE_STORAGE_FORMAT = "png"  # format written to image_data: "png" (lossless), "wsq" (needs the wsq package) or "bmp"
+
+# Image Cache
+IMAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024  # total BMP bytes kept in memory
+IMAGE_CACHE_TTL = 300                     # seconds before a cached image is re-read from the DB
+
+# Identification
+MATCH_ENGINE = "bridge"         # "bridge" (MatchAndIdentify in the bridge) or "gallery" (in-process template gallery)
+GALLERY_MATCH_THRESHOLD = 10.0  # minimum gallery score (0-100 scale) reported as a match
+MATCH_TOP_K = 10                # candidates /match returns by default, with either engine
+MATCH_MAX_TOP_K = 100           # largest top_k a /match request may ask for
+MATCH_WORKERS = 0               # gallery scoring processes; 0 or 1 scores inside the API process
+GALLERY_POLL_INTERVAL = 5       # seconds between polls for rows written by other stations; 0 disables
+GALLERY_PENETRATION_RATE = 1.0  # fraction of the gallery scored after coarse pre-filtering; 1.0 scores all
+GALLERY_SNAPSHOT_PATH = "gallery.snapshot"  # mapped at startup if present, rewritten as the gallery changes; "" disables
+GALLERY_SNAPSHOT_HEADROOM = 0.125  # spare snapshot rows, as a fraction of the gallery, for later enrollments
+GALLERY_SNAPSHOT_EVERY = 1000   # gallery changes that trigger a snapshot rewrite at the next update poll
+GALLERY_SNAPSHOT_INTERVAL = 3600  # seconds after which any change triggers a rewrite; 0 rewrites only on count
+
+# Batch Verification
+VERIFY_BATCH_MAX_FINGERS = 10   # fingers accepted by one /verify/batch request
+VERIFY_FINGER_THRESHOLD = 10.0  # per-finger score (0-100) counted as a matching finger
+VERIFY_FUSED_THRESHOLD = 10.0   # mean score over the compared fingers needed to verify the person
+
+# Bulk Import
+IMPORT_WORKERS = 0              # template extraction processes; 0 uses every CPU
+IMPORT_BATCH_SIZE = 200         # rows per multi-row INSERT
+IMPORT_COMMIT_EVERY = 1000      # fingers written between commits and checkpoints
+IMPORT_MIN_DIMENSION = 100      # images with a side shorter than this (pixels) are rejected
+IMPORT_MAX_DIMENSION = 2000     # images with a side longer than this (pixels) are rejected
+IMPORT_ROOT = ""                # POST /imports only reads sources inside this directory; "" disables it
+
+# Jobs
+JOB_WORKERS = 4                 # long-running operations run at the same time; the rest queue
+JOB_TTL = 300                   # seconds a finished job's result stays available
+MAX_JOBS = 1000                 # jobs kept in memory; oldest finished ones are dropped first
+JOB_MAX_WAIT = 30               # longest long-poll wait on /jobs/<id>, in seconds
+JOB_MAX_STREAMS = 8             # concurrent /jobs/<id>/events streams; each holds a server thread
+
+# Metrics
+METRICS_ENABLED = True          # record request and per-stage latency histograms for GET /metrics
+METRICS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 20, 30, 60)  # histogram upper bounds in seconds
+
+# Tracing
+TRACE_EXPORTER = "jsonl"        # "jsonl" (append spans to TRACE_FILE), "otlp" (POST to TRACE_OTLP_ENDPOINT) or "" for none
+TRACE_SAMPLE_RATE = 0.01        # fraction of requests exported regardless of speed or outcome
+TRACE_SLOW_THRESHOLD = 20       # requests slower than this (seconds) are always exported; 0 disables
+TRACE_ERRORS = True             # always export requests with a failed span
+TRACE_FILE = "traces.jsonl"     # relative paths are next to the executable
+TRACE_OTLP_ENDPOINT = "http://127.0.0.1:4318/v1/traces"  # OTLP/HTTP JSON collector
+TRACE_QUEUE_SIZE = 1000         # kept traces waiting for export; further ones are dropped
@@ -0,0 +1,298 @@
+"""Bounded, thread-safe MySQL connection pool for the Flask API.
+
+Every request used to open its own PyMySQL connection to the remote database
+host, paying for the TCP connect, MySQL handshake and authentication each
+time. This module keeps a small set of authenticated connections open and
+hands them out to request threads.
+
+Usage:
+    from db_pool import get_pool
+
+    with get_pool().connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pymysql
+
+from config import (
+    DB_HOST, DB_USER, DB_PASSWORD, DB_NAME,
+    DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PING_INTERVAL,
+    DB_CONNECT_TIMEOUT,
+)
+from metrics import observe_stage
+import tracing
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the pool timeout."""
+
+
+class TimedCursor(pymysql.cursors.Cursor):
+    """Default cursor that records each statement as the db_query stage and as a trace span.
+
+    executemany() runs through execute(), so a multi-row INSERT is recorded
+    once per statement it sends.
+    """
+
+    def execute(self, query, args=None):
+        verb = _statement_verb(query)
+        start = time.perf_counter()
+        with tracing.span(f"db {verb}", statement=tracing.statement_text(query)):
+            try:
+                return super().execute(query, args)
+            finally:
+                observe_stage("db_query", time.perf_counter() - start, verb)
+
+
+def _statement_verb(query):
+    """First word of ``query``, lowercased ("select", "insert", ...); executemany passes bytes."""
+    head = query[:16]
+    if isinstance(head, (bytes, bytearray)):
+        head = head.decode("ascii", errors="ignore")
+    words = head.split(None, 1)
+    return words[0].lower() if words else ""
+
+
+class _PooledConnection:
+    """A raw PyMySQL connection plus the bookkeeping the pool needs."""
+
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """A bounded pool of PyMySQL connections.
+
+    At most ``max_size`` connections exist at any time. Idle connections are
+    kept in LIFO order so the most recently used (and therefore most likely
+    still alive) connection is handed out first.
+
+    Args:
+        connect (callable): Zero-argument factory returning a new DB-API connection.
+        max_size (int): Maximum number of open connections.
+        timeout (float): Seconds to wait for a free connection before raising PoolTimeout.
+        recycle (float): Connections older than this many seconds are closed and replaced.
+        ping_interval (float): Idle connections unused for longer than this are pinged
+            before being handed out.
+    """
+
+    def __init__(self, connect, max_size=5, timeout=10, recycle=3600, ping_interval=30):
+        self._connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_interval = ping_interval
+
+        self._idle = deque()
+        self._open = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._closed = False
+
+        # Metrics
+        self._created = 0
+        self._recycled = 0
+        self._failed_pings = 0
+        self._acquired = 0
+        self._timeouts = 0
+        self._wait_time_total = 0.0
+
+    # -----------------------------
+    # Acquire / release
+    # -----------------------------
+    def acquire(self):
+        """Check a connection out of the pool.
+
+        Returns:
+            _PooledConnection: The pooled connection wrapper.
+
+        Raises:
+            PoolTimeout: If no connection is available within ``timeout`` seconds.
+        """
+        start = time.monotonic()
+        deadline = start + self.timeout
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._open < self.max_size:
+                    # Reserve the slot, then connect outside the lock.
+                    self._open += 1
+                    entry = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout} seconds")
+                self._cond.wait(remaining)
+
+        try:
+            if entry is None:
+                entry = self._new_connection()
+            else:
+                entry = self._check_health(entry)
+        except Exception:
+            self._discard_slot()
+            raise
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._acquired += 1
+            self._wait_time_total += waited
+        observe_stage("db_connection_wait", waited)
+        return entry
+
+    def release(self, entry, discard=False):
+        """Return a connection to the pool, or close it if ``discard`` is set."""
+        if discard or self._closed:
+            self._close_quietly(entry.conn)
+            self._discard_slot()
+            return
+
+        entry.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a pooled connection.
+
+        The connection is rolled back (if a transaction was left open) and
+        returned to the pool on exit. If the block raises a database error the
+        connection is discarded instead, since its state is unknown.
+        """
+        entry = self.acquire()
+        discard = False
+        try:
+            yield entry.conn
+        except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+            discard = True
+            raise
+        finally:
+            if not discard:
+                try:
+                    entry.conn.rollback()
+                except Exception:
+                    discard = True
+            self.release(entry, discard=discard)
+
+    # -----------------------------
+    # Health checking / recycling
+    # -----------------------------
+    def _new_connection(self):
+        conn = self._connect()
+        with self._cond:
+            self._created += 1
+        return _PooledConnection(conn)
+
+    def _check_health(self, entry):
+        now = time.monotonic()
+        if self.recycle and now - entry.created_at > self.recycle:
+            self._close_quietly(entry.conn)
+            with self._cond:
+                self._recycled += 1
+            return self._new_connection()
+
+        if self.ping_interval is not None and now - entry.last_used > self.ping_interval:
+            try:
+                entry.conn.ping(reconnect=False)
+            except Exception as e:
+                logging.warning(f"[DBPool] Idle connection failed health check, reconnecting: {e}")
+                self._close_quietly(entry.conn)
+                with self._cond:
+                    self._failed_pings += 1
+                return self._new_connection()
+        return entry
+
+    def _discard_slot(self):
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """Close all idle connections and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            self._close_quietly(entry.conn)
+
+    # -----------------------------
+    # Metrics
+    # -----------------------------
+    def stats(self):
+        """Return a snapshot of the pool metrics.
+
+        Returns:
+            dict: Sizes, counters and the average checkout wait in milliseconds.
+        """
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "max_size": self.max_size,
+                "open": self._open,
+                "idle": idle,
+                "in_use": self._open - idle,
+                "created": self._created,
+                "recycled": self._recycled,
+                "failed_pings": self._failed_pings,
+                "acquired": self._acquired,
+                "timeouts": self._timeouts,
+                "avg_wait_ms": round(1000 * self._wait_time_total / self._acquired, 3) if self._acquired else 0.0,
+            }
+
+
+def _connect_mysql():
+    return pymysql.connect(
+        host=DB_HOST,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_NAME,
+        connect_timeout=DB_CONNECT_TIMEOUT,
+        cursorclass=TimedCursor,
+    )
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    _connect_mysql,
+                    max_size=DB_POOL_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                    recycle=DB_POOL_RECYCLE,
+                    ping_interval=DB_POOL_PING_INTERVAL,
+                )
+    return _pool
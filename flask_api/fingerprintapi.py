@@ -1,12 +1,14 @@
 import threading
 import ctypes
+import multiprocessing
 import time
 import os
 import sys
 from pystray import Icon, Menu, MenuItem
 from PIL import Image
-from app import app
-from werkzeug.serving import make_server
+from app import app, warm_up
+from config import API_HOST, API_PORT
+from wsgi_server import create_server
 
 # Global variables for API state and server control
 api_running = True
@@ -17,12 +19,13 @@ class ServerThread(threading.Thread):
     def __init__(self):
         super().__init__(daemon=True)
         self._stop_event = threading.Event()
-        self.server = make_server('0.0.0.0', 5001, app)
+        self.server = create_server(app, API_HOST, API_PORT)
         
     def run(self):
         self.server.serve_forever()
         
     def shutdown(self):
+        # Drains in-flight requests (up to SERVER_DRAIN_TIMEOUT) before returning.
         self.server.shutdown()
 
 def start_api():
@@ -117,11 +120,16 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
-# Create icon with initial menu
-icon_path = resource_path('fingerprintAPI.ico')
-icon = Icon('FingerprintAPI', Image.open(icon_path), 'Fingerprint API', menu=create_menu())
+if __name__ == '__main__':
+    # Required for the gallery scoring worker processes in the frozen executable.
+    multiprocessing.freeze_support()
 
-# Start API initially
-start_api()
+    # Create icon with initial menu
+    icon_path = resource_path('fingerprintAPI.ico')
+    icon = Icon('FingerprintAPI', Image.open(icon_path), 'Fingerprint API', menu=create_menu())
 
-icon.run()
+    # Start API initially
+    warm_up()
+    start_api()
+
+    icon.run()
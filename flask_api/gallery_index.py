@@ -0,0 +1,254 @@
+"""Coarse index keys for pruning 1:N identification.
+
+Before full minutiae scoring, every gallery template is compared with the
+probe on a few cheap, global features:
+
+    pattern class   arch / tented arch / left loop / right loop / whorl,
+                    from the cores and deltas found with the Poincare index
+    core, delta     number of singular points of each kind
+    density         ridge period bucket
+    finger position the stored finger_index, when the caller supplies one
+
+Finger position is exact metadata and is used as a hard filter. The other
+features are estimates, so they only rank the gallery by a coarse distance;
+the closest ``penetration_rate`` fraction is scored in full. Probes whose
+orientation field is too poor to classify get PATTERN_UNKNOWN and unknown
+counts, which never add distance.
+"""
+
+from collections import namedtuple
+import math
+
+import numpy as np
+
+from minutiae import BLOCK_RADIUS, MIN_FOREGROUND_STD, box_mean, orientation_field
+
+PATTERN_UNKNOWN = 0
+PATTERN_ARCH = 1
+PATTERN_TENTED_ARCH = 2
+PATTERN_LEFT_LOOP = 3
+PATTERN_RIGHT_LOOP = 4
+PATTERN_WHORL = 5
+
+PATTERN_NAMES = {
+    PATTERN_UNKNOWN: "unknown",
+    PATTERN_ARCH: "arch",
+    PATTERN_TENTED_ARCH: "tented_arch",
+    PATTERN_LEFT_LOOP: "left_loop",
+    PATTERN_RIGHT_LOOP: "right_loop",
+    PATTERN_WHORL: "whorl",
+}
+
+UNKNOWN_COUNT = 255       # stored core/delta count when it could not be estimated
+
+# Cost of a probe of one class matching a template of another. Neighbouring
+# classes (arch/tented arch, loop/whorl, ...) are commonly confused by
+# classifiers and by partial impressions, so they cost less than distant ones.
+CLASS_DISTANCE = np.array([
+    # unk arch tent left right whorl
+    [0, 0, 0, 0, 0, 0],   # unknown
+    [0, 0, 1, 2, 2, 3],   # arch
+    [0, 1, 0, 1, 1, 2],   # tented arch
+    [0, 2, 1, 0, 2, 1],   # left loop
+    [0, 2, 1, 2, 0, 1],   # right loop
+    [0, 3, 2, 1, 1, 0],   # whorl
+], dtype=np.int16)
+
+CLASS_WEIGHT = 2          # coarse distance per step of CLASS_DISTANCE
+SINGULAR_WEIGHT = 1       # per core or delta of difference
+DENSITY_WEIGHT = 1        # per density bucket of difference beyond the first
+
+ORIENTATION_BLOCK = 12    # pixels per orientation block for the Poincare index
+MIN_CLASSIFY_QUALITY = 0.45  # mean foreground coherence below which the class is not trusted
+MIN_FOREGROUND_FRACTION = 0.25
+TENTED_ARCH_MAX_ANGLE = math.radians(20)  # delta this close to straight below the core
+DENSITY_BUCKET_EDGES = (7.5, 8.5, 9.5, 10.5, 11.5)  # ridge period in pixels
+
+CoarseFeatures = namedtuple("CoarseFeatures", "pattern cores deltas density quality")
+
+UNKNOWN_FEATURES = CoarseFeatures(PATTERN_UNKNOWN, UNKNOWN_COUNT, UNKNOWN_COUNT, UNKNOWN_COUNT, 0.0)
+
+
+def _block_orientation(orientation, coherence, foreground, block):
+    """Average the doubled-angle orientation vectors over block x block tiles."""
+    rows = orientation.shape[0] // block
+    cols = orientation.shape[1] // block
+    weight = coherence * foreground
+
+    def tiles(a):
+        return a[:rows * block, :cols * block].reshape(rows, block, cols, block).mean(axis=(1, 3))
+
+    c = tiles(np.cos(2 * orientation) * weight)
+    s = tiles(np.sin(2 * orientation) * weight)
+    valid = tiles(foreground.astype(np.float64)) > 0.99
+    # One pass of 3x3 vector smoothing removes most spurious singularities.
+    c = box_mean(c, 1)
+    s = box_mean(s, 1)
+    return 0.5 * np.arctan2(s, c), valid
+
+
+def _wrap(delta):
+    """Wrap orientation differences into (-pi/2, pi/2]."""
+    return (delta + np.pi / 2) % np.pi - np.pi / 2
+
+
+def singular_points(block_theta, valid):
+    """Find cores and deltas in a block orientation field.
+
+    Returns:
+        tuple: (cores, deltas) as lists of (row, col) block coordinates; a whorl
+            centre (index +1) counts as two cores at the same position.
+    """
+    # Closed path around each block through its 8 neighbours, counter-clockwise.
+    ring = [(-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1)]
+    rows, cols = block_theta.shape
+    if rows < 3 or cols < 3:
+        return [], []
+
+    total = np.zeros((rows - 2, cols - 2))
+    # The block at a singular point itself has no dominant orientation, so
+    # only the path around it has to lie inside the print.
+    usable = np.ones(total.shape, dtype=bool)
+    for (dy0, dx0), (dy1, dx1) in zip(ring[:-1], ring[1:]):
+        a = block_theta[1 + dy0:rows - 1 + dy0, 1 + dx0:cols - 1 + dx0]
+        b = block_theta[1 + dy1:rows - 1 + dy1, 1 + dx1:cols - 1 + dx1]
+        total += _wrap(b - a)
+        usable &= valid[1 + dy0:rows - 1 + dy0, 1 + dx0:cols - 1 + dx0]
+    index = np.rint(total / np.pi).astype(np.int64) * usable
+
+    def clusters(mask, weight):
+        points = []
+        for r, c in zip(*np.nonzero(mask)):
+            for p in points:
+                if abs(p[0] - r) <= 2 and abs(p[1] - c) <= 2:
+                    break
+            else:
+                points.append((r + 1, c + 1, weight[r, c]))
+        return points
+
+    cores = []
+    for r, c, w in clusters(index > 0, index):
+        cores.extend([(r, c)] * (2 if w >= 2 else 1))
+    deltas = [(r, c) for r, c, _ in clusters(index < 0, index)]
+    return cores, deltas
+
+
+def classify(cores, deltas, block_theta=None):
+    """Pattern class from the singular points (block coordinates)."""
+    if len(cores) >= 2 or len(deltas) >= 2:
+        return PATTERN_WHORL
+    if not cores:
+        return PATTERN_ARCH if not deltas else PATTERN_UNKNOWN
+    (core_r, core_c), = cores
+    if deltas:
+        (delta_r, delta_c), = deltas
+        if abs(math.atan2(delta_c - core_c, delta_r - core_r)) <= TENTED_ARCH_MAX_ANGLE:
+            return PATTERN_TENTED_ARCH
+        return PATTERN_LEFT_LOOP if delta_c > core_c else PATTERN_RIGHT_LOOP
+    if block_theta is None:
+        return PATTERN_UNKNOWN
+    # No delta in the impression: the ridges just below the core slope down
+    # towards the side the loop opens to.
+    below = block_theta[core_r + 1:core_r + 4, max(core_c - 2, 0):core_c + 3]
+    if below.size == 0:
+        return PATTERN_UNKNOWN
+    slope = np.mean(np.sin(2 * below))
+    return PATTERN_LEFT_LOOP if slope < 0 else PATTERN_RIGHT_LOOP
+
+
+def density_bucket(period):
+    """Bucket index (0..len(DENSITY_BUCKET_EDGES)) of a ridge period in pixels."""
+    return int(np.searchsorted(DENSITY_BUCKET_EDGES, period))
+
+
+def coarse_features(image):
+    """Compute the coarse index features of a grayscale fingerprint image.
+
+    Args:
+        image (np.ndarray): 2-D uint8 grayscale image, ridges dark.
+
+    Returns:
+        CoarseFeatures: pattern, cores, deltas, density bucket and quality in [0, 1].
+    """
+    img = image.astype(np.float64)
+    img = (img - img.mean()) / (img.std() + 1e-9)
+    local_mean = box_mean(img, BLOCK_RADIUS)
+    local_std = np.sqrt(np.maximum(box_mean(img * img, BLOCK_RADIUS) - local_mean ** 2, 0))
+    foreground = local_std > MIN_FOREGROUND_STD
+    area = foreground.sum()
+    if area < MIN_FOREGROUND_FRACTION * foreground.size:
+        return UNKNOWN_FEATURES
+
+    smoothed = box_mean(img, 1)
+    orientation, coherence = orientation_field(smoothed)
+    quality = float(coherence[foreground].mean())
+
+    # A pixel is on a ridge/valley boundary if it differs from its lower or
+    # right neighbour; for randomly oriented ridges that is on average
+    # 4 * sqrt(2) / (pi * period) boundary pixels per foreground pixel.
+    ridges = (smoothed < local_mean) & foreground
+    edges = (np.diff(ridges, axis=0)[:, :-1] | np.diff(ridges, axis=1)[:-1, :]) & foreground[:-1, :-1]
+    period = 4 * math.sqrt(2) * area / (np.pi * max(int(edges.sum()), 1))
+    density = density_bucket(period)
+
+    if quality < MIN_CLASSIFY_QUALITY:
+        return CoarseFeatures(PATTERN_UNKNOWN, UNKNOWN_COUNT, UNKNOWN_COUNT, density, quality)
+
+    block_theta, valid = _block_orientation(orientation, coherence, foreground, ORIENTATION_BLOCK)
+    cores, deltas = singular_points(block_theta, valid)
+    pattern = classify(cores, deltas, block_theta)
+    return CoarseFeatures(pattern, min(len(cores), 254), min(len(deltas), 254), density, quality)
+
+
+def coarse_distance(probe, coarse):
+    """Coarse distance from a probe's features to every gallery row.
+
+    Args:
+        probe (CoarseFeatures): Features of the probe.
+        coarse (np.ndarray): (N, 4) uint8 rows of pattern, cores, deltas, density.
+
+    Returns:
+        np.ndarray: (N,) int32 distances; 0 means nothing distinguishes the row.
+    """
+    coarse = coarse.astype(np.int32)
+    distance = CLASS_WEIGHT * CLASS_DISTANCE[probe.pattern, coarse[:, 0]].astype(np.int32)
+    for column, value in ((1, probe.cores), (2, probe.deltas)):
+        if value != UNKNOWN_COUNT:
+            known = coarse[:, column] != UNKNOWN_COUNT
+            distance += SINGULAR_WEIGHT * known * np.abs(coarse[:, column] - value)
+    if probe.density != UNKNOWN_COUNT:
+        known = coarse[:, 3] != UNKNOWN_COUNT
+        distance += DENSITY_WEIGHT * known * np.maximum(np.abs(coarse[:, 3] - probe.density) - 1, 0)
+    return distance
+
+
+def select_rows(coarse, fingers, probe=None, finger_index=None, penetration_rate=1.0, allowed=None):
+    """Choose the gallery rows worth scoring in full.
+
+    Args:
+        coarse (np.ndarray): (N, 4) coarse features per gallery row.
+        fingers (np.ndarray): (N,) finger_index per gallery row.
+        probe (CoarseFeatures | None): Probe features; None disables coarse pruning.
+        finger_index (int | None): Restrict to this finger position.
+        penetration_rate (float): Fraction of the (finger-filtered) gallery to keep.
+        allowed (np.ndarray | None): (N,) boolean mask of rows eligible at all,
+            e.g. those of one member type.
+
+    Returns:
+        np.ndarray | None: Sorted row indices to score, or None for all rows.
+    """
+    rows = None
+    if finger_index is not None:
+        allowed = fingers == finger_index if allowed is None else allowed & (fingers == finger_index)
+    if allowed is not None:
+        rows = np.flatnonzero(allowed)
+    if probe is None or penetration_rate >= 1.0:
+        return rows
+
+    candidates = coarse if rows is None else coarse[rows]
+    keep = math.ceil(len(candidates) * max(penetration_rate, 0.0))
+    if keep >= len(candidates):
+        return rows
+    distance = coarse_distance(probe, candidates)
+    chosen = np.sort(np.argsort(distance, kind="stable")[:keep])
+    return chosen if rows is None else rows[chosen]
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Memory-mappable snapshots of the identification gallery.
+
+Loading the gallery from MySQL reads and decodes every stored template over
+the network, which takes a while at startup and loads the database. A
+snapshot holds the same arrays in the gallery's own layout. A new API
+process maps the file copy-on-write: the arrays are used in place with no
+parsing or copying, so the gallery is ready at once. The DB is then only
+asked for rows changed since the snapshot's ``synced_at`` watermark (see
+identification.apply_gallery_updates). The running API rewrites the snapshot
+as captures and polled updates accumulate, so that delta stays short.
+
+File layout (little endian). A 128-byte header holds:
+
+    magic b"FPGS", format version (u16), extractor version (u16),
+    max minutiae (u16), pad (u16), rows (u64), capacity (u64),
+    synced_at in microseconds since 1970 (i64),
+    offsets of the 7 sections below (u64 each)
+
+Sections, each starting on a 64-byte boundary:
+
+    minutiae    float32 (capacity, max minutiae, 4), zero padded
+    counts      int16 (capacity)
+    coarse      uint8 (capacity, 4)
+    fingers     int16 (capacity)
+    members     uint8 (rows), index into MEMBERS
+    id_offsets  uint32 (rows + 1), into id_blob
+    id_blob     UTF-8 person IDs, concatenated
+
+The array sections have room for ``capacity`` rows. Templates enrolled after
+the snapshot are therefore appended in place (into private copy-on-write
+pages) instead of forcing a copy of the whole gallery.
+
+Usage:
+    python gallery_snapshot.py [--output gallery.snapshot] [--full]
+
+Without --full, an existing snapshot at --output is loaded and brought up to
+date from the database rather than re-reading every template.
+"""
+
+import argparse
+import datetime
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+from config import GALLERY_SNAPSHOT_HEADROOM, GALLERY_SNAPSHOT_PATH
+from minutiae import EXTRACTOR_VERSION
+
+SNAPSHOT_MAGIC = b"FPGS"
+SNAPSHOT_FORMAT_VERSION = 1
+MEMBERS = ("prisoner", "suspect")
+
+_HEADER = struct.Struct("<4sHHHHQQq7Q")
+HEADER_SIZE = 128
+ALIGNMENT = 64
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+class SnapshotFormatError(Exception):
+    """Raised when a snapshot file cannot be used."""
+
+
+def resolve_path(path=GALLERY_SNAPSHOT_PATH):
+    """Absolute snapshot path; relative paths are next to the executable (or this module)."""
+    if not path or os.path.isabs(path):
+        return path
+    if getattr(sys, "frozen", False):
+        base = os.path.dirname(sys.executable)
+    else:
+        base = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base, path)
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _layout(rows, capacity, max_minutiae, id_bytes):
+    """Byte offsets of the sections and the total file size."""
+    sizes = [capacity * max_minutiae * 4 * 4, capacity * 2, capacity * 4, capacity * 2,
+             rows, (rows + 1) * 4, id_bytes]
+    offsets = []
+    offset = HEADER_SIZE
+    for size in sizes:
+        offset = _align(offset)
+        offsets.append(offset)
+        offset += size
+    return offsets, offset
+
+
+def write_snapshot(gallery, path, headroom=GALLERY_SNAPSHOT_HEADROOM):
+    """Write the live rows of ``gallery`` to ``path``, replacing it atomically.
+
+    Args:
+        gallery (identification.TemplateGallery): The gallery to save.
+        path (str): Destination file.
+        headroom (float): Spare row capacity as a fraction of the row count
+            (at least 1024 rows), for templates enrolled after a load.
+
+    Returns:
+        int: Number of templates written.
+
+    Raises:
+        ValueError: If the gallery was never synced with the database, so
+            a loader could not tell which rows to catch up on.
+    """
+    synced_at = gallery.synced_at
+    if synced_at is None:
+        raise ValueError("The gallery has not been loaded from the database")
+    snapshot = gallery.snapshot()
+    live = [row for row, key in enumerate(snapshot.keys) if key is not None and key[2] in MEMBERS]
+    skipped = sum(1 for key in snapshot.keys if key is not None and key[2] not in MEMBERS)
+    if skipped:
+        logging.warning(f"[Snapshot] Skipped {skipped} templates with a member other than {', '.join(MEMBERS)}")
+
+    rows = len(live)
+    capacity = rows + max(int(rows * headroom), 1024)
+    max_minutiae = snapshot.minutiae.shape[1]
+    ids = [snapshot.keys[row][0].encode("utf-8") for row in live]
+    id_offsets = np.zeros(rows + 1, dtype="<u4")
+    np.cumsum([len(i) for i in ids], out=id_offsets[1:])
+    members = np.array([MEMBERS.index(snapshot.keys[row][2]) for row in live], dtype=np.uint8)
+    live = np.array(live, dtype=np.int64)
+
+    offsets, total = _layout(rows, capacity, max_minutiae, int(id_offsets[-1]))
+    synced_us = (synced_at - _EPOCH) // _MICROSECOND
+    header = _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, EXTRACTOR_VERSION, max_minutiae, 0,
+                          rows, capacity, synced_us, *offsets)
+    sections = [snapshot.minutiae[live].astype("<f4"), snapshot.counts[live].astype("<i2"),
+                snapshot.coarse[live].astype(np.uint8), snapshot.fingers[live].astype("<i2"),
+                members, id_offsets, b"".join(ids)]
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        for offset, section in zip(offsets, sections):
+            f.seek(offset)
+            f.write(section if isinstance(section, bytes) else section.tobytes())
+        f.truncate(total)
+    os.replace(tmp, path)
+    return rows
+
+
+def load_snapshot(gallery, path):
+    """Map a snapshot file into ``gallery`` without copying its arrays.
+
+    The file is mapped copy-on-write, so later changes to the gallery stay in
+    this process and never reach the file.
+
+    Returns:
+        int: Number of templates loaded.
+
+    Raises:
+        SnapshotFormatError: If the file is not a snapshot of this extractor
+            version and gallery layout.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER_SIZE:
+            raise SnapshotFormatError(f"{path} is too short to be a snapshot")
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    (magic, format_version, extractor_version, max_minutiae, _, rows, capacity, synced_us,
+     *offsets) = _HEADER.unpack_from(mapped)
+    if magic != SNAPSHOT_MAGIC or format_version != SNAPSHOT_FORMAT_VERSION or synced_us < 0:
+        raise SnapshotFormatError(f"Unsupported snapshot format {magic!r} v{format_version}")
+    if extractor_version != EXTRACTOR_VERSION or max_minutiae != gallery.max_minutiae:
+        raise SnapshotFormatError(f"Snapshot is for extractor v{extractor_version} with {max_minutiae} minutiae, "
+                                  f"expected v{EXTRACTOR_VERSION} with {gallery.max_minutiae}")
+    try:
+        id_offsets = np.frombuffer(mapped, dtype="<u4", count=rows + 1, offset=offsets[5])
+    except ValueError:
+        raise SnapshotFormatError(f"{path} is truncated or its layout is inconsistent") from None
+    expected, total = _layout(rows, capacity, max_minutiae, int(id_offsets[-1]))
+    if list(offsets) != expected or size < total:
+        raise SnapshotFormatError(f"{path} is truncated or its layout is inconsistent")
+
+    minutiae = np.frombuffer(mapped, dtype="<f4", count=capacity * max_minutiae * 4,
+                             offset=offsets[0]).reshape(capacity, max_minutiae, 4)
+    counts = np.frombuffer(mapped, dtype="<i2", count=capacity, offset=offsets[1])
+    coarse = np.frombuffer(mapped, dtype=np.uint8, count=capacity * 4, offset=offsets[2]).reshape(capacity, 4)
+    fingers = np.frombuffer(mapped, dtype="<i2", count=capacity, offset=offsets[3])
+    members = np.frombuffer(mapped, dtype=np.uint8, count=rows, offset=offsets[4])
+    raw_ids = mapped[offsets[6]:offsets[6] + int(id_offsets[-1])]
+    bounds = id_offsets.tolist()
+    if raw_ids.isascii():
+        # Byte offsets are character offsets, so one decode serves every row.
+        ids = raw_ids.decode("ascii")
+        person_ids = [ids[bounds[row]:bounds[row + 1]] for row in range(rows)]
+    else:
+        person_ids = [raw_ids[bounds[row]:bounds[row + 1]].decode("utf-8") for row in range(rows)]
+    keys = [(person_id, finger, MEMBERS[member])
+            for person_id, finger, member in zip(person_ids, fingers[:rows].tolist(), members.tolist())]
+
+    synced_at = _EPOCH + synced_us * _MICROSECOND
+    gallery.replace_contents(minutiae, counts, coarse, fingers, keys, synced_at)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=GALLERY_SNAPSHOT_PATH or "gallery.snapshot")
+    parser.add_argument("--full", action="store_true", help="load every template from the DB, ignoring --output")
+    args = parser.parse_args()
+
+    from db_pool import get_pool
+    from identification import TemplateGallery, apply_gallery_updates, load_gallery_from_db
+
+    path = resolve_path(args.output)
+    gallery = TemplateGallery()
+    pool = get_pool()
+    start = time.time()
+    loaded = False
+    if not args.full and os.path.exists(path):
+        try:
+            print(f"Loaded {load_snapshot(gallery, path)} templates from {path}")
+            loaded = True
+        except SnapshotFormatError as e:
+            print(f"Existing snapshot unusable ({e}); loading everything from the database")
+    if loaded:
+        print(f"Applied {apply_gallery_updates(gallery, pool, {})} changed templates from the database")
+    else:
+        load_gallery_from_db(gallery, pool)
+    written = write_snapshot(gallery, path)
+    print(f"✅ Wrote {written} templates to {path} ({os.path.getsize(path) / 2**20:.1f} MB) "
+          f"in {time.time() - start:.1f} sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,606 @@
+"""1:N fingerprint identification against an in-memory template gallery.
+
+The bridge's MatchAndIdentify decodes every stored BMP and rebuilds a
+template per row on every request. Here the templates are extracted once and
+kept resident in fixed-size NumPy arrays, and a probe is scored against the
+whole gallery with vectorised array code.
+
+Scoring is a Hough-style alignment vote: every (probe minutia, gallery
+minutia) pair proposes a rotation and translation; pairs from a genuine match
+agree on the same (quantised) transform. The size of the largest consistent
+group, normalised by both template sizes, is the similarity score (0-100).
+"""
+
+import datetime
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from config import GALLERY_POLL_INTERVAL, GALLERY_SNAPSHOT_EVERY, GALLERY_SNAPSHOT_INTERVAL, GALLERY_SNAPSHOT_PATH
+from gallery_index import UNKNOWN_FEATURES, select_rows
+from minutiae import MAX_MINUTIAE
+
+ANGLE_BINS = 16           # rotation quantisation (22.5 degrees)
+TRANSLATION_BIN = 16      # translation quantisation in pixels
+MIN_CONSISTENT_PAIRS = 3  # smaller groups are treated as chance agreement
+CHUNK_PAIRS = 1 << 20     # pair evaluations per vectorised chunk
+COMPACT_MIN_REMOVED = 1024  # removed rows tolerated before the gallery is compacted
+POLL_OVERLAP = datetime.timedelta(seconds=2)  # re-read window for rows committed out of timestamp order
+
+_TWO_PI = 2 * np.pi
+_TRANSLATION_OFFSET = 1 << 10   # keeps quantised translations non-negative
+_TRANSLATION_SPAN = 1 << 11
+_KEY_SPACE = ANGLE_BINS * _TRANSLATION_SPAN * _TRANSLATION_SPAN
+
+
+def hough_scores(probe, minutiae, counts):
+    """Score a probe against a block of gallery templates.
+
+    Args:
+        probe (np.ndarray): (m, 4) probe minutiae (x, y, angle, type).
+        minutiae (np.ndarray): (N, M, 4) gallery minutiae, zero padded.
+        counts (np.ndarray): (N,) number of valid minutiae per template.
+
+    Returns:
+        np.ndarray: (N,) float32 similarity scores in [0, 100].
+    """
+    n_templates = len(counts)
+    scores = np.zeros(n_templates, dtype=np.float32)
+    m = len(probe)
+    if m == 0 or n_templates == 0:
+        return scores
+
+    px, py, pa = probe[:, 0], probe[:, 1], probe[:, 2]
+    width = minutiae.shape[1]
+    chunk = max(1, CHUNK_PAIRS // (m * width))
+
+    for start in range(0, n_templates, chunk):
+        block = minutiae[start:start + chunk]
+        block_counts = counts[start:start + chunk].astype(np.int64)
+        rows = len(block)
+
+        gx = block[:, None, :, 0]
+        gy = block[:, None, :, 1]
+        rotation = np.mod(block[:, None, :, 2] - pa[None, :, None], _TWO_PI)
+
+        cos_r = np.cos(rotation)
+        sin_r = np.sin(rotation)
+        tx = gx - (cos_r * px[None, :, None] - sin_r * py[None, :, None])
+        ty = gy - (sin_r * px[None, :, None] + cos_r * py[None, :, None])
+
+        angle_bin = (rotation * (ANGLE_BINS / _TWO_PI)).astype(np.int64) % ANGLE_BINS
+        tx_bin = np.floor(tx / TRANSLATION_BIN).astype(np.int64) + _TRANSLATION_OFFSET
+        ty_bin = np.floor(ty / TRANSLATION_BIN).astype(np.int64) + _TRANSLATION_OFFSET
+
+        keys = (angle_bin * _TRANSLATION_SPAN + tx_bin) * _TRANSLATION_SPAN + ty_bin
+        keys += (np.arange(rows, dtype=np.int64) * _KEY_SPACE)[:, None, None]
+
+        valid = np.arange(width)[None, None, :] < block_counts[:, None, None]
+        valid = np.broadcast_to(valid, keys.shape)
+        flat = np.sort(keys[valid])
+        if flat.size == 0:
+            continue
+
+        # Run-length encode the sorted keys; the longest run per template is
+        # its largest group of mutually consistent minutia pairs.
+        boundaries = np.flatnonzero(np.diff(flat)) + 1
+        starts = np.concatenate(([0], boundaries))
+        lengths = np.diff(np.concatenate((starts, [flat.size])))
+        run_rows = flat[starts] // _KEY_SPACE
+
+        best = np.zeros(rows, dtype=np.int64)
+        np.maximum.at(best, run_rows, lengths)
+        best[best < MIN_CONSISTENT_PAIRS] = 0
+
+        denom = np.maximum(block_counts * m, 1)
+        scores[start:start + rows] = np.minimum(100.0, 100.0 * best * best / denom)
+
+    return scores
+
+
+def top_k(scores, k):
+    """Indices of the ``k`` highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def member_mask(keys, member):
+    """Boolean mask of the rows in ``keys`` enrolled as ``member``; None if ``member`` is None."""
+    if member is None:
+        return None
+    return np.fromiter((key is not None and key[2] == member for key in keys), dtype=bool, count=len(keys))
+
+
+GallerySnapshot = namedtuple("GallerySnapshot", "minutiae counts keys coarse fingers")
+
+
+def build_candidates(keys, rows, scores, threshold=0.0):
+    """Turn ranked gallery rows into candidate dicts, stopping at ``threshold``."""
+    candidates = []
+    for row, score in zip(rows, scores):
+        score = float(score)
+        if score < threshold or score <= 0:
+            break
+        person_id, finger_index, member = keys[row]
+        candidates.append({
+            "person_id": person_id,
+            "finger_index": finger_index,
+            "member": member,
+            "score": round(score, 2),
+        })
+    return candidates
+
+
+class TemplateGallery:
+    """Resident, array-backed set of enrolled minutiae templates.
+
+    Templates are stored in a single zero-padded float32 array of shape
+    (capacity, MAX_MINUTIAE, 4) with a parallel array of minutia counts, so a
+    probe can be scored against every template without per-row Python work.
+    Parallel arrays of coarse features and finger positions let identify()
+    prune the gallery first (see gallery_index).
+
+    Updates are safe against concurrent searches working on a snapshot:
+    replacing a key's template rewrites its own row, new keys are appended
+    past the snapshot, and removed rows become empty tombstones (score 0)
+    until enough accumulate to compact into fresh arrays.
+
+    Every row records the version that last changed it, so copies of the
+    arrays (ParallelSearcher's shared memory block) can be patched with
+    changes() instead of copied again; ``layout_version`` is the version at
+    which rows were last renumbered, after which only a full copy will do.
+    """
+
+    def __init__(self, max_minutiae=MAX_MINUTIAE, capacity=1024):
+        self.max_minutiae = max_minutiae
+        self.minutiae = np.zeros((capacity, max_minutiae, 4), dtype=np.float32)
+        self.counts = np.zeros(capacity, dtype=np.int16)
+        self.coarse = np.zeros((capacity, 4), dtype=np.uint8)  # pattern, cores, deltas, density
+        self.fingers = np.zeros(capacity, dtype=np.int16)
+        self.keys = []  # (person_id, finger_index, member) per row, None for removed rows
+        self.size = 0   # rows in use, tombstones included
+        self._rows = {}  # key -> row
+        self._removed = 0
+        self.version = 0  # bumped on every change, so copies of the arrays can tell they are stale
+        self.row_versions = np.zeros(capacity, dtype=np.int64)  # version that last changed each row
+        self.layout_version = 0  # version at which rows were last renumbered
+        self.synced_at = None  # database time the contents are known to be current as of
+        self.ready = threading.Event()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self.size - self._removed
+
+    def __contains__(self, key):
+        return tuple(key) in self._rows
+
+    def _reserve(self, needed):
+        capacity = len(self.counts)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        minutiae = np.zeros((new_capacity, self.max_minutiae, 4), dtype=np.float32)
+        counts = np.zeros(new_capacity, dtype=np.int16)
+        coarse = np.zeros((new_capacity, 4), dtype=np.uint8)
+        fingers = np.zeros(new_capacity, dtype=np.int16)
+        row_versions = np.zeros(new_capacity, dtype=np.int64)
+        minutiae[:self.size] = self.minutiae[:self.size]
+        counts[:self.size] = self.counts[:self.size]
+        coarse[:self.size] = self.coarse[:self.size]
+        fingers[:self.size] = self.fingers[:self.size]
+        row_versions[:self.size] = self.row_versions[:self.size]
+        self.minutiae, self.counts, self.coarse, self.fingers = minutiae, counts, coarse, fingers
+        self.row_versions = row_versions
+
+    def add(self, key, template, coarse=None):
+        """Add a template, replacing the one already stored under ``key``.
+
+        Args:
+            key (tuple): (person_id, finger_index, member).
+            template (np.ndarray): (K, 4) minutiae; only the first max_minutiae are kept.
+            coarse (tuple | None): (pattern, cores, deltas, density); unknown if None.
+        """
+        key = tuple(key)
+        template = np.asarray(template, dtype=np.float32)[:self.max_minutiae]
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                self._reserve(self.size + 1)
+                row = self.size
+                self.keys.append(key)
+                self._rows[key] = row
+                self.size += 1
+            self.minutiae[row] = 0
+            self.minutiae[row, :len(template)] = template
+            self.counts[row] = len(template)
+            self.coarse[row] = UNKNOWN_FEATURES[:4] if coarse is None else coarse[:4]
+            self.fingers[row] = key[1]
+            self.version += 1
+            self.row_versions[row] = self.version
+
+    def remove(self, key):
+        """Remove the template stored under ``key``; returns False if there was none."""
+        with self._lock:
+            row = self._rows.pop(tuple(key), None)
+            if row is None:
+                return False
+            self.counts[row] = 0
+            self.coarse[row] = UNKNOWN_FEATURES[:4]
+            self.fingers[row] = -1
+            self.keys[row] = None
+            self._removed += 1
+            self.version += 1
+            self.row_versions[row] = self.version
+            if self._removed > max(COMPACT_MIN_REMOVED, self.size // 4):
+                self._compact()
+            return True
+
+    def _compact(self):
+        """Copy the live rows into fresh arrays, dropping tombstones."""
+        live = np.flatnonzero(self.fingers[:self.size] >= 0)
+        capacity = max(len(live) * 2, 1024)
+        minutiae = np.zeros((capacity, self.max_minutiae, 4), dtype=np.float32)
+        counts = np.zeros(capacity, dtype=np.int16)
+        coarse = np.zeros((capacity, 4), dtype=np.uint8)
+        fingers = np.zeros(capacity, dtype=np.int16)
+        minutiae[:len(live)] = self.minutiae[live]
+        counts[:len(live)] = self.counts[live]
+        coarse[:len(live)] = self.coarse[live]
+        fingers[:len(live)] = self.fingers[live]
+        self.minutiae, self.counts, self.coarse, self.fingers = minutiae, counts, coarse, fingers
+        self.row_versions = np.zeros(capacity, dtype=np.int64)
+        self.keys = [self.keys[row] for row in live]
+        self._rows = {key: row for row, key in enumerate(self.keys)}
+        self.size = len(live)
+        self._removed = 0
+        self.version += 1
+        self.layout_version = self.version
+
+    def replace_contents(self, minutiae, counts, coarse, fingers, keys, synced_at=None):
+        """Adopt prepared arrays (e.g. a mapped snapshot file) as the gallery, without copying them.
+
+        Args:
+            minutiae, counts, coarse, fingers (np.ndarray): Writable arrays in
+                this gallery's layout, with at least ``len(keys)`` rows.
+            keys (list): (person_id, finger_index, member) of the first rows.
+            synced_at (datetime | None): Database time the contents are current as of.
+        """
+        with self._lock:
+            self.minutiae, self.counts, self.coarse, self.fingers = minutiae, counts, coarse, fingers
+            self.row_versions = np.zeros(len(counts), dtype=np.int64)
+            self.keys = list(keys)
+            self._rows = {key: row for row, key in enumerate(self.keys)}
+            self.size = len(self.keys)
+            self._removed = 0
+            self.synced_at = synced_at
+            self.version += 1
+            self.layout_version = self.version
+
+    def detach(self):
+        """Copy the arrays into process memory, releasing a mapped snapshot file.
+
+        Rows keep their numbers, so copies of the arrays stay valid.
+        """
+        with self._lock:
+            self.minutiae, self.counts, self.coarse, self.fingers = (
+                np.array(array) for array in (self.minutiae, self.counts, self.coarse, self.fingers))
+
+    def snapshot(self):
+        """Return a GallerySnapshot of views of the current contents."""
+        with self._lock:
+            size = self.size
+            return GallerySnapshot(self.minutiae[:size], self.counts[:size], list(self.keys),
+                                   self.coarse[:size], self.fingers[:size])
+
+    def changes(self, since):
+        """The rows added, replaced or removed after version ``since``.
+
+        Args:
+            since (int | None): Version a copy of the arrays was taken at; None for no copy.
+
+        Returns:
+            tuple: (version, snapshot, rows), read together. ``rows`` holds the changed
+                row indices, or is None if rows were renumbered after ``since`` and the
+                copy must be rebuilt from the whole snapshot.
+        """
+        with self._lock:
+            snapshot = self.snapshot()
+            if since is None or since < self.layout_version:
+                return self.version, snapshot, None
+            return self.version, snapshot, np.flatnonzero(self.row_versions[:self.size] > since)
+
+    def identify(self, probe, k=10, threshold=0.0, coarse=None, finger_index=None, penetration_rate=1.0,
+                 member=None):
+        """Score ``probe`` against the gallery.
+
+        Args:
+            probe (np.ndarray): (m, 4) probe minutiae.
+            k (int): Number of candidates to return.
+            threshold (float): Candidates scoring below this are omitted.
+            coarse (gallery_index.CoarseFeatures | None): Probe coarse features.
+            finger_index (int | None): Only consider templates of this finger.
+            penetration_rate (float): Fraction of the gallery to score in full,
+                chosen by coarse distance to ``coarse``.
+            member (str | None): Only consider templates enrolled as this member type.
+
+        Returns:
+            list: Up to ``k`` dicts with person_id, finger_index, member and score, best first.
+        """
+        snapshot = self.snapshot()
+        probe = np.asarray(probe, dtype=np.float32)[:self.max_minutiae]
+        rows = select_rows(snapshot.coarse, snapshot.fingers, coarse, finger_index, penetration_rate,
+                           member_mask(snapshot.keys, member))
+        if rows is None:
+            scores = hough_scores(probe, snapshot.minutiae, snapshot.counts)
+        else:
+            scores = hough_scores(probe, snapshot.minutiae[rows], snapshot.counts[rows])
+        best = top_k(scores, k)
+        ranked = best if rows is None else rows[best]
+        return build_candidates(snapshot.keys, ranked, scores[best], threshold)
+
+
+def load_gallery_from_db(gallery, pool, batch_size=500):
+    """Populate ``gallery`` from the stored minutiae templates.
+
+    Rows without a template for the current extractor version are extracted
+    from their image once and the template is written back, so later loads
+    never need the images.
+
+    Args:
+        gallery (TemplateGallery): The gallery to fill.
+        pool (db_pool.ConnectionPool): Connection pool for the template table.
+        batch_size (int): Rows fetched per round trip.
+    """
+    # Imported here so the scoring code above stays free of DB dependencies.
+    from image_codec import stored_image_to_bmp
+    from schema import ensure_columns
+    from template_store import (database_now, deserialize_template, extract_template, fetch_missing_batch,
+                                fetch_templates_batch, save_templates)
+
+    start = time.time()
+    loaded = extracted = failed = 0
+
+    with pool.connection() as conn:
+        ensure_columns(conn, "image_data", "image_format", "minutiae_template", "extractor_version", "updated_at")
+        # Rows written while the load runs are picked up by the first poll.
+        gallery.synced_at = database_now(conn)
+
+    after = ("", -1, "")
+    while True:
+        with pool.connection() as conn:
+            rows = fetch_templates_batch(conn, after, batch_size)
+        if not rows:
+            break
+        for person_id, finger_index, member, blob in rows:
+            try:
+                minutiae, _, _, coarse = deserialize_template(blob)
+                gallery.add((person_id, finger_index, member), minutiae, coarse)
+                loaded += 1
+            except Exception as e:
+                failed += 1
+                logging.warning(f"[Gallery] Bad template for {person_id}/{finger_index}/{member}: {e}")
+        after = rows[-1][:3]
+
+    after = ("", -1, "")
+    while True:
+        with pool.connection() as conn:
+            rows = fetch_missing_batch(conn, after, batch_size)
+        if not rows:
+            break
+        templates = []
+        for person_id, finger_index, member, image_data, image_format, image_bmp in rows:
+            try:
+                blob = extract_template(stored_image_to_bmp(image_data, image_format, image_bmp))
+                minutiae, _, _, coarse = deserialize_template(blob)
+                gallery.add((person_id, finger_index, member), minutiae, coarse)
+                templates.append((person_id, finger_index, member, blob))
+                extracted += 1
+            except Exception as e:
+                failed += 1
+                logging.warning(f"[Gallery] Could not extract template for {person_id}/{finger_index}/{member}: {e}")
+        with pool.connection() as conn:
+            save_templates(conn, templates)
+        after = rows[-1][:3]
+
+    gallery.ready.set()
+    logging.info(f"[Gallery] Loaded {loaded} stored and {extracted} newly extracted templates "
+                 f"({failed} failed) in {time.time() - start:.1f} sec")
+    return loaded + extracted
+
+
+def apply_gallery_updates(gallery, pool, recent, batch_size=500):
+    """Patch rows changed since ``gallery.synced_at`` into the gallery.
+
+    Catches enrollments made by other stations (or by the bridge directly)
+    without reloading the table. Rows without a current template are
+    extracted from their image and the template is written back.
+
+    Args:
+        gallery (TemplateGallery): A loaded gallery.
+        pool (db_pool.ConnectionPool): Connection pool for the template table.
+        recent (dict): key -> updated_at of rows already applied inside the
+            overlap window; kept by the caller between polls.
+        batch_size (int): Rows fetched per round trip.
+
+    Returns:
+        int: Number of templates added or replaced.
+    """
+    from image_codec import stored_image_to_bmp
+    from template_store import deserialize_template, extract_template, fetch_updated_batch, save_templates
+
+    newest = gallery.synced_at
+    after = (gallery.synced_at - POLL_OVERLAP, "", -1, "")
+    applied = 0
+    while True:
+        with pool.connection() as conn:
+            rows = fetch_updated_batch(conn, after, batch_size)
+        if not rows:
+            break
+        templates = []
+        for person_id, finger_index, member, blob, image_data, image_format, image_bmp, updated_at in rows:
+            key = (person_id, finger_index, member)
+            if recent.get(key) == updated_at:
+                continue
+            recent[key] = updated_at
+            newest = max(newest, updated_at)
+            try:
+                if blob is None:
+                    if image_data is None and image_bmp is None:
+                        continue
+                    blob = extract_template(stored_image_to_bmp(image_data, image_format, image_bmp))
+                    templates.append((person_id, finger_index, member, blob))
+                minutiae, _, _, coarse = deserialize_template(blob)
+                gallery.add(key, minutiae, coarse)
+                applied += 1
+            except Exception as e:
+                logging.warning(f"[Gallery] Could not update template for {person_id}/{finger_index}/{member}: {e}")
+        if templates:
+            with pool.connection() as conn:
+                save_templates(conn, templates)
+        last = rows[-1]
+        after = (last[7], *last[:3])
+
+    gallery.synced_at = newest
+    cutoff = newest - POLL_OVERLAP
+    for key in [key for key, updated_at in recent.items() if updated_at < cutoff]:
+        del recent[key]
+    if applied:
+        logging.info(f"[Gallery] Applied {applied} updated templates")
+    return applied
+
+
+def _load_snapshot(gallery, path):
+    """Map the gallery snapshot at ``path`` if there is a usable one; returns True if loaded."""
+    from gallery_snapshot import SnapshotFormatError, load_snapshot
+
+    if not path or not os.path.exists(path):
+        return False
+    start = time.time()
+    try:
+        loaded = load_snapshot(gallery, path)
+    except (OSError, SnapshotFormatError) as e:
+        logging.warning(f"[Gallery] Ignoring snapshot {path}: {e}")
+        return False
+    gallery.ready.set()
+    logging.info(f"[Gallery] Mapped {loaded} templates from {path} in {time.time() - start:.2f} sec, "
+                 f"catching up from {gallery.synced_at}")
+    return True
+
+
+def _write_snapshot(gallery, path):
+    """Write the gallery to its snapshot file; returns True if it was written."""
+    from gallery_snapshot import write_snapshot
+
+    try:
+        written = write_snapshot(gallery, path)
+        logging.info(f"[Gallery] Wrote {written} templates to snapshot {path} (synced to {gallery.synced_at})")
+        return True
+    except Exception as e:
+        logging.warning(f"[Gallery] Could not write snapshot {path}: {e}")
+        return False
+
+
+class _SnapshotRefresher:
+    """Rewrites the snapshot as the gallery changes, so a restart only catches up on a short delta.
+
+    Captures and polled updates change the gallery in memory only. Once
+    ``every`` changes have accumulated, or any change is older than
+    ``interval`` seconds, the snapshot is rewritten with the gallery's
+    current ``synced_at`` as its catch-up watermark.
+    """
+
+    def __init__(self, gallery, path, mapped, every=GALLERY_SNAPSHOT_EVERY, interval=GALLERY_SNAPSHOT_INTERVAL):
+        self.gallery = gallery
+        self.path = path
+        self.mapped = mapped  # gallery arrays still map the file (which Windows will not let us replace)
+        self.every = every
+        self.interval = interval
+        self.written_version = gallery.version
+        self.written_at = time.monotonic()
+
+    def due(self):
+        pending = self.gallery.version - self.written_version
+        if pending <= 0:
+            return False
+        if self.every > 0 and pending >= self.every:
+            return True
+        return self.interval > 0 and time.monotonic() - self.written_at >= self.interval
+
+    def written(self, version):
+        self.written_version = version
+        self.written_at = time.monotonic()
+
+    def refresh(self):
+        """Rewrite the snapshot if it is due; a failed write is retried at the next call."""
+        if not self.path or not self.due():
+            return
+        if self.mapped:
+            self.gallery.detach()
+            self.mapped = False
+        version = self.gallery.version
+        if _write_snapshot(self.gallery, self.path):
+            self.written(version)
+
+
+def _load_in_background(gallery, pool, retry_delay=30, poll_interval=GALLERY_POLL_INTERVAL,
+                        snapshot_path=None):
+    recent = {}
+    mapped = _load_snapshot(gallery, snapshot_path)
+    refresher = _SnapshotRefresher(gallery, snapshot_path, mapped)
+    if mapped:
+        # Serve from the snapshot at once; rows changed since it was taken arrive as a delta.
+        while True:
+            try:
+                apply_gallery_updates(gallery, pool, recent)
+                refresher.refresh()
+                break
+            except Exception as e:
+                logging.error(f"[Gallery] Catch-up from snapshot failed, retrying in {retry_delay} sec: {e}")
+                time.sleep(retry_delay)
+    else:
+        while True:
+            try:
+                load_gallery_from_db(gallery, pool)
+                break
+            except Exception as e:
+                logging.error(f"[Gallery] Load failed, retrying in {retry_delay} sec: {e}")
+                time.sleep(retry_delay)
+        version = gallery.version
+        if snapshot_path and _write_snapshot(gallery, snapshot_path):
+            refresher.written(version)
+
+    while poll_interval > 0:
+        time.sleep(poll_interval)
+        try:
+            apply_gallery_updates(gallery, pool, recent)
+        except Exception as e:
+            logging.error(f"[Gallery] Update poll failed: {e}")
+            continue
+        refresher.refresh()
+
+
+_gallery = None
+_gallery_lock = threading.Lock()
+
+
+def get_gallery(start_loading=True):
+    """Return the process-wide gallery, starting its background load (and
+    update polling) on first use."""
+    global _gallery
+    with _gallery_lock:
+        if _gallery is None:
+            _gallery = TemplateGallery()
+            if start_loading:
+                from db_pool import get_pool
+                from gallery_snapshot import resolve_path
+                threading.Thread(target=_load_in_background, args=(_gallery, get_pool()),
+                                 kwargs={"snapshot_path": resolve_path(GALLERY_SNAPSHOT_PATH)},
+                                 name="gallery-loader", daemon=True).start()
+        return _gallery
@@ -0,0 +1,98 @@
+"""Size-bounded LRU cache for stored fingerprint images.
+
+Review screens fetch the same fingers repeatedly; each fetch used to be a
+remote query. Entries are keyed by ``(person_id, finger_index, member)`` and
+hold the BMP bytes with their SHA-1 digest (the HTTP ETag). The cache is
+bounded by total payload bytes rather than entry count, since images vary in
+size. Entries also expire after ``ttl`` seconds so rows rewritten by another
+station are eventually picked up.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from config import IMAGE_CACHE_MAX_BYTES, IMAGE_CACHE_TTL
+
+
+class ByteLRUCache:
+    """Thread-safe LRU cache bounded by the total size of its values.
+
+    Args:
+        max_bytes (int): Maximum total size of cached values.
+        ttl (float | None): Seconds before an entry expires; None disables expiry.
+    """
+
+    def __init__(self, max_bytes, ttl=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (data, digest, size, stored_at)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Return ``(data, digest)`` for ``key``, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[3] > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key, data, digest):
+        """Cache ``data`` under ``key``. Values larger than the whole cache are not stored."""
+        size = len(data)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (data, digest, size, time.monotonic())
+            self._size += size
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Drop ``key`` from the cache, e.g. after the image was re-captured."""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._size -= entry[2]
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current occupancy."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+image_cache = ByteLRUCache(IMAGE_CACHE_MAX_BYTES, IMAGE_CACHE_TTL)
@@ -0,0 +1,126 @@
+"""Storage formats for fingerprint images.
+
+The bridge stores captures as uncompressed 8-bit BMPs in ``image_bmp``. This
+module re-encodes them into a compact format for the ``image_data`` column
+(``image_format`` records which codec was used) and decodes them back to BMP
+on read, so API clients keep receiving bitmaps.
+
+Formats:
+    png: Lossless, always available through Pillow. The default.
+    wsq: FBI Wavelet Scalar Quantization (lossy, ~15:1). Available only when
+         the optional ``wsq`` package is installed, which registers a WSQ
+         plugin with Pillow.
+    bmp: The original uncompressed bitmap.
+"""
+
+import io
+
+from PIL import Image
+
+try:
+    import wsq  # noqa: F401  (registers the WSQ Pillow plugin)
+    WSQ_AVAILABLE = True
+except ImportError:
+    WSQ_AVAILABLE = False
+
+FORMAT_BMP = "bmp"
+FORMAT_PNG = "png"
+FORMAT_WSQ = "wsq"
+
+PNG_COMPRESS_LEVEL = 6
+WSQ_BITRATE = 0.75
+
+
+class UnsupportedImageFormat(Exception):
+    """Raised when an image format is unknown or its codec is not installed."""
+
+
+def available_formats():
+    """Return the storage formats that can be written in this environment."""
+    formats = [FORMAT_PNG, FORMAT_BMP]
+    if WSQ_AVAILABLE:
+        formats.append(FORMAT_WSQ)
+    return formats
+
+
+def _open_grayscale(data):
+    image = Image.open(io.BytesIO(data))
+    if image.mode != "L":
+        image = image.convert("L")
+    return image
+
+
+def encode_image(bmp_bytes, fmt=FORMAT_PNG):
+    """Encode a BMP into a storage format.
+
+    Args:
+        bmp_bytes (bytes): The bitmap as written by the bridge.
+        fmt (str): One of "png", "wsq" or "bmp".
+
+    Returns:
+        bytes: The encoded image.
+    """
+    if fmt == FORMAT_BMP:
+        return bmp_bytes
+    if fmt not in available_formats():
+        raise UnsupportedImageFormat(f"Cannot encode images as '{fmt}'")
+
+    image = _open_grayscale(bmp_bytes)
+    out = io.BytesIO()
+    if fmt == FORMAT_PNG:
+        image.save(out, "PNG", compress_level=PNG_COMPRESS_LEVEL)
+    else:
+        image.save(out, "WSQ", bitrate=WSQ_BITRATE)
+    return out.getvalue()
+
+
+def decode_to_bmp(data, fmt):
+    """Decode a stored image back into an 8-bit grayscale BMP.
+
+    Args:
+        data (bytes): The stored image bytes.
+        fmt (str): The value of the ``image_format`` column.
+
+    Returns:
+        bytes: The bitmap.
+    """
+    if fmt in (None, "", FORMAT_BMP):
+        return data
+    if fmt == FORMAT_WSQ and not WSQ_AVAILABLE:
+        raise UnsupportedImageFormat("WSQ images require the optional 'wsq' package")
+    if fmt not in (FORMAT_PNG, FORMAT_WSQ):
+        raise UnsupportedImageFormat(f"Unknown image format '{fmt}'")
+
+    out = io.BytesIO()
+    _open_grayscale(data).save(out, "BMP")
+    return out.getvalue()
+
+
+def normalize_to_bmp(data):
+    """Decode any image Pillow can read (WSQ too, if installed) into an 8-bit grayscale BMP.
+
+    16-bit grayscale scans are scaled down to 8 bits rather than clipped.
+
+    Returns:
+        tuple: (bmp bytes, (width, height))
+    """
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    if image.mode in ("I;16", "I;16B", "I;16L", "I"):
+        image = image.point(lambda v: v / 256).convert("L")
+    elif image.mode != "L":
+        image = image.convert("L")
+    out = io.BytesIO()
+    image.save(out, "BMP")
+    return out.getvalue(), image.size
+
+
+def stored_image_to_bmp(image_data, image_format, image_bmp):
+    """Return the BMP for a row, preferring the compressed column when present.
+
+    The bridge clears ``image_data`` when it re-captures a finger, so a
+    compressed copy is never older than ``image_bmp``.
+    """
+    if image_data:
+        return decode_to_bmp(image_data, image_format)
+    return image_bmp
@@ -0,0 +1,84 @@
+"""Fingerprint image helpers for binary responses.
+
+Images are identified by the SHA-1 of their bytes, which doubles as the HTTP
+ETag. Live images returned by /capture, /verify and /match are kept in a small
+bounded store so clients that ask for URL responses can download the raw
+bitmap afterwards from /live-images/<sha1>.
+"""
+
+import base64
+import binascii
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from config import LIVE_IMAGE_STORE_SIZE
+from metrics import observe_stage
+
+IMAGE_MODES = ("base64", "url")
+
+
+def image_digest(data):
+    """Return the hex SHA-1 of the image bytes."""
+    return hashlib.sha1(data).hexdigest()
+
+
+class LiveImageStore:
+    """Keeps the most recent ``max_entries`` live images, keyed by digest."""
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, data):
+        """Store image bytes and return their digest."""
+        digest = image_digest(data)
+        with self._lock:
+            self._images[digest] = data
+            self._images.move_to_end(digest)
+            while len(self._images) > self.max_entries:
+                self._images.popitem(last=False)
+        return digest
+
+    def get(self, digest):
+        with self._lock:
+            return self._images.get(digest)
+
+
+live_images = LiveImageStore(LIVE_IMAGE_STORE_SIZE)
+
+
+def apply_image_mode(result, mode, stored_url=None):
+    """Rewrite a bridge result according to the requested image mode.
+
+    Every result carrying an image gains ``image_sha1`` and ``image_url``. In
+    "url" mode the ``bmp_base64`` field is dropped, so the JSON body carries
+    only the link and hash.
+
+    Args:
+        result (dict): The dictionary returned by send_bridge_command.
+        mode (str): "base64" or "url".
+        stored_url (str): URL of the stored copy, when the image was saved to the DB.
+
+    Returns:
+        dict: The same dictionary, updated in place.
+    """
+    encoded = result.get("bmp_base64")
+    if not encoded:
+        return result
+
+    start = time.perf_counter()
+    try:
+        data = base64.b64decode(encoded, validate=True)
+    except (binascii.Error, ValueError):
+        return result
+
+    digest = live_images.put(data)
+    observe_stage("image_decode", time.perf_counter() - start)
+    result["image_sha1"] = digest
+    result["image_url"] = stored_url or f"/live-images/{digest}"
+    if mode == "url":
+        del result["bmp_base64"]
+    return result
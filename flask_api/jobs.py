@@ -0,0 +1,179 @@
+"""Background jobs for long-running scanner operations.
+
+A capture, verify or match waits up to 30-60 seconds for a finger on the
+scanner. Run synchronously, each one pins an HTTP worker thread for that
+long. Submitted as a job instead, the operation runs on a small managed
+executor and the request returns a job ID at once; clients then poll
+``/jobs/<id>`` (optionally long-polling with ``wait``) or follow its
+progress as Server-Sent Events.
+
+Each job keeps an ordered list of progress events ("queued", "started",
+"place_finger", "processing", ...). Finished jobs are kept for ``ttl``
+seconds so late pollers can still collect the result.
+"""
+
+import itertools
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+from config import JOB_TTL, JOB_WORKERS, MAX_JOBS
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class Job:
+    """One submitted operation, its progress events and its result."""
+
+    def __init__(self, operation):
+        self.id = uuid.uuid4().hex
+        self.operation = operation
+        self.state = JOB_QUEUED
+        self.result = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.events = []
+        self._seq = itertools.count(1)
+        self._cond = threading.Condition()
+        self.progress("queued", "Waiting for a free worker")
+
+    @property
+    def done(self):
+        return self.state in (JOB_DONE, JOB_FAILED)
+
+    def progress(self, stage, message=""):
+        """Record a progress event and wake any waiting pollers."""
+        with self._cond:
+            self.events.append({"seq": next(self._seq), "stage": stage, "message": message, "time": time.time()})
+            self._cond.notify_all()
+
+    def _finish(self, state, result):
+        with self._cond:
+            self.state = state
+            self.result = result
+            self.finished = time.time()
+            self.events.append({"seq": next(self._seq), "stage": state, "message": result.get("message", ""),
+                                "time": self.finished})
+            self._cond.notify_all()
+
+    def wait(self, after=0, timeout=None):
+        """Block until the job has events newer than ``after`` or has finished.
+
+        Args:
+            after (int): Sequence number of the last event the caller has seen.
+            timeout (float | None): Maximum seconds to wait.
+
+        Returns:
+            list: The events newer than ``after`` (possibly empty on timeout).
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.done or self.events[-1]["seq"] > after, timeout)
+            return [event for event in self.events if event["seq"] > after]
+
+    def to_dict(self, after=None):
+        """JSON view of the job; events newer than ``after`` are included if it is given."""
+        with self._cond:
+            data = {
+                "job_id": self.id,
+                "operation": self.operation,
+                "status": self.state,
+                "stage": self.events[-1]["stage"],
+                "message": self.events[-1]["message"],
+                "created": self.created,
+                "started": self.started,
+                "finished": self.finished,
+            }
+            if after is not None:
+                data["events"] = [event for event in self.events if event["seq"] > after]
+            if self.done:
+                data["result"] = self.result
+            return data
+
+
+class JobManager:
+    """Runs jobs on a bounded thread pool and keeps them addressable by ID.
+
+    Args:
+        max_workers (int): Jobs running at the same time; the rest queue.
+        ttl (float): Seconds a finished job is kept for pollers.
+        max_jobs (int): Jobs kept in total; the oldest finished ones go first.
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS, ttl=JOB_TTL, max_jobs=MAX_JOBS):
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.failed = 0
+
+    def submit(self, operation, fn, *args, **kwargs):
+        """Queue ``fn(*args, on_progress=..., **kwargs)`` as a new job.
+
+        ``fn`` must return a result dict; an exception fails the job with an
+        error result instead.
+
+        Returns:
+            Job: The queued job.
+        """
+        job = Job(operation)
+        with self._lock:
+            self._purge()
+            self._jobs[job.id] = job
+            self.submitted += 1
+        self._executor.submit(self._run, job, fn, args, kwargs, tracing.current_context())
+        return job
+
+    def _run(self, job, fn, args, kwargs, trace_parent=None):
+        job.started = time.time()
+        job.state = JOB_RUNNING
+        job.progress("started", "Waiting for the scanner")
+        try:
+            # The request that queued the job has already answered; continue its trace.
+            with tracing.start_trace(f"job {job.operation}", parent=trace_parent, job_id=job.id):
+                result = fn(*args, on_progress=job.progress, **kwargs)
+                tracing.record_result(result)
+            job._finish(JOB_DONE, result)
+        except Exception as e:
+            logging.exception(f"[Jobs] {job.operation} job {job.id} failed")
+            with self._lock:
+                self.failed += 1
+            job._finish(JOB_FAILED, {"status": "error", "message": f"An unexpected error occurred: {e}"})
+
+    def get(self, job_id):
+        """Return the job with ``job_id``, or None if it is unknown or expired."""
+        with self._lock:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    def _purge(self):
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.done and now - job.finished > self.ttl:
+                del self._jobs[job_id]
+        if len(self._jobs) > self.max_jobs:
+            for job_id in [job_id for job_id, job in self._jobs.items() if job.done][:len(self._jobs) - self.max_jobs]:
+                del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            states = [job.state for job in self._jobs.values()]
+        return {
+            "queued": states.count(JOB_QUEUED),
+            "running": states.count(JOB_RUNNING),
+            "finished": states.count(JOB_DONE) + states.count(JOB_FAILED),
+            "submitted": self.submitted,
+            "failed": self.failed,
+        }
+
+
+job_manager = JobManager()
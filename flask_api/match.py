@@ -1,15 +1,184 @@
 """Fingerprint Matching Module"""
 
+import asyncio
+import base64
+
+from async_bridge import send_bridge_command_async
 from bridge_client import send_bridge_command
+from capture import scan_fingerprint_bmp, scan_fingerprint_bmp_async
+from config import GALLERY_MATCH_THRESHOLD, GALLERY_PENETRATION_RATE, MATCH_TOP_K
+from gallery_index import PATTERN_NAMES, coarse_features
+from identification import get_gallery
+from minutiae import extract_minutiae, load_grayscale
+from parallel_search import get_search_engine
+from scheduler import PRIORITY_NORMAL
+import tracing
+
+def rank_persons(candidates):
+    """Aggregate ranked finger candidates per enrolled person.
+
+    One scan shows a single finger, so a person's score is that of their
+    best-matching finger (max rule); the other fingers that scored are kept
+    in "fingers" for the adjudicator.
+
+    Args:
+        candidates (list): Candidate dicts with person_id, finger_index, member and score.
+
+    Returns:
+        list: Dicts with person_id, member, score and "fingers" (finger_index and
+            score, best first), best person first.
+    """
+    persons = {}
+    for candidate in candidates:
+        key = (candidate["person_id"], candidate["member"])
+        person = persons.get(key)
+        if person is None:
+            person = persons[key] = {"person_id": key[0], "member": key[1], "score": candidate["score"],
+                                     "fingers": []}
+        person["score"] = max(person["score"], candidate["score"])
+        person["fingers"].append({"finger_index": candidate["finger_index"], "score": candidate["score"]})
+    ranked = sorted(persons.values(), key=lambda person: person["score"], reverse=True)
+    for person in ranked:
+        person["fingers"].sort(key=lambda finger: finger["score"], reverse=True)
+    return ranked
+
+def _add_candidates(result):
+    """Complete a bridge MATCH result with "candidates" and "persons".
 
-def match_fingerprint():
+    A bridge that predates CANDIDATE lines only reports its best match, which
+    then becomes the single candidate.
+    """
+    if result.get("status") not in ("match", "no_match"):
+        return result
+    if "candidates" not in result:
+        result["candidates"] = []
+        if result.get("person_id") is not None and result.get("score") is not None:
+            result["candidates"].append({key: result.get(key)
+                                         for key in ("person_id", "finger_index", "member", "score")})
+    result["persons"] = rank_persons(result["candidates"])
+    return result
+
+def _match_command(top_k, member):
+    return f"MATCH {top_k} {member}\n" if member else f"MATCH {top_k}\n"
+
+def match_fingerprint(top_k=MATCH_TOP_K, member=None, on_progress=None, deadline=None,
+                      priority=PRIORITY_NORMAL, station=None):
     """Match a captured fingerprint against all stored templates.
 
+    The bridge keeps the ``top_k`` strongest fingers while it scans the
+    stored images and returns them with the best match.
+
+    Args:
+        top_k (int): Number of finger candidates to return.
+        member (str | None): Only search templates enrolled as this member type.
+        on_progress (callable | None): Receives the bridge's progress updates.
+        deadline (float | None): ``time.monotonic()`` by which the scanner must be reached.
+        priority (int): Device scheduler priority.
+        station (str | None): Bridge station to use; None picks the least-loaded one.
+
     Returns:
-        dict: A dictionary containing the result of the matching operation.
+        dict: A dictionary containing the result of the matching operation, with
+            ranked "candidates" (fingers) and "persons" (see rank_persons()).
     """
-    command = "MATCH\n"
+    command = _match_command(top_k, member)
     # Matching can take longer, so we use a longer timeout.
-    return send_bridge_command(command, timeout=60)
+    return _add_candidates(send_bridge_command(command, timeout=60, on_progress=on_progress,
+                                               deadline=deadline, priority=priority, station=station))
+
+async def match_fingerprint_async(top_k=MATCH_TOP_K, member=None, on_progress=None, deadline=None,
+                                  priority=PRIORITY_NORMAL, station=None):
+    """Coroutine version of match_fingerprint() for the asyncio serving mode."""
+    command = _match_command(top_k, member)
+    return _add_candidates(await send_bridge_command_async(command, timeout=60, on_progress=on_progress,
+                                                           deadline=deadline, priority=priority,
+                                                           station=station))
+
+def identify_fingerprint(top_k=MATCH_TOP_K, finger_index=None, penetration_rate=GALLERY_PENETRATION_RATE,
+                         member=None, on_progress=None, deadline=None, priority=PRIORITY_NORMAL, station=None):
+    """Capture a live fingerprint and identify it against the in-memory gallery.
+
+    The bridge is only used to scan the probe; extraction and 1:N scoring run
+    in the API process against the resident template gallery.
+
+    Args:
+        top_k (int): Number of candidates to return.
+        finger_index (int | None): Only search templates of this finger, if known.
+        penetration_rate (float): Fraction of the gallery scored in full after
+            coarse pre-filtering (1.0 disables the pre-filter).
+        member (str | None): Only search templates enrolled as this member type.
+        on_progress (callable | None): Receives progress updates.
+        deadline (float | None): ``time.monotonic()`` by which the scanner must be reached.
+        priority (int): Device scheduler priority of the scan.
+        station (str | None): Bridge station to scan on; None picks the least-loaded one.
+
+    Returns:
+        dict: The same fields as match_fingerprint(), including "candidates" and "persons".
+    """
+    gallery = get_gallery()
+    if not gallery.ready.is_set():
+        return {"status": "error", "message": "Identification gallery is still loading"}
+
+    scan = scan_fingerprint_bmp(on_progress=on_progress, deadline=deadline, priority=priority, station=station)
+    return identify_scan(scan, top_k, finger_index, penetration_rate, on_progress, member)
+
+async def identify_fingerprint_async(top_k=MATCH_TOP_K, finger_index=None,
+                                     penetration_rate=GALLERY_PENETRATION_RATE, member=None, on_progress=None,
+                                     deadline=None, priority=PRIORITY_NORMAL, station=None):
+    """Coroutine version of identify_fingerprint().
+
+    The scan waits on the event loop; extraction and scoring are CPU-bound
+    and run on a worker thread so they do not stall other requests.
+    """
+    if not get_gallery().ready.is_set():
+        return {"status": "error", "message": "Identification gallery is still loading"}
+    scan = await scan_fingerprint_bmp_async(on_progress=on_progress, deadline=deadline, priority=priority,
+                                            station=station)
+    return await asyncio.to_thread(identify_scan, scan, top_k, finger_index, penetration_rate, on_progress,
+                                   member)
+
+def identify_scan(scan, top_k=MATCH_TOP_K, finger_index=None, penetration_rate=GALLERY_PENETRATION_RATE,
+                  on_progress=None, member=None):
+    """Identify an already scanned fingerprint against the in-memory gallery.
+
+    Args:
+        scan (dict): The bridge's SCAN result.
+        top_k, finger_index, penetration_rate, on_progress, member: As for identify_fingerprint().
+
+    Returns:
+        dict: The identify_fingerprint() response, or ``scan`` itself if it failed.
+    """
+    if scan.get("status") != "success" or not scan.get("bmp_base64"):
+        return scan
+    if on_progress is not None:
+        on_progress("processing", f"Searching {len(get_gallery())} stored fingerprints")
 
+    with tracing.span("gallery.identify", gallery_size=len(get_gallery()), finger_index=finger_index,
+                      penetration_rate=penetration_rate, member=member) as search:
+        image = load_grayscale(base64.b64decode(scan["bmp_base64"]))
+        probe = extract_minutiae(image)
+        coarse = coarse_features(image) if penetration_rate < 1.0 else None
+        search.event("extracted", minutiae=len(probe))
+        candidates = get_search_engine().identify(probe, k=top_k, coarse=coarse, finger_index=finger_index,
+                                                  penetration_rate=penetration_rate, member=member)
 
+    response = {"bmp_base64": scan["bmp_base64"], "candidates": candidates, "persons": rank_persons(candidates),
+                "station": scan.get("station")}
+    if coarse is not None:
+        response["pattern_class"] = PATTERN_NAMES[coarse.pattern]
+    best = candidates[0] if candidates else None
+    if best and best["score"] >= GALLERY_MATCH_THRESHOLD:
+        response.update({
+            "status": "match",
+            "message": f"✅ Match: {best['person_id']}, Finger: {best['finger_index']}, Score: {best['score']:.2f}",
+            "person_id": best["person_id"],
+            "finger_index": best["finger_index"],
+            "member": best["member"],
+            "score": best["score"],
+        })
+    else:
+        best_score = best["score"] if best else 0.0
+        response.update({
+            "status": "no_match",
+            "message": f"❌ No good match found. Best score = {best_score:.2f}",
+        })
+    return response
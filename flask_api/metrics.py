@@ -0,0 +1,179 @@
+"""Latency histograms and gauges exposed in the Prometheus text format.
+
+Every request is timed end to end, and the stages it passes through are
+timed separately, so the p95/p99 of a slow endpoint can be split into
+where the time went:
+
+    request_parse       JSON body decoding and validation
+    queue_wait          waiting in the device scheduler for the scanner
+    bridge_connect      opening a new TCP connection to the bridge
+    bridge_first_byte   command sent -> first response line (usually a PROGRESS prompt)
+    bridge_scan         command sent -> result line: finger placement plus bridge-side work
+    bridge_transfer     result line -> end of response (mostly the BMP: line)
+    response_parse      parsing the bridge's response lines
+    db_connection_wait  checking a connection out of the DB pool
+    db_query            one SQL statement, labelled with its verb
+    image_decode        base64 decoding and hashing of the scan for the image mode
+    json_encode         serialising the response body
+
+Bridge and API stages carry the operation (capture, verify, match, scan,
+verify_batch, ...) in the ``operation`` label. GET /metrics renders
+everything with render(); Prometheus computes quantiles from the buckets.
+No client library is needed.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from config import METRICS_BUCKETS, METRICS_ENABLED
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """A labelled histogram with fixed upper bounds, safe to observe from any thread.
+
+    Args:
+        name (str): Metric name.
+        documentation (str): HELP text.
+        labelnames (tuple): Names of the labels every observation carries.
+        buckets (tuple): Increasing upper bounds in seconds; +Inf is implied.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=METRICS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}   # label values -> [per-bucket counts (last is +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self, labelvalues):
+        """(count, sum) of one series; (0, 0.0) if it was never observed."""
+        with self._lock:
+            series = self._series.get(labelvalues)
+            return (sum(series[0]), series[1]) if series else (0, 0.0)
+
+    def render(self):
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labelvalues, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _labels(self.labelnames, labelvalues, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {total!r}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """A labelled gauge whose values are read from ``callback`` at render time.
+
+    Args:
+        callback (callable): Returns {label values tuple: number}.
+    """
+
+    def __init__(self, name, documentation, labelnames, callback):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labelvalues, value in sorted(self.callback().items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}")
+        return lines
+
+
+_metrics = []
+_metrics_lock = threading.Lock()
+
+
+def register(metric):
+    """Add ``metric`` to the /metrics output and return it."""
+    with _metrics_lock:
+        _metrics.append(metric)
+    return metric
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    with _metrics_lock:
+        metrics = list(_metrics)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = register(Histogram(
+    "fingerprint_api_request_seconds", "End-to-end HTTP request latency.", ("method", "endpoint", "status")))
+STAGE_SECONDS = register(Histogram(
+    "fingerprint_api_stage_seconds", "Time spent in each stage of a request.", ("stage", "operation")))
+
+
+def observe_stage(stage, seconds, operation=""):
+    """Record ``seconds`` spent in ``stage`` (see the module docstring for the stages)."""
+    if METRICS_ENABLED:
+        STAGE_SECONDS.observe(seconds, stage, operation)
+
+
+@contextmanager
+def stage_timer(stage, operation=""):
+    """Time the body of a ``with`` block as ``stage``, including when it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start, operation)
+
+
+def observe_request(method, endpoint, status, seconds):
+    if METRICS_ENABLED:
+        REQUEST_SECONDS.observe(seconds, method, endpoint, str(status))
+
+
+def observe_bridge_response(parser, operation):
+    """Record the bridge stages from the timestamps a BridgeResponseParser collected."""
+    if not METRICS_ENABLED or parser.sent_at is None:
+        return
+    finished = time.perf_counter()
+    if parser.first_line_at is not None:
+        STAGE_SECONDS.observe(parser.first_line_at - parser.sent_at, "bridge_first_byte", operation)
+    if parser.result_at is not None:
+        STAGE_SECONDS.observe(parser.result_at - parser.sent_at, "bridge_scan", operation)
+        STAGE_SECONDS.observe(finished - parser.result_at, "bridge_transfer", operation)
+    STAGE_SECONDS.observe(parser.parse_seconds, "response_parse", operation)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Convert stored fingerprint BMPs to compressed storage in batches.
+
+Adds the image_data/image_format columns if they are missing, then walks
+fingerprint_templates in primary-key order, encoding each image_bmp into
+image_data. Progress is keyed on (person_id, finger_index, member), so the
+tool can be stopped and re-run at any time; converted rows are skipped.
+
+Usage:
+    python migrate_images.py [--format png] [--batch-size 200] [--sleep 0.5]
+    python migrate_images.py --clear-bmp    # also NULL image_bmp after conversion
+
+--clear-bmp reclaims the most space but must only be used once every reader
+of image_bmp (including the bridge's VERIFY/MATCH) reads image_data instead.
+"""
+
+import argparse
+import time
+
+from db_pool import get_pool
+from image_codec import available_formats, encode_image
+from schema import ensure_columns
+
+
+def fetch_batch(conn, after, batch_size):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT person_id, finger_index, member, image_bmp FROM fingerprint_templates "
+            "WHERE image_bmp IS NOT NULL AND image_data IS NULL "
+            "AND (person_id, finger_index, member) > (%s, %s, %s) "
+            "ORDER BY person_id, finger_index, member LIMIT %s",
+            (*after, batch_size))
+        return cursor.fetchall()
+
+
+def migrate(fmt, batch_size, sleep, clear_bmp, limit=None):
+    pool = get_pool()
+    with pool.connection() as conn:
+        added = ensure_columns(conn, "image_data", "image_format")
+    if added:
+        print(f"Added columns: {', '.join(added)}")
+
+    after = ("", -1, "")
+    converted = failed = 0
+    bytes_before = bytes_after = 0
+    start = time.time()
+
+    while limit is None or converted < limit:
+        with pool.connection() as conn:
+            rows = fetch_batch(conn, after, batch_size)
+            if not rows:
+                break
+
+            updates = []
+            for person_id, finger_index, member, image_bmp in rows:
+                try:
+                    encoded = encode_image(image_bmp, fmt)
+                except Exception as e:
+                    failed += 1
+                    print(f"❌ {person_id}/{finger_index}/{member}: {e}")
+                    continue
+                bytes_before += len(image_bmp)
+                bytes_after += len(encoded)
+                updates.append((encoded, fmt, person_id, finger_index, member))
+
+            with conn.cursor() as cursor:
+                if clear_bmp:
+                    cursor.executemany(
+                        "UPDATE fingerprint_templates SET image_data = %s, image_format = %s, image_bmp = NULL "
+                        "WHERE person_id = %s AND finger_index = %s AND member = %s", updates)
+                else:
+                    cursor.executemany(
+                        "UPDATE fingerprint_templates SET image_data = %s, image_format = %s "
+                        "WHERE person_id = %s AND finger_index = %s AND member = %s", updates)
+            conn.commit()
+
+        converted += len(updates)
+        after = rows[-1][:3]
+        ratio = bytes_before / bytes_after if bytes_after else 0
+        print(f"✅ {converted} rows converted ({failed} failed), "
+              f"{bytes_before / 2**20:.1f} MB -> {bytes_after / 2**20:.1f} MB ({ratio:.1f}x), "
+              f"{converted / (time.time() - start):.1f} rows/sec")
+        if sleep:
+            time.sleep(sleep)
+
+    print(f"Done: {converted} rows converted, {failed} failed in {time.time() - start:.1f} sec")
+    return converted, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", default="png", choices=[f for f in available_formats() if f != "bmp"])
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--sleep", type=float, default=0.0, help="seconds to pause between batches")
+    parser.add_argument("--limit", type=int, help="stop after this many rows")
+    parser.add_argument("--clear-bmp", action="store_true", help="set image_bmp to NULL once converted")
+    args = parser.parse_args()
+
+    migrate(args.format, args.batch_size, args.sleep, args.clear_bmp, args.limit)
+
+
+if __name__ == "__main__":
+    main()
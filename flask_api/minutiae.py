@@ -0,0 +1,189 @@
+"""Minutiae extraction from grayscale fingerprint images.
+
+A deliberately simple, NumPy-only pipeline:
+
+    normalise -> segment (block variance) -> orientation field (gradient
+    structure tensor) -> binarise (local mean) -> thin (Zhang-Suen) ->
+    crossing number -> remove border/duplicate minutiae
+
+Each minutia is a row ``(x, y, angle, type)`` in a float32 array, with the
+angle in radians in [0, 2*pi) and type MINUTIA_ENDING or MINUTIA_BIFURCATION.
+Its quality is the local orientation coherence in [0, 1].
+"""
+
+import io
+
+import numpy as np
+from PIL import Image
+
+# Bump whenever a change to this module alters the minutiae it produces (or
+# gallery_index changes the coarse features stored with them), so stored
+# templates from the previous version are re-extracted.
+# 2: templates carry coarse index features.
+EXTRACTOR_VERSION = 2
+
+MINUTIA_ENDING = 1
+MINUTIA_BIFURCATION = 3
+
+MAX_MINUTIAE = 64
+
+BLOCK_RADIUS = 8          # half-size of the window for variance/orientation
+MIN_FOREGROUND_STD = 0.35  # normalised local std below which a pixel is background
+BORDER_MARGIN = 12        # minutiae closer than this to the background are dropped
+MIN_MINUTIA_DISTANCE = 6  # closer pairs are treated as spurs/breaks and removed
+DIRECTION_RADIUS = 7      # neighbourhood used to disambiguate the minutia direction
+
+_TWO_PI = 2 * np.pi
+
+
+def load_grayscale(image_bytes):
+    """Decode BMP/PNG/etc. bytes into a 2-D uint8 array."""
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode != "L":
+        image = image.convert("L")
+    return np.asarray(image, dtype=np.uint8)
+
+
+def box_mean(a, radius):
+    """Mean over a (2r+1)x(2r+1) window, computed with an integral image."""
+    size = 2 * radius + 1
+    padded = np.pad(a.astype(np.float64), radius + 1, mode="edge")
+    integral = padded.cumsum(axis=0).cumsum(axis=1)
+    total = (integral[size:, size:] - integral[:-size, size:]
+             - integral[size:, :-size] + integral[:-size, :-size])
+    return (total / (size * size))[:a.shape[0], :a.shape[1]]
+
+
+def orientation_field(image, radius=BLOCK_RADIUS):
+    """Return (ridge orientation in [0, pi), coherence in [0, 1]) per pixel."""
+    gy, gx = np.gradient(image)
+    gxx = box_mean(gx * gx, radius)
+    gyy = box_mean(gy * gy, radius)
+    gxy = box_mean(gx * gy, radius)
+    gradient_angle = 0.5 * np.arctan2(2 * gxy, gxx - gyy)
+    orientation = np.mod(gradient_angle + np.pi / 2, np.pi)
+    coherence = np.sqrt((gxx - gyy) ** 2 + 4 * gxy ** 2) / (gxx + gyy + 1e-9)
+    return orientation, coherence
+
+
+def _neighbours(skeleton):
+    """The 8 neighbours P2..P9 (clockwise from north) of every pixel."""
+    p = np.pad(skeleton, 1)
+    return [
+        p[:-2, 1:-1], p[:-2, 2:], p[1:-1, 2:], p[2:, 2:],
+        p[2:, 1:-1], p[2:, :-2], p[1:-1, :-2], p[:-2, :-2],
+    ]
+
+
+def thin(binary):
+    """Zhang-Suen thinning of a boolean ridge map, vectorised per sub-iteration."""
+    skeleton = binary.astype(np.uint8)
+    while True:
+        changed = False
+        for step in (0, 1):
+            n = _neighbours(skeleton)
+            p2, p3, p4, p5, p6, p7, p8, p9 = n
+            count = sum(n)
+            ring = n + [p2]
+            transitions = sum(((ring[i] == 0) & (ring[i + 1] == 1)).astype(np.uint8) for i in range(8))
+            if step == 0:
+                cond = (p2 * p4 * p6 == 0) & (p4 * p6 * p8 == 0)
+            else:
+                cond = (p2 * p4 * p8 == 0) & (p2 * p6 * p8 == 0)
+            remove = (skeleton == 1) & (count >= 2) & (count <= 6) & (transitions == 1) & cond
+            if remove.any():
+                skeleton[remove] = 0
+                changed = True
+        if not changed:
+            return skeleton.astype(bool)
+
+
+def crossing_number(skeleton):
+    """Crossing number of every skeleton pixel (0 for background)."""
+    s = skeleton.astype(np.int8)
+    n = _neighbours(s)
+    ring = n + [n[0]]
+    cn = sum(np.abs(ring[i] - ring[i + 1]) for i in range(8)) // 2
+    return np.where(skeleton, cn, 0)
+
+
+def _disk_offsets(radius):
+    dy, dx = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    keep = (dx * dx + dy * dy <= radius * radius) & ((dx != 0) | (dy != 0))
+    return dy[keep], dx[keep]
+
+
+def _minutia_directions(skeleton, ys, xs, orientation):
+    """Resolve the pi ambiguity of the ridge orientation at each minutia.
+
+    The skeleton pixels around a minutia lie mostly on the side the ridge(s)
+    continue towards; the minutia direction is taken as the orientation (or
+    its opposite) closest to that side.
+    """
+    dy, dx = _disk_offsets(DIRECTION_RADIUS)
+    padded = np.pad(skeleton, DIRECTION_RADIUS)
+    rows = ys[:, None] + dy[None, :] + DIRECTION_RADIUS
+    cols = xs[:, None] + dx[None, :] + DIRECTION_RADIUS
+    weights = padded[rows, cols].astype(np.float32)
+    cx = (weights * dx).sum(axis=1)
+    cy = (weights * dy).sum(axis=1)
+
+    theta = orientation[ys, xs]
+    along = np.cos(theta) * cx + np.sin(theta) * cy
+    return np.mod(np.where(along >= 0, theta, theta + np.pi), _TWO_PI)
+
+
+def extract_minutiae(image, max_minutiae=MAX_MINUTIAE, return_quality=False):
+    """Extract minutiae from a grayscale fingerprint image.
+
+    Args:
+        image (np.ndarray): 2-D uint8 (or float) grayscale image, ridges dark.
+        max_minutiae (int): Keep at most this many, highest coherence first.
+        return_quality (bool): Also return the per-minutia quality in [0, 1].
+
+    Returns:
+        np.ndarray: float32 array of shape (K, 4) with columns x, y, angle, type.
+            With ``return_quality`` a tuple (minutiae, quality) is returned.
+    """
+    img = image.astype(np.float64)
+    img = (img - img.mean()) / (img.std() + 1e-9)
+
+    local_mean = box_mean(img, BLOCK_RADIUS)
+    local_std = np.sqrt(np.maximum(box_mean(img * img, BLOCK_RADIUS) - local_mean ** 2, 0))
+    foreground = local_std > MIN_FOREGROUND_STD
+    # Pixels whose whole neighbourhood is foreground; keeps minutiae off the print border.
+    inner = box_mean(foreground.astype(np.float64), BORDER_MARGIN) > 0.999
+
+    smoothed = box_mean(img, 1)
+    ridges = (smoothed < local_mean) & foreground
+    skeleton = thin(ridges)
+
+    orientation, coherence = orientation_field(smoothed)
+
+    cn = crossing_number(skeleton)
+    candidates = ((cn == 1) | (cn == 3)) & inner
+    ys, xs = np.nonzero(candidates)
+
+    if len(ys) > 1:
+        # Drop clusters of minutiae that are too close together (spurs, breaks, holes).
+        d2 = (xs[:, None] - xs[None, :]) ** 2 + (ys[:, None] - ys[None, :]) ** 2
+        np.fill_diagonal(d2, np.iinfo(d2.dtype).max)
+        isolated = d2.min(axis=1) >= MIN_MINUTIA_DISTANCE ** 2
+        ys, xs = ys[isolated], xs[isolated]
+
+    quality = coherence[ys, xs].astype(np.float32)
+    order = np.argsort(-quality, kind="stable")[:max_minutiae]
+    ys, xs, quality = ys[order], xs[order], quality[order]
+
+    angles = _minutia_directions(skeleton, ys, xs, orientation)
+    types = np.where(cn[ys, xs] == 1, MINUTIA_ENDING, MINUTIA_BIFURCATION)
+
+    minutiae = np.stack([xs, ys, angles, types], axis=1).astype(np.float32)
+    if return_quality:
+        return minutiae, quality
+    return minutiae
+
+
+def extract_from_bytes(image_bytes, max_minutiae=MAX_MINUTIAE):
+    """Decode an encoded image and extract its minutiae."""
+    return extract_minutiae(load_grayscale(image_bytes), max_minutiae)
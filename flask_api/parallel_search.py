@@ -0,0 +1,250 @@
+"""Multi-core 1:N search over the template gallery.
+
+Scoring a probe against tens of thousands of templates is CPU-bound, and in
+one Python process it is limited to a single core. ParallelSearcher publishes
+the gallery arrays into shared memory, keeps them current by patching the
+rows that change, shards the rows across a process pool and merges the
+per-shard top-k results. Workers attach to the shared blocks read-only, so
+the gallery is never pickled or copied per query; only the probe and the
+shard bounds cross the process boundary.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+
+from config import MATCH_WORKERS
+from gallery_index import select_rows
+from identification import build_candidates, get_gallery, hough_scores, member_mask, top_k
+
+
+def _attach(name):
+    """Attach to an existing shared memory block without taking ownership of it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always registers the block with the resource tracker.
+        # Spawned workers share the parent's tracker, so the duplicate
+        # registration is harmless; unregistering here would drop the
+        # parent's own entry.
+        return shared_memory.SharedMemory(name=name)
+
+
+# Worker-side cache of attached blocks, keyed by block name.
+_attached = {}
+
+
+def _shared_array(name, shape, dtype):
+    shm = _attached.get(name)
+    if shm is None:
+        # Only the current generation is kept attached.
+        for old in list(_attached):
+            _attached.pop(old).close()
+        shm = _attached[name] = _attach(name)
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _score_shard(layout, start, stop, probe, k, rows=None):
+    """Worker entry point: score rows [start, stop), or the listed ``rows``,
+    and return the shard's top-k."""
+    name, capacity, width = layout
+    block = _shared_array(name, (capacity * (width * 4 + 1),), np.float32)
+    minutiae = block[:capacity * width * 4].reshape(capacity, width, 4)
+    counts = block[capacity * width * 4:]
+    if rows is None:
+        scores = hough_scores(probe, minutiae[start:stop], counts[start:stop])
+        best = top_k(scores, k)
+        return best + start, scores[best]
+    scores = hough_scores(probe, minutiae[rows], counts[rows])
+    best = top_k(scores, k)
+    return rows[best], scores[best]
+
+
+class _SharedBlock:
+    """A shared memory copy of the gallery's minutiae and counts, with spare rows.
+
+    ``users`` counts the queries scoring against the block. A block that has
+    been replaced is unlinked only once the last of them has finished, so
+    every shard of a query can still attach to it.
+    """
+
+    def __init__(self, capacity, width):
+        self.capacity = capacity
+        self.width = width
+        nbytes = max(4, capacity * (width * 4 + 1) * 4)
+        self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        data = np.ndarray((capacity * (width * 4 + 1),), dtype=np.float32, buffer=self.shm.buf)
+        self.minutiae = data[:capacity * width * 4].reshape(capacity, width, 4)
+        self.counts = data[capacity * width * 4:]
+        self.users = 0
+        self.retired = False
+
+    @property
+    def layout(self):
+        return self.shm.name, self.capacity, self.width
+
+    def free(self):
+        # The views must go before the buffer they export can be closed.
+        self.minutiae = self.counts = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class ParallelSearcher:
+    """Scores probes against a TemplateGallery using a pool of worker processes.
+
+    The gallery is copied into a shared block with spare rows once; after
+    that, each query first patches in only the rows changed since the last
+    one (see TemplateGallery.changes). A new block is allocated only when the
+    gallery outgrows it or its rows are renumbered.
+
+    Args:
+        gallery (identification.TemplateGallery): The gallery to search.
+        workers (int): Number of worker processes (defaults to the CPU count).
+        shards_per_worker (int): Shards per worker; more shards smooth out
+            uneven per-template cost at the price of more merging.
+        headroom (float): Spare rows allocated with each block, as a fraction
+            of the gallery, for later enrollments.
+    """
+
+    def __init__(self, gallery, workers=None, shards_per_worker=2, headroom=0.25):
+        self.gallery = gallery
+        self.workers = workers or os.cpu_count() or 1
+        self.shards_per_worker = shards_per_worker
+        self.headroom = headroom
+        # "spawn" matches the Windows behaviour everywhere and avoids forking
+        # a process that holds DB connections and sockets.
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context("spawn"))
+        self._lock = threading.Lock()
+        self._block = None
+        self._retired = []
+        self._published_version = None
+        self._size = 0
+        self._keys = []
+        self._coarse = None
+        self._fingers = None
+
+    def _publish(self):
+        """Bring the shared block up to date with the gallery (called with the lock held)."""
+        version, (minutiae, counts, keys, coarse, fingers), rows = self.gallery.changes(self._published_version)
+        size, width = minutiae.shape[0], minutiae.shape[1]
+        block = self._block
+        if rows is None or block is None or size > block.capacity or width != block.width:
+            capacity = max(size + 1, int(size * (1 + self.headroom)))
+            block = _SharedBlock(capacity, width)
+            block.minutiae[:size] = minutiae
+            block.counts[:size] = counts
+            if self._block is not None:
+                self._retire(self._block)
+            self._block = block
+            logging.info(f"[Search] Published {size} templates to shared memory "
+                         f"({block.shm.size / 2**20:.1f} MB, room for {capacity})")
+        else:
+            # In-flight queries only read rows below their own size, and a
+            # replaced row keeps its key, so patching in place is safe.
+            block.minutiae[rows] = minutiae[rows]
+            block.counts[rows] = counts[rows]
+        self._size = size
+        self._keys = keys
+        self._coarse = coarse.copy()
+        self._fingers = fingers.copy()
+        self._published_version = version
+
+    def _retire(self, block):
+        block.retired = True
+        if block.users == 0:
+            block.free()
+        else:
+            self._retired.append(block)
+
+    def _acquire(self):
+        """Publish if needed and pin the current block for one query."""
+        with self._lock:
+            if self.gallery.version != self._published_version:
+                self._publish()
+            self._block.users += 1
+            return self._block, self._size, self._keys, self._coarse, self._fingers
+
+    def _release(self, block):
+        with self._lock:
+            block.users -= 1
+            if block.retired and block.users == 0:
+                self._retired.remove(block)
+                block.free()
+
+    def scores_top_k(self, probe, k, coarse=None, finger_index=None, penetration_rate=1.0, member=None):
+        """Return (rows, scores, keys): the best ``k`` rows across all shards
+        and the key list of the published gallery they index into.
+
+        ``coarse``, ``finger_index``, ``penetration_rate`` and ``member`` prune the
+        gallery before scoring, as in TemplateGallery.identify.
+        """
+        block, published, keys, gallery_coarse, fingers = self._acquire()
+        try:
+            probe = np.asarray(probe, dtype=np.float32)[:self.gallery.max_minutiae]
+            selected = select_rows(gallery_coarse, fingers, coarse, finger_index, penetration_rate,
+                                   member_mask(keys, member))
+            size = published if selected is None else len(selected)
+            if size == 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), keys
+
+            shards = min(size, self.workers * self.shards_per_worker)
+            bounds = np.linspace(0, size, shards + 1, dtype=np.int64)
+            if selected is None:
+                futures = [self._executor.submit(_score_shard, block.layout, int(lo), int(hi), probe, k)
+                           for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+            else:
+                futures = [self._executor.submit(_score_shard, block.layout, 0, 0, probe, k, selected[lo:hi])
+                           for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+            try:
+                results = [future.result() for future in futures]
+            finally:
+                # Shards still running must finish before the block may be freed.
+                wait(futures)
+        finally:
+            self._release(block)
+
+        rows = np.concatenate([shard_rows for shard_rows, _ in results])
+        scores = np.concatenate([shard_scores for _, shard_scores in results])
+        best = top_k(scores, k)
+        return rows[best], scores[best], keys
+
+    def identify(self, probe, k=10, threshold=0.0, coarse=None, finger_index=None, penetration_rate=1.0,
+                 member=None):
+        """Same contract as TemplateGallery.identify, scored across the worker pool."""
+        rows, scores, keys = self.scores_top_k(probe, k, coarse, finger_index, penetration_rate, member)
+        return build_candidates(keys, rows, scores, threshold)
+
+    def close(self):
+        self._executor.shutdown(cancel_futures=True)
+        with self._lock:
+            for block in [self._block, *self._retired]:
+                if block is not None:
+                    block.free()
+            self._block = None
+            self._retired = []
+
+
+_searcher = None
+_searcher_lock = threading.Lock()
+
+
+def get_search_engine():
+    """Return the object /match identifies with.
+
+    With MATCH_WORKERS > 1 this is a process-wide ParallelSearcher over the
+    gallery; otherwise the gallery itself, scored in the calling thread.
+    Both expose the same ``identify()``.
+    """
+    global _searcher
+    gallery = get_gallery()
+    if MATCH_WORKERS <= 1:
+        return gallery
+    with _searcher_lock:
+        if _searcher is None:
+            _searcher = ParallelSearcher(gallery, workers=MATCH_WORKERS)
+        return _searcher
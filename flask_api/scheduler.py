@@ -0,0 +1,264 @@
+"""Queue in front of the scanner for device-bound bridge commands.
+
+The bridge serves one scanner, and a CAPTURE, VERIFY, MATCH or SCAN holds it
+until a finger has been placed and processed. Without a queue on this side,
+concurrent Flask requests all connect at once and wait in the bridge's TCP
+backlog with no feedback, and often time out.
+
+DeviceScheduler admits one device command at a time, in priority order and
+FIFO within a priority. Every waiting request has a deadline. A request
+whose estimated wait already exceeds its deadline is rejected at once
+instead of being queued. The estimate is built from a moving average of
+recent service times per command. Work that does not need the scanner
+(stored images, gallery search, database reads) never goes through the
+scheduler.
+"""
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+from config import DEVICE_QUEUE_MAX, DEVICE_SERVICE_ESTIMATE, DEVICE_DEADLINE
+from metrics import observe_stage
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+PRIORITY_NAMES = {"high": PRIORITY_HIGH, "normal": PRIORITY_NORMAL, "low": PRIORITY_LOW}
+
+DEVICE_COMMANDS = ("CAPTURE", "VERIFY", "MATCH", "SCAN")
+
+EWMA_ALPHA = 0.2          # weight of the newest sample in the moving averages
+
+
+class SchedulerRejected(Exception):
+    """A device request was refused or gave up waiting for the scanner.
+
+    Attributes:
+        retry_after (float): Suggested seconds before retrying.
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    __slots__ = ("priority", "seq", "command", "estimate", "enqueued", "future", "cancelled")
+
+    def __init__(self, priority, seq, command, estimate, future=None):
+        self.priority = priority
+        self.seq = seq
+        self.command = command
+        self.estimate = estimate
+        self.enqueued = time.monotonic()
+        self.future = future          # asyncio future of a coroutine waiter, resolved on its turn
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+def is_device_command(command):
+    """True if ``command`` needs the scanner and must go through the scheduler."""
+    verb = command.split(None, 1)[0].upper() if command.strip() else ""
+    return verb in DEVICE_COMMANDS
+
+
+class DeviceScheduler:
+    """Serialises device commands through a priority queue with deadlines.
+
+    Args:
+        max_queue (int): Waiting requests beyond which new ones are rejected.
+        service_estimate (float): Initial guess of one command's duration in seconds.
+    """
+
+    def __init__(self, max_queue=DEVICE_QUEUE_MAX, service_estimate=DEVICE_SERVICE_ESTIMATE):
+        self.max_queue = max_queue
+        self.default_estimate = service_estimate
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._busy = None             # (ticket, start time) of the command holding the scanner
+        self._service = {}            # command -> EWMA service seconds
+        self._wait = 0.0              # EWMA queue wait seconds
+        self.served = 0
+        self.rejected = 0
+        self.expired = 0
+
+    def _estimate(self, command):
+        return self._service.get(command, self.default_estimate)
+
+    def _waiting(self):
+        return [t for t in self._heap if not t.cancelled]
+
+    def _estimated_wait(self, ahead):
+        wait = sum(t.estimate for t in ahead)
+        if self._busy is not None:
+            ticket, started = self._busy
+            wait += max(ticket.estimate - (time.monotonic() - started), 0.0)
+        return wait
+
+    def _pop_cancelled(self):
+        while self._heap and self._heap[0].cancelled:
+            heapq.heappop(self._heap)
+
+    def _admit(self, command, deadline, priority, on_progress, future=None):
+        """Queue a ticket, or reject it if the queue is full or the wait too long. Holds the lock."""
+        ticket = _Ticket(priority, next(self._seq), command, self._estimate(command), future)
+        ahead = [t for t in self._waiting() if t < ticket]
+        wait = self._estimated_wait(ahead)
+        if len(self._waiting()) >= self.max_queue:
+            self.rejected += 1
+            raise SchedulerRejected(f"Device queue is full ({self.max_queue} waiting)", wait)
+        if ticket.enqueued + wait > deadline:
+            self.rejected += 1
+            raise SchedulerRejected(f"Scanner busy: estimated wait {wait:.1f} sec exceeds the deadline", wait)
+        heapq.heappush(self._heap, ticket)
+        in_front = len(ahead) + (self._busy is not None)
+        if on_progress is not None and in_front:
+            on_progress("queued", f"{in_front} request(s) ahead for the scanner, about {wait:.0f} sec")
+        return ticket
+
+    def _start(self, ticket):
+        """Give the scanner to ``ticket``, which is at the head of the queue. Holds the lock."""
+        heapq.heappop(self._heap)
+        started = time.monotonic()
+        self._busy = (ticket, started)
+        self._wait += EWMA_ALPHA * ((started - ticket.enqueued) - self._wait)
+        observe_stage("queue_wait", started - ticket.enqueued, ticket.command.lower())
+        return started
+
+    def _expire(self, ticket):
+        """Drop a ticket whose deadline passed. Holds the lock."""
+        ticket.cancelled = True
+        self.expired += 1
+        self._dispatch()
+        return SchedulerRejected("Deadline passed while waiting for the scanner",
+                                 self._estimated_wait(self._waiting()))
+
+    def _dispatch(self):
+        """Hand a free scanner to a coroutine at the head of the queue and wake threads. Holds the lock.
+
+        Waiting threads check for their own turn when woken; a waiting
+        coroutine cannot, so it is started here and its future resolved.
+        """
+        self._pop_cancelled()
+        if self._busy is None and self._heap and self._heap[0].future is not None:
+            ticket = self._heap[0]
+            self._start(ticket)
+            ticket.future.get_loop().call_soon_threadsafe(_resolve, ticket.future)
+        self._cond.notify_all()
+
+    def _finish(self, command, started):
+        with self._cond:
+            elapsed = time.monotonic() - started
+            self._service[command] = self._estimate(command) + EWMA_ALPHA * (elapsed - self._estimate(command))
+            self._busy = None
+            self.served += 1
+            self._dispatch()
+
+    def run(self, command, fn, deadline=None, priority=PRIORITY_NORMAL, on_progress=None):
+        """Run ``fn()`` once the scanner is free and it is this request's turn.
+
+        Args:
+            command (str): Command verb (e.g. "CAPTURE"), used for service estimates.
+            fn (callable): Sends the command to the bridge; called with no arguments.
+            deadline (float | None): ``time.monotonic()`` by which the command
+                must have started; defaults to DEVICE_DEADLINE seconds from now.
+            priority (int): PRIORITY_HIGH, PRIORITY_NORMAL or PRIORITY_LOW.
+            on_progress (callable | None): Receives ("queued", message) updates.
+
+        Returns:
+            The return value of ``fn``.
+
+        Raises:
+            SchedulerRejected: If the queue is full, the estimated wait exceeds
+                the deadline, or the deadline passed while waiting.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + DEVICE_DEADLINE
+        with self._cond:
+            ticket = self._admit(command, deadline, priority, on_progress)
+            while self._busy is not None or self._heap[0] is not ticket:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._expire(ticket)
+                self._cond.wait(remaining)
+            started = self._start(ticket)
+
+        try:
+            return fn()
+        finally:
+            self._finish(command, started)
+
+    async def run_async(self, command, coro_fn, deadline=None, priority=PRIORITY_NORMAL, on_progress=None):
+        """Coroutine version of run(): waits for the scanner without holding a thread.
+
+        Coroutine and thread callers share one queue, so the scanner stays
+        serialised when both serving modes send it commands.
+
+        Args:
+            command (str): Command verb, used for service estimates.
+            coro_fn (callable): Returns the awaitable that talks to the bridge.
+            deadline (float | None): See run().
+            priority (int): See run().
+            on_progress (callable | None): See run().
+
+        Returns:
+            The result of ``await coro_fn()``.
+
+        Raises:
+            SchedulerRejected: As for run().
+        """
+        if deadline is None:
+            deadline = time.monotonic() + DEVICE_DEADLINE
+        future = asyncio.get_running_loop().create_future()
+        with self._cond:
+            ticket = self._admit(command, deadline, priority, on_progress, future)
+            self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), max(deadline - time.monotonic(), 0))
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._cond:
+                started = self._busy is not None and self._busy[0] is ticket
+                if not started:
+                    error = self._expire(ticket)
+            if not started:
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                raise error
+            if isinstance(e, asyncio.CancelledError):
+                # The scanner was handed over just as the caller went away.
+                self._finish(command, self._busy[1])
+                raise
+        with self._cond:
+            started = self._busy[1]
+
+        try:
+            return await coro_fn()
+        finally:
+            self._finish(command, started)
+
+    def stats(self):
+        with self._cond:
+            waiting = self._waiting()
+            return {
+                "depth": len(waiting),
+                "busy": self._busy[0].command if self._busy else None,
+                "estimated_wait": round(self._estimated_wait(waiting), 2),
+                "mean_wait": round(self._wait, 2),
+                "service_estimates": {command: round(s, 2) for command, s in self._service.items()},
+                "served": self.served,
+                "rejected": self.rejected,
+                "expired": self.expired,
+            }
+
@@ -0,0 +1,65 @@
+"""Optional columns the Python API adds to ``fingerprint_templates``.
+
+The table is created and written by the bridge (``InsertFingerprintToDatabase``
+in MainForm.cs). Columns the API relies on beyond the bridge's own schema are
+declared here and added on demand by the maintenance tools (and the gallery
+loader at startup), never implicitly by request handlers.
+
+Columns derived from ``image_bmp`` are set to NULL by the bridge whenever it
+re-captures a finger, so they never describe an older image than ``image_bmp``.
+"""
+
+import threading
+
+TABLE = "fingerprint_templates"
+
+# Column name -> DDL fragment used by ALTER TABLE ... ADD COLUMN
+OPTIONAL_COLUMNS = {
+    "image_data": "`image_data` LONGBLOB NULL",
+    "image_format": "`image_format` VARCHAR(8) NULL",
+    "minutiae_template": "`minutiae_template` BLOB NULL",
+    "extractor_version": "`extractor_version` SMALLINT NULL",
+    # Maintained by MySQL on INSERT and on ON DUPLICATE KEY UPDATE, so rows
+    # written by any station can be polled for; indexed for that query.
+    "updated_at": "`updated_at` TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) "
+                  "ON UPDATE CURRENT_TIMESTAMP(3), ADD INDEX `idx_updated_at` (`updated_at`)",
+}
+
+_columns_cache = None
+_columns_lock = threading.Lock()
+
+
+def table_columns(conn, refresh=False):
+    """Return the set of column names of fingerprint_templates (cached per process)."""
+    global _columns_cache
+    with _columns_lock:
+        if _columns_cache is None or refresh:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SHOW COLUMNS FROM `{TABLE}`")
+                _columns_cache = {row[0] for row in cursor.fetchall()}
+        return _columns_cache
+
+
+def has_columns(conn, *names):
+    """True if every named column exists."""
+    columns = table_columns(conn)
+    return all(name in columns for name in names)
+
+
+def ensure_columns(conn, *names):
+    """Add any of the named optional columns that are missing.
+
+    Returns:
+        list: The columns that were added.
+    """
+    existing = table_columns(conn, refresh=True)
+    added = []
+    with conn.cursor() as cursor:
+        for name in names:
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE `{TABLE}` ADD COLUMN {OPTIONAL_COLUMNS[name]}")
+                added.append(name)
+    conn.commit()
+    if added:
+        table_columns(conn, refresh=True)
+    return added
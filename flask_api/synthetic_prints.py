@@ -0,0 +1,176 @@
+"""Synthetic fingerprint images for benchmarks and offline testing.
+
+Generates prints without a scanner or a real dataset, in the spirit of
+SFinGe: an orientation field from the zero-pole model (cores and deltas
+placed per pattern class), ridges grown from noise by repeated oriented
+Gabor filtering, then per-impression rotation, translation, noise and
+contact-area variation. The same ``finger`` seed always yields the same
+master print, so several impressions of one finger share their minutiae.
+"""
+
+import numpy as np
+from PIL import Image
+
+PATTERN_ARCH = "arch"
+PATTERN_TENTED_ARCH = "tented_arch"
+PATTERN_LEFT_LOOP = "left_loop"
+PATTERN_RIGHT_LOOP = "right_loop"
+PATTERN_WHORL = "whorl"
+
+# Approximate natural frequency of each class.
+PATTERN_FREQUENCIES = {
+    PATTERN_LEFT_LOOP: 0.34,
+    PATTERN_RIGHT_LOOP: 0.31,
+    PATTERN_WHORL: 0.28,
+    PATTERN_ARCH: 0.04,
+    PATTERN_TENTED_ARCH: 0.03,
+}
+
+IMAGE_HEIGHT = 360
+IMAGE_WIDTH = 300
+MASTER_MARGIN = 40        # extra master border so rotated/shifted impressions stay inside it
+ORIENTATION_BINS = 16
+GROWTH_ITERATIONS = 8
+
+
+def _singularities(pattern, rng, width, height):
+    """Core and delta positions (x, y) for a pattern class on a master canvas."""
+    cx = width * rng.uniform(0.42, 0.58)
+    cy = height * rng.uniform(0.35, 0.45)
+    spread = rng.uniform(0.9, 1.1)
+    if pattern == PATTERN_ARCH:
+        return [], []
+    if pattern == PATTERN_TENTED_ARCH:
+        return [(cx, cy)], [(cx + rng.uniform(-8, 8), cy + 90 * spread)]
+    if pattern == PATTERN_LEFT_LOOP:
+        return [(cx - 20, cy)], [(cx + 85 * spread, cy + 95 * spread)]
+    if pattern == PATTERN_RIGHT_LOOP:
+        return [(cx + 20, cy)], [(cx - 85 * spread, cy + 95 * spread)]
+    if pattern == PATTERN_WHORL:
+        return ([(cx - 8, cy - 18), (cx + 8, cy + 18)],
+                [(cx - 95 * spread, cy + 105 * spread), (cx + 95 * spread, cy + 105 * spread)])
+    raise ValueError(f"Unknown pattern class: {pattern}")
+
+
+def orientation_model(pattern, rng, width, height):
+    """Ridge orientation in [0, pi) per pixel from the zero-pole model."""
+    y, x = np.mgrid[0:height, 0:width].astype(np.float64)
+    cores, deltas = _singularities(pattern, rng, width, height)
+    theta = np.zeros((height, width))
+    for px, py in cores:
+        theta += 0.5 * np.arctan2(y - py, x - px)
+    for px, py in deltas:
+        theta -= 0.5 * np.arctan2(y - py, x - px)
+    if pattern == PATTERN_ARCH:
+        # Ridges bulge upwards in the middle, less so towards the bottom.
+        cx = width * rng.uniform(0.4, 0.6)
+        sigma = width * 0.3
+        amplitude = rng.uniform(60, 90) * np.clip(1.2 - y / height, 0.2, 1.0)
+        slope = amplitude * 2 * (x - cx) / sigma ** 2 * np.exp(-((x - cx) / sigma) ** 2)
+        theta += np.arctan(slope)
+    return np.mod(theta, np.pi)
+
+
+def _gabor_bank(shape, period):
+    """FFTs of even Gabor kernels tuned to ``period`` for ORIENTATION_BINS ridge orientations."""
+    height, width = shape
+    radius = int(period * 1.2)
+    ky, kx = np.mgrid[-radius:radius + 1, -radius:radius + 1].astype(np.float64)
+    sigma = period * 0.45
+    envelope = np.exp(-(kx ** 2 + ky ** 2) / (2 * sigma ** 2))
+    bank = []
+    for b in range(ORIENTATION_BINS):
+        angle = b * np.pi / ORIENTATION_BINS
+        # The wave runs across the ridges, i.e. along the ridge normal.
+        across = -kx * np.sin(angle) + ky * np.cos(angle)
+        kernel = envelope * np.cos(2 * np.pi * across / period)
+        kernel -= kernel.mean()
+        padded = np.zeros((height, width))
+        padded[:kernel.shape[0], :kernel.shape[1]] = kernel
+        padded = np.roll(padded, (-radius, -radius), axis=(0, 1))
+        bank.append(np.fft.rfft2(padded))
+    return bank
+
+
+def grow_ridges(orientation, period, rng, iterations=GROWTH_ITERATIONS):
+    """Grow a ridge pattern in [-1, 1] following ``orientation`` from random noise."""
+    shape = orientation.shape
+    bank = _gabor_bank(shape, period)
+    bins = np.rint(orientation * ORIENTATION_BINS / np.pi).astype(np.int64) % ORIENTATION_BINS
+    pattern = rng.standard_normal(shape)
+    for _ in range(iterations):
+        spectrum = np.fft.rfft2(pattern)
+        grown = np.empty(shape)
+        for b, kernel in enumerate(bank):
+            selected = bins == b
+            if selected.any():
+                grown[selected] = np.fft.irfft2(spectrum * kernel, s=shape)[selected]
+        pattern = np.clip(grown / (grown.std() + 1e-9), -1.0, 1.0)
+    return pattern
+
+
+def master_print(finger, pattern=None):
+    """Build the master ridge pattern of one synthetic finger.
+
+    Args:
+        finger (int): Seed identifying the finger.
+        pattern (str | None): Pattern class; drawn from PATTERN_FREQUENCIES if None.
+
+    Returns:
+        tuple: (ridge pattern in [-1, 1] as a 2-D float array, pattern class)
+    """
+    rng = np.random.default_rng([finger, 0])
+    if pattern is None:
+        names = list(PATTERN_FREQUENCIES)
+        weights = np.array([PATTERN_FREQUENCIES[n] for n in names])
+        pattern = names[rng.choice(len(names), p=weights / weights.sum())]
+    width = IMAGE_WIDTH + 2 * MASTER_MARGIN
+    height = IMAGE_HEIGHT + 2 * MASTER_MARGIN
+    orientation = orientation_model(pattern, rng, width, height)
+    period = rng.uniform(7.5, 11.0)
+    return grow_ridges(orientation, period, rng), pattern
+
+
+def impression(master, seed, max_rotation=0.25, max_shift=20, noise=12.0):
+    """Render one scanner impression of a master ridge pattern.
+
+    Args:
+        master (np.ndarray): Ridge pattern from master_print().
+        seed (int): Seed for this impression's placement and noise.
+        max_rotation (float): Largest rotation in radians, either direction.
+        max_shift (int): Largest translation in pixels along each axis.
+        noise (float): Standard deviation of the additive pixel noise.
+
+    Returns:
+        np.ndarray: IMAGE_HEIGHT x IMAGE_WIDTH uint8 image, dark ridges on white.
+    """
+    rng = np.random.default_rng([seed, 1])
+    rotation = rng.uniform(-max_rotation, max_rotation)
+    dx, dy = rng.integers(-max_shift, max_shift + 1, size=2)
+
+    image = Image.fromarray(((1 - master) * 127.5).astype(np.uint8))
+    image = image.rotate(np.degrees(rotation), resample=Image.BILINEAR, fillcolor=255)
+    left = MASTER_MARGIN + int(dx)
+    top = MASTER_MARGIN + int(dy)
+    image = np.asarray(image.crop((left, top, left + IMAGE_WIDTH, top + IMAGE_HEIGHT)), dtype=np.float64)
+
+    # Contact area: an ellipse whose size and position vary with finger pressure.
+    y, x = np.mgrid[0:IMAGE_HEIGHT, 0:IMAGE_WIDTH]
+    ex = IMAGE_WIDTH * rng.uniform(0.40, 0.47)
+    ey = IMAGE_HEIGHT * rng.uniform(0.42, 0.48)
+    cx = IMAGE_WIDTH / 2 + rng.uniform(-10, 10)
+    cy = IMAGE_HEIGHT / 2 + rng.uniform(-10, 10)
+    contact = ((x - cx) / ex) ** 2 + ((y - cy) / ey) ** 2 < 1
+
+    contrast = rng.uniform(0.7, 1.0)
+    image = 255 - (255 - image) * contrast + rng.normal(0, noise, image.shape)
+    image = np.where(contact, image, 255)
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def to_bmp(image):
+    """Encode a grayscale array as 8-bit BMP bytes, like the bridge's captures."""
+    import io
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, format="BMP")
+    return buffer.getvalue()
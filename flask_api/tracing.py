@@ -0,0 +1,454 @@
+"""Lightweight request tracing with correlation IDs.
+
+Every HTTP request gets a correlation ID, taken from an ``X-Correlation-ID``
+or W3C ``traceparent`` header when the client sends one. It is returned in
+the ``X-Correlation-ID`` response header and added to the API's log lines.
+On the framed bridge protocol it travels inside the request ID
+(``REQ <seq>-<correlation id> <command>``). The bridge echoes that ID in its
+``END`` line and prints it in its console log, so the bridge needs no
+protocol change.
+
+While a request runs, spans record where its time goes:
+
+    POST /match            the API handler (the root span)
+      bridge MATCH         one bridge command, including the wait for the scanner;
+                           bridge PROGRESS lines are span events, so the gap between
+                           "processing" and the end is the bridge's own DB work
+        bridge.exchange    the socket exchange once the scanner is ours
+      gallery.identify     in-process 1:N search
+      db select            one SQL statement (text only, never its parameters)
+
+A background job continues its request's trace as a new local root.
+
+Whether a finished trace is exported is decided when its root span ends. It
+is kept if it was sampled (TRACE_SAMPLE_RATE, or the sampled flag of an
+incoming traceparent), if it was slower than TRACE_SLOW_THRESHOLD, or if it
+failed and TRACE_ERRORS is set. Kept traces are queued for a background
+exporter. It appends one JSON object per span to TRACE_FILE ("jsonl") or
+posts OTLP/HTTP JSON to TRACE_OTLP_ENDPOINT ("otlp"), so any
+OTLP-compatible collector can receive them. When the queue is full,
+traces are dropped rather than slowing requests down.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+from contextlib import contextmanager
+
+from config import (TRACE_ERRORS, TRACE_EXPORTER, TRACE_FILE, TRACE_OTLP_ENDPOINT, TRACE_QUEUE_SIZE,
+                    TRACE_SAMPLE_RATE, TRACE_SLOW_THRESHOLD)
+
+SERVICE_NAME = "fingerprint-api"
+CORRELATION_HEADER = "X-Correlation-ID"
+MAX_STATEMENT_LENGTH = 500
+
+# No spaces: the ID travels as part of a bridge command line.
+_CORRELATION_ID = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+_TRACE_ID = re.compile(r"^[0-9a-f]{32}$")
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current = contextvars.ContextVar("tracing_span", default=None)
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "events", "error")
+
+    def __init__(self, trace, name, parent_id, attributes):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = {key: value for key, value in attributes.items() if value is not None}
+        self.events = []
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update((key, value) for key, value in attributes.items() if value is not None)
+
+    def event(self, name, **attributes):
+        self.events.append((time.time_ns(), name, attributes))
+
+    def fail(self, message):
+        self.error = str(message)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "correlation_id": self.trace.correlation_id,
+            "start": self.start_ns / 1e9,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "events": [{"name": name, "offset_ms": round((at - self.start_ns) / 1e6, 3), "attributes": attrs}
+                       for at, name, attrs in self.events],
+            "status": "error" if self.error is not None else "ok",
+            "error": self.error,
+        }
+
+
+class _NoSpan:
+    """Stands in for a span outside any trace, so callers never need to check."""
+
+    def set(self, **attributes):
+        pass
+
+    def event(self, name, **attributes):
+        pass
+
+    def fail(self, message):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Trace:
+    """The spans of one local root (a request or a background job), collected until the root ends."""
+
+    def __init__(self, trace_id, correlation_id, sampled):
+        self.trace_id = trace_id
+        self.correlation_id = correlation_id
+        self.sampled = sampled
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+
+# -----------------------------
+# Starting and ending traces
+# -----------------------------
+def _parse_incoming(correlation_id, traceparent):
+    """(trace_id, parent span ID, correlation ID, sampled or None) from request headers."""
+    trace_id = parent_id = sampled = None
+    match = _TRACEPARENT.match((traceparent or "").strip().lower())
+    if match:
+        trace_id, parent_id = match.group(1), match.group(2)
+        sampled = bool(int(match.group(3), 16) & 1)
+    if not (correlation_id and _CORRELATION_ID.match(correlation_id)):
+        correlation_id = None
+    if trace_id is None:
+        trace_id = correlation_id if correlation_id and _TRACE_ID.match(correlation_id) else uuid.uuid4().hex
+    return trace_id, parent_id, correlation_id or trace_id, sampled
+
+
+def begin_trace(name, correlation_id=None, traceparent=None, **attributes):
+    """Start a trace whose root span is ``name`` and make it current.
+
+    Args:
+        name (str): Root span name, e.g. "POST /match".
+        correlation_id (str | None): The client's X-Correlation-ID; ignored unless it
+            is 1-64 characters of letters, digits and ``._:-``.
+        traceparent (str | None): The client's W3C traceparent header.
+        **attributes: Attributes of the root span.
+
+    Returns:
+        tuple: Handle for end_trace().
+    """
+    trace_id, parent_id, correlation_id, sampled = _parse_incoming(correlation_id, traceparent)
+    if sampled is None:
+        sampled = random.random() < TRACE_SAMPLE_RATE
+    return _begin(Trace(trace_id, correlation_id, sampled), name, parent_id, attributes)
+
+
+def _begin(trace, name, parent_id, attributes):
+    root = Span(trace, name, parent_id, attributes)
+    trace.add(root)
+    return root, _current.set(root)
+
+
+def end_trace(handle, error=None, **attributes):
+    """End the root span started by begin_trace() and export the trace if it is kept."""
+    root, token = handle
+    root.set(**attributes)
+    if error is not None:
+        root.fail(error)
+    root.end_ns = time.time_ns()
+    try:
+        _current.reset(token)
+    except ValueError:
+        # Ended from a different context than it was started in.
+        _current.set(None)
+    _finish(root.trace, root)
+
+
+@contextmanager
+def start_trace(name, parent=None, **attributes):
+    """Run the body of a ``with`` block as a new local root.
+
+    Args:
+        name (str): Root span name, e.g. "job capture".
+        parent (tuple | None): current_context() of the trace to continue (the
+            request that queued a job); None starts a new trace, sampled at
+            TRACE_SAMPLE_RATE.
+    """
+    if parent is not None:
+        trace_id, parent_id, correlation_id, sampled = parent
+        trace = Trace(trace_id, correlation_id, sampled)
+    else:
+        trace_id = uuid.uuid4().hex
+        trace, parent_id = Trace(trace_id, trace_id, random.random() < TRACE_SAMPLE_RATE), None
+    handle = _begin(trace, name, parent_id, attributes)
+    error = None
+    try:
+        yield handle[0]
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        end_trace(handle, error=error)
+
+
+def current_context():
+    """(trace_id, span ID, correlation ID, sampled) of the current span, for start_trace(parent=...)."""
+    span = _current.get()
+    if span is None:
+        return None
+    return span.trace.trace_id, span.span_id, span.trace.correlation_id, span.trace.sampled
+
+
+def current_correlation_id():
+    span = _current.get()
+    return span.trace.correlation_id if span is not None else None
+
+
+def frame_id(sequence):
+    """Request ID for a framed bridge command: the sequence number plus the current correlation ID."""
+    correlation_id = current_correlation_id()
+    return f"{sequence}-{correlation_id}" if correlation_id else str(sequence)
+
+
+# -----------------------------
+# Spans
+# -----------------------------
+@contextmanager
+def span(name, **attributes):
+    """Time the body of a ``with`` block as a child of the current span.
+
+    Yields a span with set(), event() and fail(). Outside any trace (startup,
+    the background gallery loader, command-line tools) it records nothing.
+    An exception from the body marks the span failed and propagates.
+    """
+    parent = _current.get()
+    if parent is None:
+        yield _NO_SPAN
+        return
+    child = Span(parent.trace, name, parent.span_id, attributes)
+    parent.trace.add(child)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.fail(e)
+        raise
+    finally:
+        child.end_ns = time.time_ns()
+        _current.reset(token)
+
+
+def current_span():
+    """The current span, or a stand-in that ignores everything outside a trace."""
+    return _current.get() or _NO_SPAN
+
+
+def progress_recorder(on_progress):
+    """Wrap an on_progress callback so each progress update is also an event on the current span."""
+    current = current_span()
+
+    def record(stage, message=""):
+        current.event(stage, message=message)
+        if on_progress is not None:
+            on_progress(stage, message)
+    return record
+
+
+def record_result(result):
+    """Copy an operation result's status and station to the current span; error results fail it."""
+    current = current_span()
+    current.set(status=result.get("status"), station=result.get("station"))
+    if result.get("status") == "error":
+        current.fail(result.get("message"))
+
+
+def statement_text(query):
+    """SQL text for a db span (truncated); executemany's multi-row byte statements are omitted."""
+    return query[:MAX_STATEMENT_LENGTH] if isinstance(query, str) else None
+
+
+class CorrelationIdFilter(logging.Filter):
+    """Adds ``correlation_id`` ("-" outside a request) to every log record for the log format."""
+
+    def filter(self, record):
+        record.correlation_id = current_correlation_id() or "-"
+        return True
+
+
+# -----------------------------
+# Export
+# -----------------------------
+def _finish(trace, root):
+    if not TRACE_EXPORTER:
+        return
+    with trace._lock:
+        spans = [s for s in trace.spans if s.end_ns is not None]
+    keep = trace.sampled
+    if not keep and TRACE_SLOW_THRESHOLD:
+        keep = (root.end_ns - root.start_ns) / 1e9 >= TRACE_SLOW_THRESHOLD
+    if not keep and TRACE_ERRORS:
+        keep = any(s.error is not None for s in spans)
+    if keep:
+        _exporter().submit(spans)
+
+
+def resolve_path(path):
+    """Absolute path; relative paths are next to the executable (or this module)."""
+    if os.path.isabs(path):
+        return path
+    if getattr(sys, "frozen", False):
+        base = os.path.dirname(sys.executable)
+    else:
+        base = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base, path)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+def to_otlp(spans):
+    """OTLP/HTTP JSON request body (ExportTraceServiceRequest) for ``spans``."""
+    otlp_spans = []
+    for s in spans:
+        attributes = dict(s.attributes, correlation_id=s.trace.correlation_id)
+        otlp_spans.append({
+            "traceId": s.trace.trace_id,
+            "spanId": s.span_id,
+            "parentSpanId": s.parent_id or "",
+            "name": s.name,
+            "kind": 2 if s is s.trace.spans[0] else 1,   # the local root serves the request
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": _otlp_attributes(attributes),
+            "events": [{"timeUnixNano": str(at), "name": name, "attributes": _otlp_attributes(attrs)}
+                       for at, name, attrs in s.events],
+            "status": {"code": 2, "message": s.error} if s.error is not None else {"code": 1},
+        })
+    return {"resourceSpans": [{
+        "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+        "scopeSpans": [{"scope": {"name": "fingerprint_api.tracing"}, "spans": otlp_spans}],
+    }]}
+
+
+class TraceExporter:
+    """Writes kept traces from a bounded queue on a background thread.
+
+    Args:
+        mode (str): "jsonl" or "otlp".
+        path (str): JSON-lines file for "jsonl".
+        endpoint (str): OTLP/HTTP traces URL for "otlp".
+        max_queue (int): Traces waiting for export before new ones are dropped.
+    """
+
+    BATCH = 100
+
+    def __init__(self, mode=TRACE_EXPORTER, path=TRACE_FILE, endpoint=TRACE_OTLP_ENDPOINT,
+                 max_queue=TRACE_QUEUE_SIZE):
+        self.mode = mode
+        self.path = resolve_path(path)
+        self.endpoint = endpoint
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self._failing = False
+        threading.Thread(target=self._run, name="trace-exporter", daemon=True).start()
+
+    def submit(self, spans):
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=5):
+        """Wait up to ``timeout`` seconds for queued traces to be written."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            spans = [s for trace_spans in batch for s in trace_spans]
+            try:
+                self._export(spans)
+                self.exported += len(batch)
+                self._failing = False
+            except Exception as e:
+                self.failed += len(batch)
+                if not self._failing:
+                    logging.warning(f"[Tracing] Export to {self.endpoint if self.mode == 'otlp' else self.path} "
+                                    f"failed, dropping traces until it recovers: {e}")
+                self._failing = True
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _export(self, spans):
+        if self.mode == "otlp":
+            body = json.dumps(to_otlp(spans)).encode("utf-8")
+            req = urllib.request.Request(self.endpoint, data=body, headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(req, timeout=5) as response:
+                response.read()
+        else:
+            with open(self.path, "a", encoding="utf-8") as f:
+                for s in spans:
+                    f.write(json.dumps(s.to_dict(), ensure_ascii=False, default=str) + "\n")
+
+    def stats(self):
+        return {"mode": self.mode, "queued": self._queue.qsize(), "exported": self.exported,
+                "dropped": self.dropped, "failed": self.failed}
+
+
+_exporter_instance = None
+_exporter_lock = threading.Lock()
+
+
+def _exporter():
+    global _exporter_instance
+    if _exporter_instance is None:
+        with _exporter_lock:
+            if _exporter_instance is None:
+                _exporter_instance = TraceExporter()
+    return _exporter_instance
@@ -1,19 +1,173 @@
 """Fingerprint Verification Module"""
 
+import base64
+import logging
+
+import numpy as np
+
+from async_bridge import send_bridge_command_async
 from bridge_client import send_bridge_command
+from capture import scan_fingerprint_bmp
+from config import VERIFY_FINGER_THRESHOLD, VERIFY_FUSED_THRESHOLD
+from db_pool import get_pool
+from identification import hough_scores
+from image_codec import stored_image_to_bmp
+from minutiae import extract_minutiae, load_grayscale
+from schema import has_columns
+from scheduler import PRIORITY_HIGH, PRIORITY_NORMAL
+from template_store import deserialize_template, extract_template, fetch_person_templates, save_templates
 
-def verify_fingerprint(person_id, finger_index, member="prisoner"):
+def verify_fingerprint(person_id, finger_index, member="prisoner", on_progress=None,
+                       deadline=None, priority=PRIORITY_NORMAL,
+                       station=None):
     """Verify a captured fingerprint against a stored template.
 
     Args:
         person_id (str): Unique identifier for the person.
         finger_index (int): Index of the finger to verify (1-10).
         member (str): Whether the person is "prisoner" or "suspect".
+        on_progress (callable | None): Receives the bridge's progress updates.
+        deadline (float | None): ``time.monotonic()`` by which the scanner must be reached.
+        priority (int): Device scheduler priority.
+        station (str | None): Bridge station to use; None picks the least-loaded one.
 
     Returns:
         dict: A dictionary containing the result of the verification operation.
     """
     command = f"VERIFY {person_id} {finger_index} {member}\n"
 
-    return send_bridge_command(command, timeout=30)
+    return send_bridge_command(command, timeout=30, on_progress=on_progress,
+                               deadline=deadline, priority=priority, station=station)
+
+
+async def verify_fingerprint_async(person_id, finger_index, member="prisoner", on_progress=None,
+                                   deadline=None, priority=PRIORITY_NORMAL, station=None):
+    """Coroutine version of verify_fingerprint() for the asyncio serving mode."""
+    command = f"VERIFY {person_id} {finger_index} {member}\n"
+
+    return await send_bridge_command_async(command, timeout=30, on_progress=on_progress,
+                                           deadline=deadline, priority=priority, station=station)
+
+
+def load_person_templates(person_id, member, finger_indices):
+    """Stored minutiae of the requested fingers of one person, fetched in one query.
+
+    Fingers without a current-version template are extracted from their
+    stored image. The template is written back if the table has the column.
+
+    Returns:
+        dict: finger_index -> (K, 4) minutiae array, for the fingers on file.
+    """
+    with get_pool().connection() as conn:
+        store = has_columns(conn, 'image_data', 'image_format', 'minutiae_template', 'extractor_version')
+        if store:
+            rows = fetch_person_templates(conn, person_id, member, finger_indices)
+        else:
+            placeholders = ", ".join(["%s"] * len(finger_indices))
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT finger_index, NULL, NULL, NULL, image_bmp FROM fingerprint_templates "
+                               f"WHERE person_id = %s AND member = %s AND finger_index IN ({placeholders})",
+                               (person_id, member, *finger_indices))
+                rows = cursor.fetchall()
+
+    references = {}
+    extracted = []
+    for finger_index, blob, image_data, image_format, image_bmp in rows:
+        try:
+            if blob is None:
+                blob = extract_template(stored_image_to_bmp(image_data, image_format, image_bmp))
+                extracted.append((person_id, finger_index, member, blob))
+            references[finger_index] = deserialize_template(blob)[0]
+        except Exception as e:
+            logging.warning(f"[Verify] Could not load template for {person_id}/{finger_index}/{member}: {e}")
+    if store and extracted:
+        with get_pool().connection() as conn:
+            save_templates(conn, extracted)
+    return references
+
+
+def score_finger(probe, reference):
+    """Similarity (0-100) of probe minutiae to one stored template."""
+    return float(hough_scores(probe, reference[None], np.array([len(reference)]))[0])
+
+
+def verify_fingers(person_id, finger_indices, member="prisoner", probes=None, on_progress=None,
+                   deadline=None, priority=PRIORITY_NORMAL, station=None):
+    """Verify several fingers of one person and fuse their scores into one decision.
+
+    The stored templates of all requested fingers are loaded in one query
+    before anything is scanned, and fingers with nothing on file are not
+    scanned at all. The other fingers are scanned in turn unless a probe image
+    was supplied. Scans stay on the station of the first scan, and from the
+    second one they go to the head of its queue, so the person is not kept
+    waiting between fingers. Scores are fused with the mean rule over every
+    finger on file; a finger that could not be scanned counts as 0.
+
+    Args:
+        person_id (str): Unique identifier for the person.
+        finger_indices (list): Fingers to verify, in scanning order.
+        member (str): Whether the person is "prisoner" or "suspect".
+        probes (dict | None): finger_index -> already captured image bytes;
+            these fingers are not scanned.
+        on_progress (callable | None): Receives progress updates.
+        deadline (float | None): ``time.monotonic()`` by which the first scan must start.
+        priority (int): Device scheduler priority of the first scan.
+        station (str | None): Bridge station to scan on; None picks the least-loaded one.
+
+    Returns:
+        dict: "status" ("success", "no_match" or "error"), "message", the fused
+            "score", "matched_fingers", "compared_fingers", "station" and a
+            "fingers" list with each finger's status, score and scanned image.
+    """
+    probes = probes or {}
+    references = load_person_templates(person_id, member, finger_indices)
+    fingers = []
+    for position, finger_index in enumerate(finger_indices, 1):
+        result = {"finger_index": finger_index}
+        fingers.append(result)
+        reference = references.get(finger_index)
+        if reference is None:
+            result.update(status="no_template", message=f"No stored template for finger {finger_index}")
+            continue
+
+        image = probes.get(finger_index)
+        if image is None:
+            if on_progress is not None:
+                on_progress("finger", f"Finger {finger_index} ({position} of {len(finger_indices)})")
+            scan = scan_fingerprint_bmp(on_progress=on_progress, deadline=deadline, priority=priority,
+                                        station=station)
+            if scan.get("retry_after") is not None:
+                # The scanner is not available; report it instead of failing finger after finger.
+                scan["fingers"] = fingers[:-1]
+                return scan
+            if scan.get("status") != "success" or not scan.get("bmp_base64"):
+                result.update(status="error", score=0.0, message=scan.get("message"))
+                continue
+            station = scan.get("station", station)
+            deadline, priority = None, PRIORITY_HIGH
+            result["bmp_base64"] = scan["bmp_base64"]
+            image = base64.b64decode(scan["bmp_base64"])
+
+        try:
+            score = score_finger(extract_minutiae(load_grayscale(image)), reference)
+        except Exception as e:
+            logging.warning(f"[Verify] Could not score finger {finger_index} of {person_id}: {e}")
+            result.update(status="error", score=0.0, message=f"Could not read the fingerprint image: {e}")
+            continue
+        result.update(status="match" if score >= VERIFY_FINGER_THRESHOLD else "no_match", score=round(score, 2))
 
+    compared = [f for f in fingers if f["status"] != "no_template"]
+    response = {"person_id": person_id, "member": member, "station": station, "fingers": fingers}
+    if not compared:
+        response.update(status="error", message="No stored templates for the requested fingers")
+        return response
+    fused = sum(f["score"] for f in compared) / len(compared)
+    matched = sum(f["status"] == "match" for f in compared)
+    response.update(score=round(fused, 2), matched_fingers=matched, compared_fingers=len(compared))
+    if fused >= VERIFY_FUSED_THRESHOLD:
+        response.update(status="success",
+                        message=f"✅ Verified, {matched} of {len(compared)} fingers matched, Score: {fused:.2f}")
+    else:
+        response.update(status="no_match",
+                        message=f"❌ Not verified, {matched} of {len(compared)} fingers matched, Score: {fused:.2f}")
+    return response
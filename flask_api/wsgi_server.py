@@ -0,0 +1,108 @@
+"""WSGI servers for the tray launcher (fingerprintapi.py).
+
+Werkzeug's development server starts a thread per connection with no limit,
+has no keep-alive management and stops at once when shut down, cutting off
+requests that are waiting for a finger on the scanner. The production mode
+runs the same Flask app on Waitress instead:
+
+* a fixed pool of SERVER_THREADS workers; requests beyond it queue in the
+  server until a worker frees up,
+* at most SERVER_CONNECTION_LIMIT open connections; further clients wait in
+  the listen backlog,
+* idle keep-alive connections are closed after SERVER_CHANNEL_TIMEOUT,
+* shutdown() drains: it stops accepting, lets in-flight requests finish for
+  up to SERVER_DRAIN_TIMEOUT seconds, then closes every connection.
+
+Both servers have the interface ServerThread needs: serve_forever() blocks
+until shutdown() is called from another thread.
+"""
+
+import logging
+import time
+
+from werkzeug.serving import make_server
+
+from config import (SERVER_BACKLOG, SERVER_CHANNEL_TIMEOUT, SERVER_CONNECTION_LIMIT, SERVER_DRAIN_TIMEOUT,
+                    SERVER_MODE, SERVER_THREADS)
+
+try:
+    import waitress
+    from waitress import wasyncore
+    WAITRESS_AVAILABLE = True
+except ImportError:
+    WAITRESS_AVAILABLE = False
+
+
+class WaitressServer:
+    """Flask app on a Waitress server with a bounded worker pool and graceful drain."""
+
+    def __init__(self, app, host, port):
+        self.server = waitress.create_server(
+            app, host=host, port=port,
+            threads=SERVER_THREADS,
+            connection_limit=SERVER_CONNECTION_LIMIT,
+            backlog=SERVER_BACKLOG,
+            channel_timeout=SERVER_CHANNEL_TIMEOUT,
+            ident="FingerprintAPI")
+
+    def serve_forever(self):
+        logging.info(f"[Server] Waitress listening on {self.server.effective_host}:{self.server.effective_port} "
+                     f"with {SERVER_THREADS} threads")
+        self.server.run()
+
+    def in_flight(self):
+        """Requests received and not yet answered, whether running or queued for a worker."""
+        return sum(1 for channel in list(self.server.active_channels.values()) if channel.requests)
+
+    def shutdown(self, drain_timeout=SERVER_DRAIN_TIMEOUT):
+        """Stop accepting connections, wait for in-flight requests, then close everything.
+
+        Args:
+            drain_timeout (float): Seconds to wait for in-flight requests before
+                closing their connections anyway.
+        """
+        server = self.server
+        # The accept loop consults readable(), which is False once not accepting.
+        server.accepting = False
+        deadline = time.monotonic() + drain_timeout
+        while True:
+            for channel in list(server.active_channels.values()):
+                if not channel.requests:
+                    channel.will_close = True        # idle keep-alive: close on the next loop pass
+            server.pull_trigger()
+            pending = self.in_flight()
+            if not pending or time.monotonic() >= deadline:
+                break
+            time.sleep(0.1)
+        if pending:
+            logging.warning(f"[Server] Closing {pending} request(s) still in flight after {drain_timeout} sec")
+        server.task_dispatcher.shutdown(timeout=1)
+        # Emptying the socket map ends the loop in serve_forever().
+        wasyncore.close_all(server._map)
+
+
+class WerkzeugServer:
+    """Flask app on werkzeug's threaded development server; shutdown does not drain."""
+
+    def __init__(self, app, host, port):
+        self.server = make_server(host, port, app, threaded=True)
+
+    def serve_forever(self):
+        logging.info(f"[Server] Werkzeug listening on {self.server.host}:{self.server.port}")
+        self.server.serve_forever()
+
+    def shutdown(self, drain_timeout=SERVER_DRAIN_TIMEOUT):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def create_server(app, host, port, mode=SERVER_MODE):
+    """Bind a server for ``app`` in the given mode ("waitress" or "werkzeug").
+
+    Falls back to werkzeug, with a warning, if Waitress is not installed.
+    """
+    if mode == "waitress":
+        if WAITRESS_AVAILABLE:
+            return WaitressServer(app, host, port)
+        logging.warning("[Server] waitress is not installed, using the werkzeug development server")
+    return WerkzeugServer(app, host, port)